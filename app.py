@@ -1,250 +1,241 @@
-import io
-import json
-import pandas as pd
 import streamlit as st
-from docx import Document
 
+import tracing
+
+from datasets import DATASETS, DEFAULT_COMPANY
+from incremental import IncrementalAnalysis
+from ingest import UPLOAD_CACHE, content_digest, merge_keywords, merge_records, parse_uploads
+from matcher import explain_triggers
+from method_index import load_method_index
 from report import (
-    draw_flow,
-    save_markdown_report,
-    save_docx_report,
+    build_report,
+    load_models_data,
+    render_report,
+    start_font_warmup,
 )
 
 st.set_page_config(page_title="战略规划与实施 Demo", layout="wide")
 st.title("战略规划与实施知识库 Demo")
 
-# 读取方法论元数据
-with open('data/models.json', 'r', encoding='utf-8') as f:
-    models_data = json.load(f)
-
-# —— 关键字词典（用于文本提示） ——
-METHOD_KEYWORDS = {
-    "PESTEL": ["政策", "利率", "关税", "法规", "环保", "技术", "社会", "通胀", "宏观"],
-    "FiveForces": ["价格战", "替代品", "进入壁垒", "供应商", "购买者", "份额", "竞争"],
-    "BCG": ["份额", "增长率", "现金牛", "明星", "问题", "瘦狗"],
-    "GE": ["吸引力", "竞争力", "资源配置"],
-    "SWOT": ["优势", "劣势", "机会", "威胁"],
-    "BLM": ["OKR", "KPI", "组织", "人才", "里程碑", "RACI", "执行"]
-}
+# 读取方法论元数据（进程内缓存，重跑脚本不再读盘）
+models_data = load_models_data()
+# 后台预热中文字体（进程内一次），到报告页出图时不再现场探测字体
+start_font_warmup()
 
 # —— 规则引擎 ——
 
-def _display_name(key: str) -> str:
-    mapping = {
-        "FiveForces": "Porter Five Forces",
-        "PESTEL": "PESTEL",
-        "BCG": "BCG",
-        "GE": "GE",
-        "SWOT": "SWOT",
-        "BLM": "BLM",
-    }
-    return mapping.get(key, key)
-
-
-def pick_methods(feats: dict) -> list:
-    methods = []
-    if feats.get("is_new_market") or feats.get("macro_signals"):
-        methods.append("PESTEL")
-    ind = feats.get("industry_data", {}) or {}
-    cr5 = ind.get("cr5"); hhi = ind.get("hhi"); price_war = bool(ind.get("price_war"))
-    high_comp = (hhi is not None and hhi < 1500) or (cr5 is not None and cr5 < 40) or price_war
-    if high_comp:
-        methods.append("FiveForces")
-    if (feats.get("bu_count") or 0) >= 2:
-        methods.extend(["BCG","GE"])
-    methods.append("SWOT")
-    if feats.get("exec_gap") or feats.get("internal_data_ready"):
-        methods.append("BLM")
-    order = ["PESTEL","FiveForces","BCG","GE","SWOT","BLM"]
-    seen, ordered = set(), []
-    for k in order:
-        if k in methods and k not in seen:
-            ordered.append(_display_name(k)); seen.add(k)
-    return ordered
-
-
-def explain_triggers(feats: dict) -> list:
-    ind = feats.get("industry_data", {}) or {}
-    reasons = []
-    if feats.get("is_new_market") or feats.get("macro_signals"):
-        reasons.append("PESTEL：进入新市场或出现宏观信号（is_new_market/macro_signals 为 True）")
-    if (ind.get("hhi") is not None and ind.get("hhi") < 1500) or (ind.get("cr5") is not None and ind.get("cr5") < 40) or bool(ind.get("price_war")):
-        reasons.append("Porter Five Forces：HHI<1500 或 CR5<40 或存在价格战")
-    if (feats.get("bu_count") or 0) >= 2:
-        reasons.append("BCG/GE：bu_count≥2，多业务组合需要资源配置建议")
-    reasons.append("SWOT：基础综合诊断，默认执行")
-    if feats.get("exec_gap") or feats.get("internal_data_ready"):
-        reasons.append("BLM：存在执行落差或内部数据可用，需要战略到执行闭环")
-    return reasons
+# 增量分析状态：跨重跑保留，what-if 时只重算受改动影响的规则与章节
+if "analysis" not in st.session_state:
+    st.session_state["analysis"] = IncrementalAnalysis(models_data)
+analysis = st.session_state["analysis"]
 
 # —— 文件解析 ——
 
-def parse_excel(file) -> dict:
-    try:
-        df = pd.read_excel(file)
-        def pick(col, cast=None):
-            if col in df.columns and len(df) > 0:
-                val = df.iloc[0][col]
-                if cast:
-                    try:
-                        return cast(val)
-                    except Exception:
-                        return None
-                return val
-            return None
-        return {
-            "bu_count": pick("bu_count", int),
-            "is_new_market": pick("is_new_market", bool),
-            "macro_signals": pick("macro_signals", bool),
-            "share_growth": pick("share_growth", float),
-            "market_growth": pick("market_growth", float),
-            "internal_data_ready": pick("internal_data_ready", bool),
-            "exec_gap": pick("exec_gap", bool),
-            "industry_data": {
-                "cr5": pick("cr5", float),
-                "hhi": pick("hhi", float),
-                "price_war": pick("price_war", bool),
-                "switching_cost": pick("switching_cost", str) or "med",
-            }
-        }
-    except Exception:
-        return {}
-
-
-def parse_word(file) -> str:
-    try:
-        doc = Document(file)
-        return "\n".join(p.text.strip() for p in doc.paragraphs if p.text.strip())
-    except Exception:
-        return ""
-
-
-def extract_keywords(text: str) -> dict:
-    hits = {}
-    for m, kws in METHOD_KEYWORDS.items():
-        hits[m] = sorted({kw for kw in kws if kw in text})
-    return hits
+def _upload_payloads(files) -> list:
+    """
+    上传文件 -> [(文件名, 字节)]。
+    按 file_id 记住上一轮的内容哈希：被移除或替换的文件，其缓存结果立即失效。
+    """
+    seen = st.session_state.setdefault("upload_digests", {})
+    current = {f.file_id: f for f in files or []}
+    for file_id in list(seen):
+        if file_id not in current:
+            UPLOAD_CACHE.invalidate(seen.pop(file_id))
+    payloads = []
+    for file_id, f in current.items():
+        data = f.getvalue()
+        if file_id not in seen:
+            seen[file_id] = content_digest(data)
+        payloads.append((f.name, data))
+    return payloads
 
 # —— 页面导航 ——
 st.sidebar.header("导航")
 page = st.sidebar.radio("选择页面", ["概览与说明", "数据上传与特征提取", "方法论库", "生成报告"])
 
-# 概览
-if page == "概览与说明":
-    st.subheader("支持的方法论板块")
-    cols = st.columns(3)
-    names = list(models_data.keys())
-    for i, name in enumerate(names):
-        with cols[i % 3]:
-            st.markdown(f"**{name}**\n\n- 简介：{models_data[name].get('简介','')}\n- 应用场景：{models_data[name].get('应用场景','')}")
-    with st.expander("📄 上传文件格式说明"):
-        st.markdown(
-            """
-            **Excel（可选）**：推荐列：`bu_count`、`is_new_market`、`macro_signals`、`cr5`、`hhi`、`price_war`、`switching_cost`、`share_growth`、`market_growth`、`internal_data_ready`、`exec_gap`。
+# 诊断面板：勾选后本次脚本运行的各阶段耗时会被采集，并显示在侧栏底部
+show_diag = st.sidebar.checkbox("诊断面板（分阶段耗时）", key="diag")
+trace = tracing.start(page) if show_diag else None
+
+# 页面主体放进 try：分支里的异常或 st.stop() 也不会跳过 tracing.stop，contextvar 不会残留到下次运行
+try:
+    # 概览
+    if page == "概览与说明":
+        st.subheader("支持的方法论板块")
+        cols = st.columns(3)
+        names = list(models_data.keys())
+        for i, name in enumerate(names):
+            with cols[i % 3]:
+                st.markdown(f"**{name}**\n\n- 简介：{models_data[name].get('简介','')}\n- 应用场景：{models_data[name].get('应用场景','')}")
+        with st.expander("📄 上传文件格式说明"):
+            st.markdown(
+                """
+                **Excel（可选）**：推荐列：`bu_count`、`is_new_market`、`macro_signals`、`cr5`、`hhi`、`price_war`、`switching_cost`、`share_growth`、`market_growth`、`internal_data_ready`、`exec_gap`。
             
-            **Word（可选）**：自由文本简报；系统会做关键词提示（如“关税/价格战/OKR”等）。
+                **Word（可选）**：自由文本简报；系统会做关键词提示（如“关税/价格战/OKR”等）。
             
-            **名词解释**：HHI < 1500 分散，1500–2500 中等，>2500 集中；CR5 = 行业前五份额之和。
-            """
-        )
-
-# 数据上传与特征提取
-elif page == "数据上传与特征提取":
-    st.subheader("上传文件与参数填写")
-    col_u1, col_u2 = st.columns(2)
-    with col_u1:
-        excel_file = st.file_uploader("上传 Excel（可选）", type=["xlsx", "xls"], key="excel")
-        word_file = st.file_uploader("上传 Word（可选）", type=["docx"], key="word")
-    with col_u2:
-        st.caption("没有文件也可以只用下方表单跑一遍")
-
-    parsed = parse_excel(excel_file) if excel_file else {}
-    brief = parse_word(word_file) if word_file else ""
-
-    st.markdown("**关键参数**（可编辑）：")
-    c1, c2 = st.columns(2)
-    with c1:
-        bu_count = st.number_input("业务单元数 bu_count", 1, 100, int(parsed.get("bu_count") or 1))
-        is_new_market = st.checkbox("进入新市场/新地区", bool(parsed.get("is_new_market") or False))
-        macro_signals = st.checkbox("出现显著宏观变动", bool(parsed.get("macro_signals") or False))
-        share_growth = st.number_input("相对份额增长 %", -100.0, 100.0, float(parsed.get("share_growth") or 0.0))
-        market_growth = st.number_input("赛道增速 %", -100.0, 500.0, float(parsed.get("market_growth") or 0.0))
-    with c2:
-        cr5 = st.number_input("CR5 %", 0.0, 100.0, float(parsed.get("industry_data", {}).get("cr5") or 0.0))
-        hhi = st.number_input("HHI", 0.0, 10000.0, float(parsed.get("industry_data", {}).get("hhi") or 0.0))
-        price_war = st.checkbox("行业存在价格战", bool(parsed.get("industry_data", {}).get("price_war") or False))
-        switching_cost = st.selectbox("用户转换成本", ["low", "med", "high"], index=["low","med","high"].index(str(parsed.get("industry_data", {}).get("switching_cost") or "med")))
-        internal_data_ready = st.checkbox("内部数据可用（成本/组织/流程）", bool(parsed.get("internal_data_ready") or False))
-        exec_gap = st.checkbox("存在战略-执行落差", bool(parsed.get("exec_gap") or False))
-
-    feats = {
-        "bu_count": bu_count,
-        "is_new_market": is_new_market,
-        "macro_signals": macro_signals,
-        "share_growth": share_growth,
-        "market_growth": market_growth,
-        "internal_data_ready": internal_data_ready,
-        "exec_gap": exec_gap,
-        "industry_data": {"cr5": cr5, "hhi": hhi, "price_war": price_war, "switching_cost": switching_cost},
-    }
-
-    kw_hits = {}
-    if brief:
-        # 简易关键词命中
-        for m, kws in METHOD_KEYWORDS.items():
-            kw_hits[m] = sorted({kw for kw in kws if kw in brief})
-        st.markdown("**从 Word 文本命中的关键词（提示用）**：")
-        st.write(kw_hits)
-
-    st.markdown("**提取到的结构化特征**：")
-    st.json(feats, expanded=False)
-
-    st.markdown("---")
-    run_top = st.button("▶️ 运行分析", type="primary")
-    run_side = st.sidebar.button("▶️ 运行分析", key="run_side")
-    if run_top or run_side:
-        methods = pick_methods(feats)
-        st.success("推荐方法论：" + "、".join(methods))
-        st.markdown("**触发依据（为什么这么推荐）**：")
-        for r in explain_triggers(feats):
-            st.write("- ", r)
-        st.session_state["feats"] = feats
-        st.session_state["methods"] = methods
-        st.session_state["kw_hits"] = kw_hits
-
-# 方法论库
-elif page == "方法论库":
-    st.subheader("方法论一览")
-    model_name = st.selectbox("选择战略模型", list(models_data.keys()))
-    st.write("**简介：**", models_data[model_name].get("简介", ""))
-    st.write("**应用场景：**", models_data[model_name].get("应用场景", ""))
-    st.write("**分析步骤：**")
-    for step in models_data[model_name].get("分析步骤", []):
-        st.write("-", step)
-
-# 生成报告
-elif page == "生成报告":
-    st.subheader("导出报告")
-    st.caption("将上一页的分析结果（方法论/特征/触发依据）汇总为 Markdown 或 Word 报告，并附流程图。")
-
-    use_feats = st.session_state.get("feats", {})
-    use_methods = st.session_state.get("methods", [])
-
-    with st.expander("查看当前结果缓存"):
-        st.write("方法论：", use_methods)
-        st.write("特征：")
-        st.json(use_feats, expanded=False)
-
-    fmt = st.radio("选择导出格式", ["Markdown", "Word (docx)"])
-    if st.button("生成并下载"):
-        triggers = explain_triggers(use_feats) if use_feats else []
-        flow_path = draw_flow(use_methods or [])
-        if fmt == "Markdown":
-            md_path = save_markdown_report(use_methods, use_feats, triggers, models_data)
-            with open(md_path, 'rb') as f:
-                st.download_button("下载 Markdown 报告", data=f.read(), file_name="战略分析报告.md", mime="text/markdown")
+                **名词解释**：HHI < 1500 分散，1500–2500 中等，>2500 集中；CR5 = 行业前五份额之和。
+                """
+            )
+
+    # 数据上传与特征提取
+    elif page == "数据上传与特征提取":
+        st.subheader("上传文件与参数填写")
+        col_u1, col_u2 = st.columns(2)
+        with col_u1:
+            uploads = st.file_uploader("上传 Excel / Word（可选，可多选）", type=["xlsx", "xls", "docx"],
+                                       accept_multiple_files=True, key="uploads")
+        with col_u2:
+            st.caption("没有文件也可以只用下方表单跑一遍；多份 Excel 按上传顺序取每个字段的第一个非空值")
+
+        # 多文件并发解析；按内容哈希缓存，勾选框等控件触发的重跑不再重复解析
+        payloads = _upload_payloads(uploads)
+        results = []
+        if payloads:
+            bar = st.progress(0.0, text="解析中…")
+            results = parse_uploads(payloads, progress=lambda done, total, res: bar.progress(
+                done / total, text=f"已解析 {done}/{total}：{res.name}"))
+            bar.empty()
+            for res in results:
+                if not res.ok:
+                    st.warning(f"{res.name} 解析失败，已跳过：{res.error}")
+            with st.expander(f"已解析 {sum(r.ok for r in results)}/{len(results)} 个文件", expanded=False):
+                st.table([{"文件": r.name, "类型": r.kind, "状态": "失败" if r.error else ("缓存" if r.cached else "完成"),
+                           "耗时(s)": round(r.seconds, 3)} for r in results])
+        parsed, _ = merge_records(r.value for r in results if r.ok and r.kind == "excel")
+        word_results = [r for r in results if r.ok and r.kind == "word" and r.value]
+        brief = "\n".join(r.value for r in word_results)
+        brief_digest = content_digest("\n".join(r.digest for r in word_results).encode()) if word_results else None
+
+        st.markdown("**关键参数**（可编辑）：")
+        c1, c2 = st.columns(2)
+        with c1:
+            bu_count = st.number_input("业务单元数 bu_count", 1, 100, int(parsed.get("bu_count") or 1))
+            is_new_market = st.checkbox("进入新市场/新地区", bool(parsed.get("is_new_market") or False))
+            macro_signals = st.checkbox("出现显著宏观变动", bool(parsed.get("macro_signals") or False))
+            share_growth = st.number_input("相对份额增长 %", -100.0, 100.0, float(parsed.get("share_growth") or 0.0))
+            market_growth = st.number_input("赛道增速 %", -100.0, 500.0, float(parsed.get("market_growth") or 0.0))
+        with c2:
+            cr5 = st.number_input("CR5 %", 0.0, 100.0, float(parsed.get("industry_data", {}).get("cr5") or 0.0))
+            hhi = st.number_input("HHI", 0.0, 10000.0, float(parsed.get("industry_data", {}).get("hhi") or 0.0))
+            price_war = st.checkbox("行业存在价格战", bool(parsed.get("industry_data", {}).get("price_war") or False))
+            switching_cost = st.selectbox("用户转换成本", ["low", "med", "high"], index=["low","med","high"].index(str(parsed.get("industry_data", {}).get("switching_cost") or "med")))
+            internal_data_ready = st.checkbox("内部数据可用（成本/组织/流程）", bool(parsed.get("internal_data_ready") or False))
+            exec_gap = st.checkbox("存在战略-执行落差", bool(parsed.get("exec_gap") or False))
+
+        feats = {
+            "bu_count": bu_count,
+            "is_new_market": is_new_market,
+            "macro_signals": macro_signals,
+            "share_growth": share_growth,
+            "market_growth": market_growth,
+            "internal_data_ready": internal_data_ready,
+            "exec_gap": exec_gap,
+            "industry_data": {"cr5": cr5, "hhi": hhi, "price_war": price_war, "switching_cost": switching_cost},
+        }
+
+        kw_hits = {}
+        if brief:
+            # 各文件的关键词在解析时已随同算好，这里只取并集
+            kw_hits = merge_keywords(r.keywords for r in word_results)
+            st.markdown("**从 Word 文本命中的关键词（提示用）**：")
+            st.write(kw_hits)
+            # 与方法论库的 TF-IDF 相似度（索引 mmap 打开，进程内只加载一次）
+            ranked = UPLOAD_CACHE.get_or_compute("method_rank", brief_digest,
+                                                 lambda: load_method_index().search(brief, k=3))
+            if ranked:
+                st.markdown("**与简报最相近的方法论**：" + "、".join(f"{name}（{score:.2f}）" for name, score in ranked))
+
+        st.markdown("**提取到的结构化特征**：")
+        st.json(feats, expanded=False)
+
+        st.markdown("---")
+        run_top = st.button("▶️ 运行分析", type="primary")
+        run_side = st.sidebar.button("▶️ 运行分析", key="run_side")
+        if run_top or run_side:
+            analysis.update(feats)
+            methods = analysis.display_methods()
+            st.success("推荐方法论：" + "、".join(methods))
+            st.markdown("**触发依据（为什么这么推荐）**：")
+            for r in analysis.triggers:
+                st.write("- ", r)
+            st.session_state["feats"] = feats
+            st.session_state["methods"] = methods
+            st.session_state["kw_hits"] = kw_hits
+
+    # 方法论库
+    elif page == "方法论库":
+        st.subheader("方法论一览")
+        model_name = st.selectbox("选择战略模型", list(models_data.keys()))
+        st.write("**简介：**", models_data[model_name].get("简介", ""))
+        st.write("**应用场景：**", models_data[model_name].get("应用场景", ""))
+        st.write("**分析步骤：**")
+        for step in models_data[model_name].get("分析步骤", []):
+            st.write("-", step)
+
+    # 生成报告
+    elif page == "生成报告":
+        st.subheader("导出报告")
+        st.caption("将上一页的分析结果（方法论/特征/触发依据）汇总为 Markdown、Word 或 HTML 报告，并附流程图。")
+
+        use_feats = st.session_state.get("feats", {})
+        use_methods = st.session_state.get("methods", [])
+
+        with st.expander("查看当前结果缓存"):
+            st.write("方法论：", use_methods)
+            st.write("特征：")
+            st.json(use_feats, expanded=False)
+
+        # 示例数据集（BCG/波特五力/SWOT）按公司从数据集存储读取
+        companies = DATASETS.companies()
+        company = None
+        if companies:
+            ids = [cid for cid, _ in companies]
+            names = dict(companies)
+            company = st.selectbox("示例数据集（公司）", ids, index=ids.index(DEFAULT_COMPANY) if DEFAULT_COMPANY in ids else 0,
+                                   format_func=lambda cid: f"{names[cid]}（{cid}）" if names.get(cid) else cid)
+
+        fmt = st.radio("选择导出格式", ["Markdown", "Word (docx)", "HTML"])
+        if st.button("生成并下载"):
+            # 报告 IR 只构建一次，图表在内存中渲染，会话之间不共享任何文件；
+            # 已运行过分析时复用上次的章节，只重画受改动影响的图
+            if analysis.feats is not None:
+                analysis.update(analysis.feats, company=company)
+                ir = analysis.report()
+            else:
+                triggers = explain_triggers(use_feats) if use_feats else []
+                ir = build_report(use_methods, use_feats, triggers, models_data, company=company)
+            if fmt == "Markdown":
+                md_buf = render_report(ir, "markdown")
+                st.download_button("下载 Markdown 报告", data=md_buf.getvalue(), file_name="战略分析报告.md", mime="text/markdown")
+            elif fmt == "HTML":
+                html_buf = render_report(ir, "html")
+                st.download_button("下载 HTML 报告", data=html_buf.getvalue(), file_name="战略分析报告.html", mime="text/html")
+            else:
+                docx_buf = render_report(ir, "docx")
+                st.download_button("下载 Word 报告", data=docx_buf.getvalue(), file_name="战略分析报告.docx")
+            st.image(ir.charts()[0].data(bitmap=True), caption="分析流程图", use_container_width=True)
+finally:
+    if trace is not None:
+        tracing.stop(trace)
+        if trace.spans:
+            history = st.session_state.setdefault("diag_traces", [])
+            history.append(trace)
+            del history[:-20]
+
+# —— 诊断面板 ——
+if trace is not None:
+    history = st.session_state.setdefault("diag_traces", [])
+    with st.sidebar.expander("⏱ 分阶段耗时", expanded=True):
+        shown = trace if trace.spans else (history[-1] if history else None)
+        if shown is None:
+            st.caption("本次运行没有采集到阶段（试试上传文件或生成报告）。")
         else:
-            docx_path = save_docx_report(use_methods, use_feats, triggers, models_data)
-            with open(docx_path, 'rb') as f:
-                st.download_button("下载 Word 报告", data=f.read(), file_name="战略分析报告.docx")
-        st.image(flow_path, caption="分析流程图", use_container_width=True)
+            st.caption(f"页面：{shown.label}")
+            st.table([{"阶段": a["name"], "次数": a["count"], "总耗时 ms": round(a["total_ms"], 1),
+                       "最大 ms": round(a["max_ms"], 1)} for a in shown.summary()])
+        if history:
+            st.download_button("导出 JSON Lines", data="".join(t.to_jsonl() for t in history),
+                               file_name="timings.jsonl", mime="application/json")
+            st.download_button("导出 Chrome trace", data=history[-1].to_chrome_trace(),
+                               file_name="trace.json", mime="application/json")
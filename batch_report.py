@@ -0,0 +1,189 @@
+"""
+无界面批量出报告：读取组合工作簿中的每一行客户，
+extract_features -> pick_methods -> explain_triggers -> 报告导出，用进程池并行。
+
+    python batch_report.py clients.xlsx --out-dir reports --format docx --format markdown --workers 4
+
+每个客户的输出文件名带输入哈希（<客户>-<哈希>.<扩展名>）；同一输入重跑时已存在的输出直接跳过，可断点续跑。
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+EXTENSIONS = {"markdown": ".md", "docx": ".docx", "html": ".html"}
+ID_COLUMNS = ("client_id", "client", "name", "客户", "客户名称")
+
+# 输入哈希里带上版本号，报告结构变化时可整体失效
+REPORT_VERSION = 2
+
+
+def _safe_name(s: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", str(s)).strip("_") or "client"
+
+
+def input_hash(record: Dict, formats: List[str], backend: str, models_digest: str) -> str:
+    blob = json.dumps([REPORT_VERSION, record, sorted(formats), backend, models_digest],
+                      sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def output_paths(out_dir: str, client_id: str, digest: str, formats: List[str]) -> Dict[str, str]:
+    stem = f"{_safe_name(client_id)}-{digest}"
+    return {fmt: os.path.join(out_dir, stem + EXTENSIONS[fmt]) for fmt in formats}
+
+
+def iter_clients(path: str, id_column: Optional[str] = None,
+                 limit: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+    """产出 (客户标识, 特征记录)；没有标识列时用行号。path 也可以是 feature_store 目录。"""
+    from ingest import iter_excel_rows, to_feature_record
+
+    if os.path.isdir(path):
+        from feature_store import FeatureStore
+
+        store = FeatureStore.open(path)
+        for i in range(store.n if limit is None else min(limit, store.n)):
+            row = store.row(i)
+            # 任务要 pickle 到子进程，物化成普通字典
+            yield row.id or f"row{i + 1:06d}", row.to_dict()
+        return
+
+    for i, row in enumerate(iter_excel_rows(path, limit=limit), start=1):
+        cols = [id_column] if id_column else ID_COLUMNS
+        cid = next((row[c] for c in cols if row.get(c) not in (None, "")), None)
+        yield (str(cid) if cid is not None else f"row{i:06d}"), to_feature_record(row)
+
+
+# —— 子进程 ——
+
+def _init_worker():
+    # 每个子进程独立的 matplotlib 状态，固定用无界面的 Agg 后端；字体在这里解析一次
+    import matplotlib
+    matplotlib.use("Agg")
+    from report import warm_fonts
+    warm_fonts()
+
+
+def _run_client(task: Dict) -> Dict:
+    from feature_engine import extract_features
+    from ingest import to_engine_input
+    from matcher import display_methods, explain_triggers, pick_methods
+    from report import build_report, load_models_data, render_report
+
+    t0 = time.perf_counter()
+    feats = extract_features(to_engine_input(task["record"]))
+    methods = display_methods(pick_methods(feats))
+    triggers = explain_triggers(feats)
+    # 工作簿里没有各客户的 BCG / 五力 / SWOT 数据，不套用示例公司的
+    ir = build_report(methods, feats, triggers, load_models_data(task["models_path"]),
+                      backend=task["backend"], samples=False)
+    for fmt, path in task["paths"].items():
+        # 先写临时文件再改名，半途中断不会留下“看起来已完成”的输出
+        tmp = f"{path}.{os.getpid()}.tmp"
+        render_report(ir, fmt, out_path=tmp)
+        os.replace(tmp, path)
+    return {"client_id": task["client_id"], "seconds": time.perf_counter() - t0, "methods": methods}
+
+
+# —— 调度 ——
+
+def run_batch(path: str, out_dir: str, formats: List[str], workers: int = None,
+              max_in_flight: int = None, backend: str = "matplotlib",
+              models_path: str = None, id_column: str = None,
+              limit: int = None, resume: bool = True, log=print) -> Dict:
+    from report import MODELS_PATH
+
+    models_path = models_path or MODELS_PATH
+    with open(models_path, "rb") as f:
+        models_digest = hashlib.sha256(f.read()).hexdigest()
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+
+    stats = {"total": 0, "done": 0, "skipped": 0, "failed": 0, "errors": []}
+    latencies: List[float] = []
+    t_start = time.perf_counter()
+
+    def tasks():
+        for cid, rec in iter_clients(path, id_column=id_column, limit=limit):
+            stats["total"] += 1
+            digest = input_hash(rec, formats, backend, models_digest)
+            paths = output_paths(out_dir, cid, digest, formats)
+            if resume and all(os.path.exists(p) for p in paths.values()):
+                stats["skipped"] += 1
+                continue
+            yield {"client_id": cid, "record": rec, "paths": paths,
+                   "backend": backend, "models_path": models_path}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = {}
+        source = tasks()
+        exhausted = False
+        while pending or not exhausted:
+            # 在途任务数有上限：读取端不会把整本工作簿一次性塞进队列
+            while not exhausted and len(pending) < max_in_flight:
+                task = next(source, None)
+                if task is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(_run_client, task)] = task["client_id"]
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                cid = pending.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    stats["errors"].append({"client_id": cid, "error": repr(e)})
+                    log(f"[失败] {cid}: {e!r}")
+                    continue
+                stats["done"] += 1
+                latencies.append(res["seconds"])
+
+    wall = time.perf_counter() - t_start
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+    stats.update({
+        "wall_seconds": wall,
+        "throughput_per_s": stats["done"] / wall if wall > 0 else 0.0,
+        "latency_p50_s": pct(0.50),
+        "latency_p99_s": pct(0.99),
+        "workers": workers,
+        "max_in_flight": max_in_flight,
+    })
+    return stats
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="按组合工作簿批量生成战略分析报告")
+    ap.add_argument("input", help="客户工作簿（.xlsx / .xls），每行一个客户；或 feature_store 目录")
+    ap.add_argument("--out-dir", default="reports")
+    ap.add_argument("--format", dest="formats", action="append", choices=sorted(EXTENSIONS),
+                    help="可重复指定，默认 docx")
+    ap.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    ap.add_argument("--max-in-flight", type=int, default=None, help="在途任务上限，默认 2×workers")
+    ap.add_argument("--backend", default="matplotlib", choices=["matplotlib", "svg"])
+    ap.add_argument("--id-column", default=None, help="客户标识列，默认依次尝试 " + "/".join(ID_COLUMNS))
+    ap.add_argument("--limit", type=int, default=None, help="只处理前 N 行")
+    ap.add_argument("--no-resume", action="store_true", help="忽略已存在的输出，全部重跑")
+    args = ap.parse_args(argv)
+
+    stats = run_batch(args.input, args.out_dir, args.formats or ["docx"], workers=args.workers,
+                      max_in_flight=args.max_in_flight, backend=args.backend,
+                      id_column=args.id_column, limit=args.limit, resume=not args.no_resume)
+    print(f"客户 {stats['total']}：完成 {stats['done']}，跳过 {stats['skipped']}，失败 {stats['failed']}；"
+          f"耗时 {stats['wall_seconds']:.1f}s，吞吐 {stats['throughput_per_s']:.2f} 个/秒，"
+          f"单个 p50 {stats['latency_p50_s']:.2f}s / p99 {stats['latency_p99_s']:.2f}s "
+          f"（{stats['workers']} 进程，在途上限 {stats['max_in_flight']}）")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+"""
+基准测试：本地生成合成输入，分阶段与端到端计时（特征、匹配、关键词、解析、各图表、Markdown/DOCX 导出）。
+
+    python benchmarks.py --out bench.json                    # 全量
+    python benchmarks.py --quick --stages chart,export       # 只跑部分阶段、小规模
+    python benchmarks.py --out new.json --compare bench.json --threshold 0.15
+    python benchmarks.py --check-render 8                     # 多线程并发出图与串行逐字节比对
+
+每个用例报告吞吐、p50/p99 延迟和峰值内存（tracemalloc，单独一轮测得）；
+--compare 时任何用例 p50 变慢超过阈值即判为回归，进程以 1 退出。
+"""
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+# =======================
+# 合成输入
+# =======================
+
+SWITCHING = ["low", "med", "high"]
+
+
+def synth_raw(rng: random.Random) -> Dict:
+    return {
+        "bu_count": rng.randint(1, 8),
+        "is_new_market": rng.random() < 0.4,
+        "macro_signals": rng.random() < 0.3,
+        "share_growth": round(rng.uniform(-10, 10), 2),
+        "market_growth": round(rng.uniform(-5, 40), 2),
+        "internal_data_ready": rng.random() < 0.5,
+        "exec_gap": rng.random() < 0.4,
+        "industry_data": {
+            "cr5": round(rng.uniform(10, 90), 1) if rng.random() < 0.9 else None,
+            "hhi": round(rng.uniform(300, 4000), 0) if rng.random() < 0.9 else None,
+            "price_war": rng.random() < 0.2,
+            "switching_cost": rng.choice(SWITCHING),
+        },
+    }
+
+
+def synth_raws(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [synth_raw(rng) for _ in range(n)]
+
+
+def synth_workbook(rows: int, seed: int = 0) -> bytes:
+    from openpyxl import Workbook
+
+    cols = ["client_id", "bu_count", "is_new_market", "macro_signals", "cr5", "hhi", "price_war",
+            "switching_cost", "share_growth", "market_growth", "internal_data_ready", "exec_gap"]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(cols)
+    for i, r in enumerate(synth_raws(rows, seed)):
+        ind = r["industry_data"]
+        ws.append([f"C{i:07d}", r["bu_count"], r["is_new_market"], r["macro_signals"], ind["cr5"], ind["hhi"],
+                   ind["price_war"], ind["switching_cost"], r["share_growth"], r["market_growth"],
+                   r["internal_data_ready"], r["exec_gap"]])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def synth_docx(paragraphs: int, seed: int = 0) -> bytes:
+    from docx import Document
+    from keywords import _synthetic_brief
+
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(_synthetic_brief(120, seed=seed * 1_000_003 + i))
+    table = doc.add_table(rows=4, cols=3)
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = _synthetic_brief(30, seed=seed)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def synth_bcg(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [{"name": f"BU{i}", "growth": round(rng.uniform(-10, 40), 2), "share": round(rng.uniform(0.05, 3.0), 3)}
+            for i in range(n)]
+
+
+PORTER = [{"力量": k, "评分": v} for k, v in
+          [("现有竞争者", 4), ("潜在进入者", 3), ("替代品威胁", 2), ("供应商议价能力", 3), ("客户议价能力", 4)]]
+ALL_METHODS = ["PESTEL", "Porter Five Forces", "BCG", "GE", "SWOT", "BLM"]
+
+# =======================
+# 计时
+# =======================
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+def run_case(stage: str, size: str, fn: Callable[[], object], items: int = 1,
+             repeat: int = 5, warmup: int = 1) -> Dict:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    # 峰值内存单独跑一轮，避免 tracemalloc 的开销污染计时
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    p50 = _percentile(times, 0.50)
+    return {
+        "case": f"{stage}/{size}",
+        "stage": stage,
+        "size": size,
+        "items": items,
+        "repeat": repeat,
+        "p50_s": p50,
+        "p99_s": _percentile(times, 0.99),
+        "mean_s": sum(times) / len(times),
+        "throughput_per_s": items / p50 if p50 > 0 else float("inf"),
+        "peak_mem_bytes": peak,
+    }
+
+
+# =======================
+# 用例
+# =======================
+
+def _cases(quick: bool, want: Callable[[str], bool] = lambda stage: True):
+    """
+    产出 (stage, size, fn, items)；输入在这里准备好，不计入计时。
+    want(stage) 为 False 的阶段不构建输入（十万级特征、两万行工作簿等只在需要时生成）。
+    """
+    from feature_engine import extract_features
+    from ingest import iter_docx_text, iter_excel_records, read_excel_head, to_engine_input
+    from keywords import extract_keywords
+    from matcher import display_methods, explain_triggers, feats_to_columns, pick_methods, pick_methods_batch
+    import report
+
+    n_feats = [1_000, 10_000] if quick else [1_000, 10_000, 100_000]
+    n_rows = [1_000] if quick else [1_000, 20_000]
+    n_paras = [500] if quick else [500, 5_000]
+    n_bus = [10, 100] if quick else [10, 100, 1000]
+
+    if any(map(want, ("features", "match", "match_batch", "explain"))):
+        for n in n_feats:
+            # 与 Excel 解析结果一致：补齐全部字段，缺失为 None
+            raws = [to_engine_input(r) for r in synth_raws(n)]
+            if want("features"):
+                yield "features", f"{n}", lambda raws=raws: [extract_features(r) for r in raws], n
+            feats = [extract_features(r) for r in raws]
+            if want("match"):
+                yield "match", f"{n}", lambda feats=feats: [pick_methods(f) for f in feats], n
+            if want("match_batch"):
+                cols = feats_to_columns(feats)
+                yield "match_batch", f"{n}", lambda cols=cols: pick_methods_batch(cols), n
+            if want("explain"):
+                yield "explain", f"{n}", lambda feats=feats: [explain_triggers(f) for f in feats], n
+
+    if any(map(want, ("parse_excel_head", "parse_excel_stream"))):
+        for n in n_rows:
+            data = synth_workbook(n)
+            if want("parse_excel_head"):
+                yield "parse_excel_head", f"{n}rows", lambda data=data: read_excel_head(io.BytesIO(data), 1), 1
+            if want("parse_excel_stream"):
+                yield "parse_excel_stream", f"{n}rows", \
+                    lambda data=data: sum(1 for _ in iter_excel_records(io.BytesIO(data))), n
+
+    if any(map(want, ("parse_word", "keywords"))):
+        for n in n_paras:
+            data = synth_docx(n)
+            if want("parse_word"):
+                yield "parse_word", f"{n}paras", lambda data=data: "\n".join(iter_docx_text(io.BytesIO(data))), n
+            if want("keywords"):
+                text = "\n".join(iter_docx_text(io.BytesIO(data)))
+                yield "keywords", f"{len(text)}chars", lambda text=text: extract_keywords(text), 1
+
+    # 图表与导出：关闭缓存，测真实渲染；生成器结束或被关闭时恢复原来的缓存
+    saved = report.CHART_CACHE
+    report.configure_chart_cache(max_bytes=0)
+    try:
+        if want("chart_flow"):
+            yield "chart_flow", "6methods", lambda: report.draw_flow(ALL_METHODS), 1
+        if want("chart_porter"):
+            yield "chart_porter", "5forces", lambda: report.draw_porter_radar(PORTER), 1
+        if want("chart_bcg"):
+            for n in n_bus:
+                pts = synth_bcg(n)
+                yield "chart_bcg", f"{n}bu", lambda pts=pts: report.draw_bcg(pts), 1
+
+        if not any(map(want, ("export_markdown", "export_docx", "end_to_end"))):
+            return
+        models = report.load_models_data()
+        feats = extract_features(to_engine_input(synth_raws(1)[0]))
+        methods = ALL_METHODS
+        triggers = explain_triggers(feats)
+        for n in n_bus[:2]:
+            pts = synth_bcg(n)
+            if want("export_markdown"):
+                yield "export_markdown", f"{n}bu", lambda pts=pts: report.save_markdown_report(
+                    methods, feats, triggers, models, bcg_points=pts, porter_scores=PORTER), 1
+            if want("export_docx"):
+                yield "export_docx", f"{n}bu", lambda pts=pts: report.save_docx_report(
+                    methods, feats, triggers, models, bcg_points=pts, porter_scores=PORTER), 1
+
+        if not want("end_to_end"):
+            return
+        # 端到端：上传 Excel 首行 + Word 简报 -> 特征 -> 匹配 -> 触发 -> 同一 IR 导出 Markdown 与 DOCX
+        xlsx = synth_workbook(n_rows[0])
+        brief = synth_docx(n_paras[0])
+        pts = synth_bcg(n_bus[0])
+
+        def end_to_end():
+            rec = read_excel_head(io.BytesIO(xlsx), 1)[0]
+            text = "\n".join(iter_docx_text(io.BytesIO(brief)))
+            extract_keywords(text)
+            f = extract_features(to_engine_input(rec))
+            # 与页面一致：报告里用展示名，方法论说明才能在 models.json 里查到
+            ms = display_methods(pick_methods(f))
+            ir = report.build_report(ms, f, explain_triggers(f), models, bcg_points=pts, porter_scores=PORTER)
+            report.export_report(ir, ["markdown", "docx"])
+
+        yield "end_to_end", "1client", end_to_end, 1
+    finally:
+        report.CHART_CACHE = saved
+
+
+# =======================
+# 并发出图一致性
+# =======================
+
+def check_concurrent_render(workers: int = 8, repeat: int = 3, log=print) -> Dict:
+    """
+    同一批图表先串行渲染一遍，再用线程池并发渲染 repeat 遍，逐张比对 PNG 字节。
+    期间关闭图表缓存，保证每次都真实出图；返回计时与不一致的用例。
+    """
+    import hashlib
+    from concurrent.futures import ThreadPoolExecutor
+
+    import report
+
+    jobs = [("flow", lambda: report.draw_flow(ALL_METHODS)),
+            ("flow_3", lambda: report.draw_flow(ALL_METHODS[:3])),
+            ("porter", lambda: report.draw_porter_radar(PORTER))]
+    jobs += [(f"bcg_{n}", lambda pts=synth_bcg(n): report.draw_bcg(pts)) for n in (10, 100, 500)]
+    digest = lambda job: hashlib.sha256(job[1]().getvalue()).hexdigest()
+
+    font = report.warm_fonts()
+    saved = report.CHART_CACHE
+    report.configure_chart_cache(max_bytes=0)
+    try:
+        t0 = time.perf_counter()
+        serial = {name: digest((name, fn)) for name, fn in jobs}
+        serial_s = time.perf_counter() - t0
+        work = jobs * repeat
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            concurrent = list(pool.map(digest, work))
+        concurrent_s = time.perf_counter() - t0
+    finally:
+        report.CHART_CACHE = saved
+    mismatches = sorted({name for (name, _), d in zip(work, concurrent) if d != serial[name]})
+    log(f"字体 {font}；{len(jobs)} 张图串行 {serial_s:.2f}s，{workers} 线程并发 {len(work)} 张 {concurrent_s:.2f}s；"
+        + ("全部字节一致" if not mismatches else f"不一致：{', '.join(mismatches)}"))
+    return {"font": font, "charts": len(jobs), "renders": len(work), "workers": workers,
+            "serial_s": serial_s, "concurrent_s": concurrent_s, "mismatches": mismatches}
+
+
+def run_all(quick: bool = False, stages: List[str] = None, repeat: int = 5, log=print) -> Dict:
+    results = []
+    want = lambda stage: not stages or any(stage.startswith(s) for s in stages)
+    for stage, size, fn, items in _cases(quick, want):
+        heavy = stage.startswith(("chart", "export", "end_to_end"))
+        res = run_case(stage, size, fn, items=items, repeat=min(repeat, 3) if heavy else repeat)
+        results.append(res)
+        log(f"{res['case']:<34} p50 {res['p50_s'] * 1e3:10.2f} ms  p99 {res['p99_s'] * 1e3:10.2f} ms  "
+            f"{res['throughput_per_s']:12.1f} /s  peak {res['peak_mem_bytes'] / 1e6:8.2f} MB")
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.10) -> List[Dict]:
+    """逐用例对比 p50；变慢比例超过 threshold 的记为回归。"""
+    base = {r["case"]: r for r in baseline.get("results", [])}
+    rows = []
+    for r in current.get("results", []):
+        b = base.get(r["case"])
+        if not b or b["p50_s"] <= 0:
+            continue
+        change = r["p50_s"] / b["p50_s"] - 1.0
+        rows.append({"case": r["case"], "baseline_p50_s": b["p50_s"], "p50_s": r["p50_s"],
+                     "change": change, "regression": change > threshold})
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="分析与导出全流程基准测试")
+    ap.add_argument("--quick", action="store_true", help="小规模输入，快速冒烟")
+    ap.add_argument("--stages", default="", help="逗号分隔的阶段前缀，如 match,chart")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", help="结果写入 JSON")
+    ap.add_argument("--compare", help="与之前保存的 JSON 对比")
+    ap.add_argument("--threshold", type=float, default=0.10, help="p50 变慢超过该比例判为回归")
+    ap.add_argument("--check-render", type=int, metavar="THREADS", default=0,
+                    help="只检查多线程并发出图与串行出图是否逐字节一致")
+    args = ap.parse_args(argv)
+
+    if args.check_render:
+        return 1 if check_concurrent_render(workers=args.check_render)["mismatches"] else 0
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    current = run_all(quick=args.quick, stages=stages, repeat=args.repeat)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(current, baseline, args.threshold)
+        regressions = [r for r in rows if r["regression"]]
+        print(f"\n对比 {args.compare}（阈值 +{args.threshold:.0%}）：")
+        for r in rows:
+            flag = "回归" if r["regression"] else "  "
+            print(f"  {flag} {r['case']:<34} {r['baseline_p50_s'] * 1e3:10.2f} -> {r['p50_s'] * 1e3:10.2f} ms "
+                  f"({r['change']:+.1%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
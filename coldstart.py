@@ -0,0 +1,119 @@
+"""
+启动耗时测量：在全新子进程里用 `python -X importtime` 导入各模块，统计每个模块的导入开销。
+
+    python coldstart.py                    # 默认场景
+    python coldstart.py report ingest      # 只测指定场景/模块
+    python coldstart.py --top 20 --json out.json
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+
+def _app_imports(path: str = None) -> str:
+    """由 app.py 顶层的 import 语句拼出导入语句（不含 streamlit），app.py 增减导入时场景随之更新。"""
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    mods = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        mods += [m for m in names if m.split(".")[0] != "streamlit" and m not in mods]
+    return "import " + ", ".join(mods)
+
+
+# 场景名 -> 在子进程里执行的语句
+SCENARIOS = {
+    "streamlit": "import streamlit",
+    "app-imports": _app_imports(),                             # app.py 顶部导入（不含 streamlit）
+    "report": "import report",
+    "report+charts": "import report; report.warm_fonts(); import networkx",
+    "report+docx": "import report; import docx",
+    "ingest": "import ingest",
+    "keywords": "import keywords",
+    "matcher": "import matcher",
+    "feature_engine": "import feature_engine",
+}
+DEFAULT_SCENARIOS = ["app-imports", "report", "report+charts", "report+docx", "streamlit"]
+
+
+def _parse_importtime(stderr: str) -> List[Dict]:
+    """解析 -X importtime 输出；depth 为包名前的缩进层级（0 表示被语句直接导入）。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip()
+        rows.append({
+            "module": stripped.strip(),
+            "self_ms": int(self_us) / 1000.0,
+            "cumulative_ms": int(cum_us) / 1000.0,
+            "depth": (len(name) - len(stripped) - 1) // 2,
+        })
+    return rows
+
+
+def measure(statement: str, cwd: str = None) -> Dict:
+    """在干净的子进程里执行一条导入语句，返回墙钟耗时与逐模块开销。"""
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=cwd, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        return {"statement": statement, "error": proc.stderr.strip().splitlines()[-1:]}
+    rows = _parse_importtime(proc.stderr)
+    top = [r for r in rows if r["depth"] == 0]
+    return {
+        "statement": statement,
+        "wall_ms": wall_ms,
+        "import_ms": sum(r["cumulative_ms"] for r in top),
+        "modules": len(rows),
+        "top_level": sorted(top, key=lambda r: -r["cumulative_ms"]),
+        "all": rows,
+    }
+
+
+def run(names: List[str], top: int = 10) -> Dict[str, Dict]:
+    results = {}
+    for name in names:
+        stmt = SCENARIOS.get(name, f"import {name}")
+        res = measure(stmt)
+        results[name] = res
+        if "error" in res:
+            print(f"[{name}] 失败：{res['error']}")
+            continue
+        print(f"[{name}] `{stmt}` 进程总耗时 {res['wall_ms']:.0f} ms，导入 {res['import_ms']:.0f} ms，"
+              f"共 {res['modules']} 个模块")
+        heavy = sorted(res["all"], key=lambda r: -r["self_ms"])[:top]
+        for r in res["top_level"][:top]:
+            print(f"    {r['cumulative_ms']:8.1f} ms  {r['module']}")
+        print("    单模块自身耗时 Top：" + "，".join(f"{r['module']} {r['self_ms']:.1f}ms" for r in heavy))
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="测量各模块冷启动导入耗时")
+    ap.add_argument("scenarios", nargs="*", help="场景名（见 SCENARIOS）或任意模块名")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--json", dest="json_path", help="把完整结果写入 JSON 文件")
+    args = ap.parse_args(argv)
+    results = run(args.scenarios or DEFAULT_SCENARIOS, top=args.top)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
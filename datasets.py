@@ -0,0 +1,327 @@
+"""
+多公司示例数据集：BCG 点、波特五力评分、SWOT 条目存放在一个 SQLite 文件里，按公司 id 建索引。
+报告生成时按公司做一次索引查询（进程内缓存，数据库文件 mtime 变化即失效），不再逐个探测 JSON 文件。
+data/ 下的种子 JSON 在打开数据库时按 mtime/大小比对，改动过的重新导入；
+应用运行中改了种子文件，执行一次 import-dir 即可（数据库被写入，各进程随之重连）。
+
+    python datasets.py import-dir data/                 # 导入 <公司>_bcg.json / _porter.json / _swot.json
+    python datasets.py import-jsonl companies.jsonl     # 每行 {"company_id", "name", "bcg", "porter", "swot"}
+    python datasets.py list
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DATA_DIR = "data"
+DATASETS_PATH = os.path.join(DATA_DIR, "datasets.sqlite")
+DEFAULT_COMPANY = "byd"
+
+# 旧版单公司文件名，导入时记到 LEGACY_COMPANY 名下
+LEGACY_FILES = {
+    "bcg": ["bcg.json", "bcg_sample.json"],
+    "porter": ["porter.json", "porter_sample.json"],
+}
+LEGACY_COMPANY = "sample"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    company_id TEXT PRIMARY KEY,
+    name       TEXT
+);
+CREATE TABLE IF NOT EXISTS bcg_points (
+    company_id TEXT NOT NULL,
+    seq        INTEGER NOT NULL,
+    name       TEXT,
+    growth     REAL,
+    share      REAL,
+    PRIMARY KEY (company_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS porter_scores (
+    company_id TEXT NOT NULL,
+    seq        INTEGER NOT NULL,
+    factor     TEXT,
+    score      REAL,
+    note       TEXT,
+    PRIMARY KEY (company_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seed_files (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    size     INTEGER
+);
+CREATE TABLE IF NOT EXISTS swot_items (
+    company_id TEXT NOT NULL,
+    seq        INTEGER NOT NULL,
+    category   TEXT,
+    content    TEXT,
+    PRIMARY KEY (company_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class CompanyData:
+    """字段形状与报告的输入一致：bcg_points 给 draw_bcg，porter_scores 给 draw_porter_radar。"""
+    company_id: str
+    name: Optional[str] = None
+    bcg_points: Optional[List[Dict]] = None
+    porter_scores: Optional[List[Dict]] = None
+    swot: Optional[List[Dict]] = None
+
+
+# —— 输入规范化（容忍与 report._normalize_* 相同的字段别名） ——
+
+def _bcg_rows(points) -> Iterator[Tuple]:
+    from report import _normalize_bcg_points
+
+    for p in _normalize_bcg_points(points if isinstance(points, list) else None):
+        yield p['name'], p['growth'], p['share']
+
+
+def _porter_rows(scores) -> Iterator[Tuple]:
+    if isinstance(scores, dict):
+        scores = [{"力量": k, "评分": v} for k, v in scores.items()]
+    for row in scores or []:
+        if not isinstance(row, dict):
+            continue
+        k = row.get('力量') or row.get('factor') or row.get('name')
+        v = row.get('评分') or row.get('score') or row.get('value')
+        if k is None or v is None:
+            continue
+        try:
+            yield str(k), float(v), row.get('说明') or row.get('note')
+        except (TypeError, ValueError):
+            pass
+
+
+def _swot_rows(items) -> Iterator[Tuple]:
+    for row in items or []:
+        if isinstance(row, dict):
+            cat = row.get('类别') or row.get('category')
+            content = row.get('内容') or row.get('content')
+            if cat and content:
+                yield str(cat), str(content)
+
+
+class DatasetStore:
+    """
+    SQLite 数据集存储。读取按 company_id 走主键索引；结果按公司缓存在进程内（LRU），
+    每次查询先 stat 一次数据库文件，mtime/inode 变化（被其他进程写入或整体替换）时清空缓存并重连。
+    每次（重新）连接时比对 seed_dir 下 JSON 文件的 mtime/大小（记在 seed_files 表），新增或改动过的重新导入。
+    """
+
+    def __init__(self, path: str = DATASETS_PATH, seed_dir: Optional[str] = DATA_DIR, max_cached: int = 1024):
+        self.path = path
+        self.seed_dir = seed_dir
+        self.max_cached = max_cached
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._cache: "OrderedDict[str, Optional[CompanyData]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    # —— 连接与失效 ——
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _connect(self) -> sqlite3.Connection:
+        stamp = self._file_stamp()
+        if self._conn is not None and stamp == self._stamp:
+            return self._conn
+        if self._conn is not None:
+            self._conn.close()
+        if stamp is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+        if self.seed_dir and os.path.isdir(self.seed_dir):
+            self._import_dir(self.seed_dir, changed_only=True)
+        self._stamp = self._file_stamp()
+        self._cache.clear()
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._stamp = None
+            self._cache.clear()
+
+    # —— 读取 ——
+
+    def get(self, company_id: str) -> Optional[CompanyData]:
+        """按公司 id 读取全部数据集；公司不存在时返回 None。"""
+        with self._lock:
+            conn = self._connect()
+            if company_id in self._cache:
+                self._cache.move_to_end(company_id)
+                self.hits += 1
+                return self._cache[company_id]
+            self.misses += 1
+            data = self._read(conn, company_id)
+            self._cache[company_id] = data
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+            return data
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, company_id: str) -> Optional[CompanyData]:
+        row = conn.execute("SELECT name FROM companies WHERE company_id = ?", (company_id,)).fetchone()
+        if row is None:
+            return None
+        bcg = [{"name": n, "growth": g, "share": s} for n, g, s in conn.execute(
+            "SELECT name, growth, share FROM bcg_points WHERE company_id = ? ORDER BY seq", (company_id,))]
+        porter = []
+        for k, v, note in conn.execute(
+                "SELECT factor, score, note FROM porter_scores WHERE company_id = ? ORDER BY seq", (company_id,)):
+            item = {"力量": k, "评分": v}
+            if note:
+                item["说明"] = note
+            porter.append(item)
+        swot = [{"类别": c, "内容": t} for c, t in conn.execute(
+            "SELECT category, content FROM swot_items WHERE company_id = ? ORDER BY seq", (company_id,))]
+        return CompanyData(company_id, row[0], bcg or None, porter or None, swot or None)
+
+    def companies(self) -> List[Tuple[str, Optional[str]]]:
+        with self._lock:
+            return list(self._connect().execute("SELECT company_id, name FROM companies ORDER BY company_id"))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache), "path": self.path}
+
+    # —— 写入 ——
+
+    def put_many(self, records: Iterable[Dict]) -> int:
+        """
+        批量写入/覆盖公司数据，单个事务提交。
+        records: {"company_id", "name", "bcg", "porter", "swot"}，缺省的数据集保持原样。
+        """
+        n = 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for rec in records:
+                    self._put(conn, rec)
+                    n += 1
+            self._stamp = self._file_stamp()
+            self._cache.clear()
+        return n
+
+    def put(self, company_id: str, name: Optional[str] = None, bcg=None, porter=None, swot=None) -> None:
+        self.put_many([{"company_id": company_id, "name": name, "bcg": bcg, "porter": porter, "swot": swot}])
+
+    @staticmethod
+    def _put(conn: sqlite3.Connection, rec: Dict) -> None:
+        cid = str(rec["company_id"])
+        conn.execute("INSERT INTO companies (company_id, name) VALUES (?, ?) "
+                     "ON CONFLICT(company_id) DO UPDATE SET name = COALESCE(excluded.name, companies.name)",
+                     (cid, rec.get("name")))
+        tables = (("bcg", "bcg_points", ("name", "growth", "share"), _bcg_rows),
+                  ("porter", "porter_scores", ("factor", "score", "note"), _porter_rows),
+                  ("swot", "swot_items", ("category", "content"), _swot_rows))
+        for key, table, cols, rows in tables:
+            if rec.get(key) is None:
+                continue
+            conn.execute(f"DELETE FROM {table} WHERE company_id = ?", (cid,))
+            sql = f"INSERT INTO {table} (company_id, seq, {', '.join(cols)}) VALUES (?, ?{', ?' * len(cols)})"
+            conn.executemany(sql, ((cid, i) + r for i, r in enumerate(rows(rec[key]))))
+
+    def import_dir(self, directory: str) -> int:
+        with self._lock:
+            self._connect()
+            n = self._import_dir(directory)
+            self._stamp = self._file_stamp()
+            self._cache.clear()
+        return n
+
+    def _import_dir(self, directory: str, changed_only: bool = False) -> int:
+        """
+        <公司>_bcg.json / <公司>_porter.json / <公司>_swot.json，以及旧版 bcg.json 等单公司文件。
+        导入的文件把 mtime/大小记到 seed_files；changed_only=True 时跳过与记录一致的文件。
+        """
+        known = {}
+        if changed_only:
+            known = {p: (m, n) for p, m, n in self._conn.execute("SELECT path, mtime_ns, size FROM seed_files")}
+        found: Dict[str, Dict] = {}
+        stamps = []
+        pattern = re.compile(r"^(.+)_(bcg|porter|swot)\.json$")
+        for fn in sorted(os.listdir(directory)):
+            m = pattern.match(fn)
+            if m:
+                cid, kind = m.groups()
+            else:
+                kind = next((k for k, names in LEGACY_FILES.items() if fn in names), None)
+                if kind is None:
+                    continue
+                cid = LEGACY_COMPANY
+            path = os.path.abspath(os.path.join(directory, fn))
+            try:
+                st = os.stat(path)
+                if known.get(path) == (st.st_mtime_ns, st.st_size):
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            found.setdefault(cid, {"company_id": cid})[kind] = payload
+            stamps.append((path, st.st_mtime_ns, st.st_size))
+        if not stamps:
+            return 0
+        with self._conn:
+            for rec in found.values():
+                self._put(self._conn, rec)
+            self._conn.executemany("INSERT OR REPLACE INTO seed_files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                   stamps)
+        return len(found)
+
+
+DATASETS = DatasetStore()
+
+
+def load_company(company_id: Optional[str] = None) -> Optional[CompanyData]:
+    return DATASETS.get(company_id or DEFAULT_COMPANY)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="多公司示例数据集（SQLite）")
+    ap.add_argument("--db", default=DATASETS_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import-dir", help="导入目录下的 <公司>_bcg/porter/swot.json")
+    p.add_argument("directory")
+    p = sub.add_parser("import-jsonl", help="导入 JSON Lines，每行一个公司")
+    p.add_argument("file")
+    sub.add_parser("list", help="列出已收录的公司")
+    args = ap.parse_args(argv)
+
+    store = DatasetStore(args.db, seed_dir=None)
+    if args.cmd == "import-dir":
+        print(f"导入 {store.import_dir(args.directory)} 家公司")
+    elif args.cmd == "import-jsonl":
+        with open(args.file, 'r', encoding='utf-8') as f:
+            n = store.put_many(json.loads(line) for line in f if line.strip())
+        print(f"导入 {n} 家公司")
+    else:
+        for cid, name in store.companies():
+            print(cid, name or "")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,32 @@
+from matcher import THRESHOLDS
+from tracing import traced
+
+
+def _lt(v, threshold) -> bool:
+    # 缺失值不触发
+    return v is not None and v < threshold
+
+
+# 派生特征：名称 -> (依赖的原始特征, 计算函数)；industry_data 的字段写作 "industry_data.<字段>"
+DERIVED = {
+    "is_diversified": (("bu_count",),
+                       lambda f: f["bu_count"] is not None and f["bu_count"] >= THRESHOLDS["bu_count"]),
+    "high_competition": (("industry_data.hhi", "industry_data.cr5", "industry_data.price_war"),
+                         lambda f: (_lt(f["industry_data"].get("hhi"), THRESHOLDS["hhi"]) or
+                                    _lt(f["industry_data"].get("cr5"), THRESHOLDS["cr5"]) or
+                                    bool(f["industry_data"].get("price_war")))),
+    "high_growth": (("market_growth",),
+                    lambda f: f["market_growth"] is not None and f["market_growth"] >= THRESHOLDS["market_growth"]),
+    "share_problem": (("share_growth",),
+                      lambda f: f["share_growth"] is not None and f["share_growth"] <= THRESHOLDS["share_growth"]),
+}
+
+
+@traced("extract_features")
 def extract_features(data: dict):
     """
-    data 可来自 Excel/Word 解析；当前给一套示例值兜底，便于演示。
+    data 可来自 Excel/Word 解析。键不存在时用一套示例值兜底，便于演示；
+    显式给出的 None 表示缺失，原样保留（解析路径经 ingest.to_engine_input 补齐全部键）。
     """
     feats = {
         "bu_count": data.get("bu_count", 3),
@@ -14,10 +40,9 @@ def extract_features(data: dict):
     }
 
     # 可选派生
-    feats["is_diversified"]   = feats["bu_count"] >= 2
-    feats["high_competition"] = (feats["industry_data"].get("hhi", 9999) < 1500) or \
-                                (feats["industry_data"].get("cr5", 101) < 40) or \
-                                bool(feats["industry_data"].get("price_war"))
-    feats["high_growth"]      = feats["market_growth"] is not None and feats["market_growth"] >= 10
-    feats["share_problem"]    = feats["share_growth"] is not None and feats["share_growth"] <= 0
-    return feats
+    return with_derived(feats)
+
+
+def with_derived(feats: dict) -> dict:
+    """原始特征后面接上全部派生特征（返回新字典），报告的"关键特征"章节按这个形状展示。"""
+    return {**feats, **{name: derive(feats) for name, (_, derive) in DERIVED.items()}}
@@ -0,0 +1,425 @@
+"""
+列式特征表：布尔特征按位打包，数值特征为定长 NumPy 数组，switching_cost 存为 uint8 分类码；
+每列一个 .npy 文件，打开时 mmap，百万客户的表不用解析即可被批处理与页面共享。
+FeatureRow 是单行的只读视图，行为与 extract_features 返回的字典一致，可直接交给 pick_methods / explain_triggers。
+
+    python feature_store.py build clients.xlsx features/      # Excel -> 特征表
+    python feature_store.py build clients.parquet features/   # CSV / Parquet 走列式读取（见 tabular）
+    python feature_store.py info features/
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import uuid
+from collections.abc import Mapping
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from tracing import traced
+
+STORE_VERSION = 1
+
+# 字段 -> 存储类型；industry_data 的字段写作 "industry_data.<字段>"
+BOOL_FIELDS = ["is_new_market", "macro_signals", "internal_data_ready", "exec_gap", "industry_data.price_war"]
+NUMERIC_FIELDS = {
+    "bu_count": "int16",
+    "share_growth": "float32",
+    "market_growth": "float32",
+    "industry_data.cr5": "float32",
+    "industry_data.hhi": "float32",
+}
+CATEGORY_FIELDS = {"industry_data.switching_cost": ["low", "med", "high"]}
+# extract_features 的派生特征：输入里有就一并存下
+DERIVED_FIELDS = ["is_diversified", "high_competition", "high_growth", "share_problem"]
+
+# 与 extract_features 返回字典一致的顶层键顺序
+TOP_LEVEL_ORDER = ["bu_count", "is_new_market", "macro_signals", "industry_data", "share_growth",
+                   "market_growth", "internal_data_ready", "exec_gap"]
+INDUSTRY_ORDER = ["cr5", "hhi", "price_war", "switching_cost"]
+
+_NULL_CODE = 255
+_CHUNK = 65536
+
+
+def _split(path: str):
+    return path.split(".", 1) if "." in path else (None, path)
+
+
+def _get(rec, path: str):
+    parent, key = _split(path)
+    if parent is None:
+        return rec.get(key)
+    return (rec.get(parent) or {}).get(key)
+
+
+def _file(directory: str, name: str) -> str:
+    return os.path.join(directory, name.replace(".", "__") + ".npy")
+
+
+class FeatureStore:
+    """
+    columns：字段 -> 数组；布尔列为按位打包的 uint8（little 位序），数值列为定长类型，分类列为 uint8 码。
+    valid：字段 -> 按位打包的“非缺失”位图（缺失即原字典里的 None）。
+    """
+
+    def __init__(self, n: int, columns: Dict, valid: Dict, categories: Dict[str, List[str]],
+                 ids=None, fields: Optional[List[str]] = None):
+        self.n = n
+        self.columns = columns
+        self.valid = valid
+        self.categories = categories
+        self.ids = ids
+        self.fields = fields or list(columns)
+        self._top_level = [k for k in TOP_LEVEL_ORDER if k == "industry_data" or k in self.columns] + \
+                          [k for k in DERIVED_FIELDS if k in self.columns]
+
+    def __len__(self) -> int:
+        return self.n
+
+    # —— 构建 ——
+
+    @classmethod
+    @traced("feature_store.from_records")
+    def from_records(cls, records: Iterable, with_ids: bool = False) -> "FeatureStore":
+        """
+        records：extract_features / ingest.to_feature_record 结构的字典（None 视为缺失）；
+        with_ids=True 时每项为 (客户标识, 记录)。
+        按块转为列，块内用 NumPy 批量转换，内存峰值与块大小相关而非总行数。
+        """
+        import numpy as np
+
+        id_parts = [] if with_ids else None
+
+        def strip_ids(pairs):
+            for cid, rec in pairs:
+                id_parts.append(str(cid))
+                yield rec
+
+        records = strip_ids(records) if with_ids else iter(records)
+        first = next(records, None)
+        if first is None:
+            raise ValueError("没有任何记录")
+        fields = BOOL_FIELDS + list(NUMERIC_FIELDS) + list(CATEGORY_FIELDS) + \
+            [k for k in DERIVED_FIELDS if k in first]
+        categories = {k: list(v) for k, v in CATEGORY_FIELDS.items()}
+        parts: Dict[str, List] = {f: [] for f in fields}
+        nulls: Dict[str, List] = {f: [] for f in fields}
+
+        def flush(chunk):
+            for f in fields:
+                raw = [_get(r, f) for r in chunk]
+                missing = np.fromiter((v is None for v in raw), dtype=bool, count=len(raw))
+                nulls[f].append(missing)
+                if f in NUMERIC_FIELDS:
+                    arr = np.array([0 if v is None else v for v in raw], dtype=np.float64)
+                    if NUMERIC_FIELDS[f].startswith("int"):
+                        arr = np.round(arr)
+                    parts[f].append(arr.astype(NUMERIC_FIELDS[f]))
+                elif f in categories:
+                    cats = categories[f]
+                    codes = np.empty(len(raw), dtype=np.uint8)
+                    for i, v in enumerate(raw):
+                        if v is None:
+                            codes[i] = _NULL_CODE
+                            continue
+                        v = str(v)
+                        if v not in cats:
+                            if len(cats) >= _NULL_CODE:
+                                raise ValueError(f"{f} 的取值超过 {_NULL_CODE} 种")
+                            cats.append(v)
+                        codes[i] = cats.index(v)
+                    parts[f].append(codes)
+                else:
+                    parts[f].append(np.fromiter((bool(v) for v in raw), dtype=bool, count=len(raw)))
+
+        chunk = [first]
+        for rec in records:
+            chunk.append(rec)
+            if len(chunk) >= _CHUNK:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+
+        n = sum(len(p) for p in nulls[fields[0]])
+        columns, valid = {}, {}
+        for f in fields:
+            col = np.concatenate(parts[f])
+            columns[f] = np.packbits(col, bitorder="little") if col.dtype == bool else col
+            valid[f] = np.packbits(~np.concatenate(nulls[f]), bitorder="little")
+        id_arr = np.array(id_parts, dtype=str) if with_ids else None
+        return cls(n, columns, valid, categories, id_arr, fields)
+
+    @classmethod
+    @traced("feature_store.from_chunks")
+    def from_chunks(cls, chunks: Iterable) -> "FeatureStore":
+        """
+        chunks：tabular.ColumnChunk（展平列名的类型化数组 + 非缺失掩码），直接按列编码，不经过逐行字典。
+        只存第一块里出现的列；有 ids 时一并保存。
+        """
+        import numpy as np
+
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError("没有任何记录")
+        order = BOOL_FIELDS + list(NUMERIC_FIELDS) + list(CATEGORY_FIELDS)
+        fields = [f for f in order if _split(f)[1] in first.columns]
+        categories = {k: list(v) for k, v in CATEGORY_FIELDS.items() if k in fields}
+        parts: Dict[str, List] = {f: [] for f in fields}
+        oks: Dict[str, List] = {f: [] for f in fields}
+        id_parts = [] if first.ids is not None else None
+
+        for chunk in chain([first], chunks):
+            for f in fields:
+                col, ok = chunk.columns[_split(f)[1]], np.asarray(chunk.valid[_split(f)[1]], dtype=bool)
+                oks[f].append(ok)
+                if f in NUMERIC_FIELDS:
+                    arr = np.where(ok, np.asarray(col, dtype=np.float64), 0.0)
+                    if NUMERIC_FIELDS[f].startswith("int"):
+                        arr = np.round(arr)
+                    parts[f].append(arr.astype(NUMERIC_FIELDS[f]))
+                elif f in categories:
+                    cats = categories[f]
+                    codes = np.full(len(ok), _NULL_CODE, dtype=np.uint8)
+                    # 块内先取不同取值，再整体映射，避免逐个 list.index
+                    uniq, inv = np.unique(np.asarray(col, dtype=object)[ok].astype(str), return_inverse=True)
+                    lut = np.empty(len(uniq), dtype=np.uint8)
+                    for j, v in enumerate(uniq):
+                        v = str(v)
+                        if v not in cats:
+                            if len(cats) >= _NULL_CODE:
+                                raise ValueError(f"{f} 的取值超过 {_NULL_CODE} 种")
+                            cats.append(v)
+                        lut[j] = cats.index(v)
+                    codes[ok] = lut[inv.reshape(-1)]
+                    parts[f].append(codes)
+                else:
+                    parts[f].append(np.asarray(col, dtype=bool) & ok)
+            if id_parts is not None:
+                id_parts.append(np.asarray(chunk.ids).astype(str))
+
+        n = sum(len(p) for p in oks[fields[0]]) if fields else 0
+        columns, valid = {}, {}
+        for f in fields:
+            col = np.concatenate(parts[f])
+            columns[f] = np.packbits(col, bitorder="little") if col.dtype == bool else col
+            valid[f] = np.packbits(np.concatenate(oks[f]), bitorder="little")
+        id_arr = np.concatenate(id_parts) if id_parts is not None else None
+        return cls(n, columns, valid, categories, id_arr, fields)
+
+    # —— 持久化 ——
+
+    def save(self, directory: str) -> None:
+        """
+        写到唯一的临时目录后整体换入：其他进程可能正 mmap 着旧表的 .npy，
+        原地覆盖会截断它们映射的文件（SIGBUS）；换入后旧文件只被删除目录项，已有映射不受影响。
+        """
+        import numpy as np
+
+        base = os.path.abspath(directory.rstrip(os.sep))
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        tmp = f"{base}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp)
+        try:
+            for f in self.fields:
+                np.save(_file(tmp, f), self.columns[f])
+                np.save(_file(tmp, f + ".valid"), self.valid[f])
+            if self.ids is not None:
+                np.save(_file(tmp, "_ids"), self.ids)
+            meta = {"version": STORE_VERSION, "n": self.n, "fields": self.fields,
+                    "categories": self.categories, "has_ids": self.ids is not None}
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+                json.dump(meta, fh, ensure_ascii=False)
+            if os.path.isdir(base):
+                old = f"{base}.old-{uuid.uuid4().hex}"
+                os.replace(base, old)
+                os.replace(tmp, base)
+                shutil.rmtree(old, ignore_errors=True)
+            else:
+                os.replace(tmp, base)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @classmethod
+    @traced("feature_store.open")
+    def open(cls, directory: str, mmap: bool = True) -> "FeatureStore":
+        import numpy as np
+
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"特征表版本不符：{meta.get('version')}（需要 {STORE_VERSION}）")
+        mode = "r" if mmap else None
+        columns = {f: np.load(_file(directory, f), mmap_mode=mode) for f in meta["fields"]}
+        valid = {f: np.load(_file(directory, f + ".valid"), mmap_mode=mode) for f in meta["fields"]}
+        ids = np.load(_file(directory, "_ids"), mmap_mode=mode) if meta.get("has_ids") else None
+        return cls(meta["n"], columns, valid, meta["categories"], ids, meta["fields"])
+
+    # —— 读取 ——
+
+    def _is_bool(self, f: str) -> bool:
+        return f in BOOL_FIELDS or f in DERIVED_FIELDS
+
+    @staticmethod
+    def _bit(packed, i: int) -> bool:
+        return bool(packed[i >> 3] >> (i & 7) & 1)
+
+    def value(self, f: str, i: int):
+        """单元格取值，转为 Python 原生类型；缺失返回 None。"""
+        if not self._bit(self.valid[f], i):
+            return None
+        col = self.columns[f]
+        if self._is_bool(f):
+            return self._bit(col, i)
+        if f in self.categories:
+            return self.categories[f][col[i]]
+        v = col[i]
+        if NUMERIC_FIELDS.get(f, "").startswith("int"):
+            return int(v)
+        # float32 取最短十进制表示，20.7 读回来仍是 20.7 而不是 20.700000762939453
+        return float(str(v))
+
+    def row(self, i: int) -> "FeatureRow":
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        return FeatureRow(self, i)
+
+    def __iter__(self) -> Iterator["FeatureRow"]:
+        return (FeatureRow(self, i) for i in range(self.n))
+
+    def column(self, f: str):
+        """
+        整列解码：布尔列 -> bool 数组（缺失为 False，与 bool(None) 一致）；
+        数值列 -> float64（缺失为 NaN）；分类列 -> object 数组（缺失为 None）。
+        """
+        import numpy as np
+
+        col = self.columns[f]
+        if self._is_bool(f):
+            bits = np.unpackbits(col, count=self.n, bitorder="little").view(bool)
+            return bits & self.valid_mask(f)
+        ok = self.valid_mask(f)
+        if f in self.categories:
+            lut = np.array(self.categories[f] + [None] * (256 - len(self.categories[f])), dtype=object)
+            out = lut[np.asarray(col)]
+            out[~ok] = None
+            return out
+        return np.where(ok, np.asarray(col, dtype=np.float64), np.nan)
+
+    def valid_mask(self, f: str):
+        import numpy as np
+
+        return np.unpackbits(self.valid[f], count=self.n, bitorder="little").view(bool)
+
+    def to_columns(self) -> Dict:
+        """pick_methods_batch / sensitivity.sweep 所需的展平列（industry_data 的字段提升为顶层列）。"""
+        return {_split(f)[1]: self.column(f) for f in self.fields}
+
+    def nbytes(self) -> int:
+        total = sum(c.nbytes for c in self.columns.values()) + sum(v.nbytes for v in self.valid.values())
+        return total + (self.ids.nbytes if self.ids is not None else 0)
+
+
+class _IndustryView(Mapping):
+    def __init__(self, store: FeatureStore, i: int):
+        self._store, self._i = store, i
+
+    def __getitem__(self, key):
+        f = "industry_data." + key
+        if f not in self._store.columns:
+            raise KeyError(key)
+        return self._store.value(f, self._i)
+
+    def __iter__(self):
+        return (k for k in INDUSTRY_ORDER if "industry_data." + k in self._store.columns)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class FeatureRow(Mapping):
+    """单行只读视图：键与 extract_features 的返回值一致，industry_data 为嵌套视图。"""
+
+    def __init__(self, store: FeatureStore, i: int):
+        self._store, self._i = store, i
+
+    def __getitem__(self, key):
+        if key == "industry_data":
+            return _IndustryView(self._store, self._i)
+        if key not in self._store.columns:
+            raise KeyError(key)
+        return self._store.value(key, self._i)
+
+    def __iter__(self):
+        return iter(self._store._top_level)
+
+    def __len__(self) -> int:
+        return len(self._store._top_level)
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+    @property
+    def id(self) -> Optional[str]:
+        return str(self._store.ids[self._i]) if self._store.ids is not None else None
+
+    def to_dict(self) -> Dict:
+        """物化为普通字典（需要跨进程传递或修改时使用）。"""
+        out = dict(self)
+        out["industry_data"] = dict(out["industry_data"])
+        return out
+
+
+def build_from_excel(path: str, out_dir: str, id_column: Optional[str] = None,
+                     limit: Optional[int] = None) -> FeatureStore:
+    from batch_report import iter_clients
+
+    store = FeatureStore.from_records(iter_clients(path, id_column=id_column, limit=limit), with_ids=True)
+    store.save(out_dir)
+    return store
+
+
+def build_from_table(path: str, out_dir: str, id_column: Optional[str] = None) -> FeatureStore:
+    """CSV / Parquet：按块读出类型化列后直接编码。"""
+    from tabular import iter_column_chunks
+
+    store = FeatureStore.from_chunks(iter_column_chunks(path, id_column=id_column))
+    store.save(out_dir)
+    return store
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="列式特征表（mmap）")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="从客户工作簿 / CSV / Parquet 构建特征表")
+    b.add_argument("input")
+    b.add_argument("out_dir")
+    b.add_argument("--id-column", default=None)
+    b.add_argument("--limit", type=int, default=None)
+    i = sub.add_parser("info", help="查看特征表")
+    i.add_argument("directory")
+    args = ap.parse_args(argv)
+
+    from tabular import is_table
+
+    if args.cmd == "build" and is_table(args.input):
+        store = build_from_table(args.input, args.out_dir, args.id_column)
+    elif args.cmd == "build":
+        store = build_from_excel(args.input, args.out_dir, args.id_column, args.limit)
+    else:
+        store = FeatureStore.open(args.directory)
+    print(f"{store.n} 行，{len(store.fields)} 列，{store.nbytes() / max(store.n, 1):.1f} 字节/行")
+    if store.n:
+        print(store.row(0).to_dict())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+增量分析：记录 原始特征 -> 派生特征 / 触发规则 -> 触发说明 / 报告章节 的依赖关系，
+输入变化时只重算受影响的节点，其余沿用上一次的结果。
+实例放在 st.session_state 里跨脚本重跑保留，what-if 时每次点击只重画真正变了的图。
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Union
+
+from feature_engine import DERIVED
+from matcher import RULES, display_methods, order_methods
+from report import (
+    ChartCache,
+    ReportIR,
+    _bcg_section,
+    _features_section,
+    _flow_section,
+    _load_company_samples,
+    _methodology_section,
+    _porter_section,
+    _summary_section,
+    _swot_section,
+    _triggers_section,
+)
+from tracing import traced
+
+# 报告章节（按输出顺序）-> 依赖的中间结果
+SECTION_DEPS = {
+    "summary": ("methods",),
+    "triggers": ("triggers",),
+    "features": ("feats", "derived"),
+    "swot": ("swot_items",),
+    "methodology": ("methods",),
+    "flow": ("methods",),
+    "bcg": ("bcg_points",),
+    "porter": ("porter_scores",),
+}
+
+
+def flatten_feats(feats: Dict) -> Dict:
+    """industry_data 等嵌套字段展平为 "industry_data.<字段>"，与 RULES/DERIVED 的依赖写法一致。"""
+    flat = {}
+    for k, v in feats.items():
+        if isinstance(v, dict):
+            for kk, vv in v.items():
+                flat[f"{k}.{kk}"] = vv
+        else:
+            flat[k] = v
+    return flat
+
+
+def changed_keys(old: Dict, new: Dict) -> Set[str]:
+    return {k for k in old.keys() | new.keys() if k not in old or k not in new or old[k] != new[k]}
+
+
+class IncrementalAnalysis:
+    """
+    保存上一次的特征、派生值、规则结果与报告章节。
+    update() 对比新旧特征，只重算依赖了变化字段的派生特征与规则；
+    派生值并入"关键特征"章节，与 extract_features 的输出一致；
+    方法或说明没变时，依赖它们的章节（含已渲染的图表字节）原样复用。
+    """
+
+    def __init__(self, models_data: Optional[Dict] = None, backend: str = "matplotlib"):
+        self.models_data = models_data or {}
+        self.backend = backend
+        self.feats: Optional[Dict] = None
+        self.derived: Dict[str, bool] = {}
+        self.fired: Dict[str, bool] = {}
+        self.methods: List[str] = []          # 内部名，顺序同 METHOD_ORDER
+        self.triggers: List[str] = []
+        self.last_recomputed: Set[str] = set()
+        self._flat: Dict = {}
+        self._sample_inputs: Dict[str, object] = {}
+        self._sample_keys: Dict[str, Optional[str]] = {}
+        self._sections: Dict[str, object] = {}
+
+    @traced("incremental.update")
+    def update(self, feats: Dict,
+               bcg_points: Optional[List[Dict]] = None,
+               porter_scores: Optional[Union[Dict, List[Dict]]] = None,
+               swot_items: Optional[List[Dict]] = None,
+               company: Optional[str] = None) -> Set[str]:
+        """
+        feats 结构同 pick_methods 的输入，键需齐全，缺失值显式给 None（派生特征与规则都按不触发处理）。
+        返回本次重算的节点名集合（如 "derived.high_competition"、"rule.competition"、"section.flow"）。
+        """
+        flat = flatten_feats(feats)
+        first = self.feats is None
+        changed = set(flat) if first else changed_keys(self._flat, flat)
+        self.feats, self._flat = feats, flat
+        recomputed: Set[str] = set()
+        stale: Set[str] = {"feats"} if changed else set()
+
+        # 派生特征：只重算依赖了变化字段的；值有变化时"关键特征"章节才重建
+        for name, (deps, derive) in DERIVED.items():
+            if first or changed.intersection(deps):
+                value = derive(feats)
+                recomputed.add(f"derived.{name}")
+                if self.derived.get(name) != value:
+                    stale.add("derived")
+                self.derived[name] = value
+
+        # 触发规则：只重判依赖了变化字段的规则；任一结果翻转时才重排方法与说明
+        flipped = first
+        for rid, (deps, _, when, _) in RULES.items():
+            if first or changed.intersection(deps):
+                fired = bool(when(feats))
+                recomputed.add(f"rule.{rid}")
+                if self.fired.get(rid) != fired:
+                    flipped = True
+                self.fired[rid] = fired
+        if flipped:
+            self.methods = order_methods([m for rid, (_, ms, _, _) in RULES.items() if self.fired[rid] for m in ms])
+            self.triggers = [reason for rid, (_, _, _, reason) in RULES.items() if self.fired[rid]]
+            stale |= {"methods", "triggers"}
+
+        # 图表与 SWOT 输入：都没给时与 build_report 一样按公司加载示例
+        if bcg_points is None and porter_scores is None:
+            bcg_points, porter_scores, samples_swot = _load_company_samples(company)
+            if swot_items is None:
+                swot_items = samples_swot
+        for name, payload in (("bcg_points", bcg_points), ("porter_scores", porter_scores),
+                              ("swot_items", swot_items)):
+            key = None if payload is None else ChartCache.make_key(name, payload)
+            if first or key != self._sample_keys.get(name):
+                self._sample_keys[name] = key
+                self._sample_inputs[name] = payload
+                stale.add(name)
+
+        # 报告章节
+        for name, deps in SECTION_DEPS.items():
+            if name not in self._sections or stale.intersection(deps):
+                self._sections[name] = self._build_section(name)
+                recomputed.add(f"section.{name}")
+
+        self.last_recomputed = recomputed
+        return recomputed
+
+    def _build_section(self, name: str):
+        methods = display_methods(self.methods)
+        if name == "summary":
+            return _summary_section(methods)
+        if name == "triggers":
+            return _triggers_section(self.triggers)
+        if name == "features":
+            return _features_section(self.features())
+        if name == "swot":
+            return _swot_section(self._sample_inputs.get("swot_items"))
+        if name == "methodology":
+            return _methodology_section(methods, self.models_data) if methods and self.models_data else None
+        if name == "flow":
+            return _flow_section(methods, self.backend)
+        if name == "bcg":
+            return _bcg_section(self._sample_inputs.get("bcg_points"), self.backend)
+        if name == "porter":
+            return _porter_section(self._sample_inputs.get("porter_scores"), self.backend)
+        raise KeyError(name)
+
+    def features(self) -> Dict:
+        """原始特征 + 派生特征，形状同 extract_features 的返回值。"""
+        return {**self.feats, **self.derived}
+
+    def display_methods(self) -> List[str]:
+        return display_methods(self.methods)
+
+    def report(self) -> ReportIR:
+        """由当前章节拼出报告 IR；未变的章节与其图表字节直接复用。"""
+        if self.feats is None:
+            raise RuntimeError("尚未运行分析，先调用 update()")
+        sections = [self._sections[name] for name in SECTION_DEPS]
+        return ReportIR('战略分析报告', datetime.now(), [s for s in sections if s is not None])
@@ -0,0 +1,497 @@
+"""
+文件解析：Excel / Word 流式读取。
+Excel 按行迭代（openpyxl read-only），Word 直接从 zip 中 iterparse 正文部件（word/document.xml），
+内存占用与文件大小无关。
+"""
+import contextvars
+import hashlib
+import json
+import os
+import sys
+import threading
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+import tracing
+from tracing import span, traced
+
+# 列名 -> 类型转换，与 app.parse_excel 中 pick() 的 cast 保持一致
+TOP_LEVEL_CASTS = {
+    "bu_count": int,
+    "is_new_market": bool,
+    "macro_signals": bool,
+    "share_growth": float,
+    "market_growth": float,
+    "internal_data_ready": bool,
+    "exec_gap": bool,
+}
+INDUSTRY_CASTS = {
+    "cr5": float,
+    "hhi": float,
+    "price_war": bool,
+    "switching_cost": str,
+}
+# 页面表单的默认转换成本；解析出的记录里保留 None，合并后才补
+DEFAULT_SWITCHING_COST = "med"
+
+
+def _cast(val, cast):
+    # 空单元格直接视为缺失，不走 cast（避免 bool(None)/str(None) 之类的伪值）
+    if val is None:
+        return None
+    try:
+        return cast(val)
+    except Exception:
+        return None
+
+
+def to_feature_record(row: Dict) -> Dict:
+    """把一行 {列名: 原始值} 转为 parse_excel 同结构的特征字典。"""
+    rec = {k: _cast(row.get(k), c) for k, c in TOP_LEVEL_CASTS.items()}
+    rec["industry_data"] = {k: _cast(row.get(k), c) for k, c in INDUSTRY_CASTS.items()}
+    return rec
+
+
+def to_engine_input(rec: Dict) -> Dict:
+    """
+    补齐全部字段，缺失的显式传 None：extract_features 的示例值只在键不存在时兜底（演示用），
+    不能替真实数据里的空单元格或解析失败的值“编”出特征。规则把 None 视为不触发。
+    """
+    data = {k: rec.get(k) for k in TOP_LEVEL_CASTS}
+    ind = rec.get("industry_data") or {}
+    data["industry_data"] = {k: ind.get(k) for k in INDUSTRY_CASTS}
+    return data
+
+
+def _is_xls(file) -> bool:
+    name = getattr(file, "name", file if isinstance(file, str) else "")
+    return str(name).lower().endswith(".xls")
+
+
+def iter_excel_rows(file, limit: Optional[int] = None) -> Iterator[Dict]:
+    """逐行产出 {列名: 原始值}；首行为表头，全空行跳过。limit 为最多读取的数据行数。"""
+    if _is_xls(file):
+        # openpyxl 不支持 .xls，退回 pandas（仅读取所需行数）
+        import pandas as pd
+
+        df = pd.read_excel(file, nrows=limit)
+        for row in df.to_dict("records"):
+            yield {k: (None if v != v else v) for k, v in row.items()}
+        return
+
+    from openpyxl import load_workbook
+
+    with span("openpyxl.load_workbook"):
+        wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else None for h in header]
+        emitted = 0
+        for values in rows:
+            if limit is not None and emitted >= limit:
+                break
+            if all(v is None for v in values):
+                continue
+            yield {h: v for h, v in zip(header, values) if h}
+            emitted += 1
+    finally:
+        wb.close()
+
+
+def iter_excel_records(file, limit: Optional[int] = None) -> Iterator[Dict]:
+    """流式产出类型化的特征记录（结构同 parse_excel 的返回值）。"""
+    for row in iter_excel_rows(file, limit=limit):
+        yield to_feature_record(row)
+
+
+@traced("read_excel_head")
+def read_excel_head(file, n: int = 1) -> List[Dict]:
+    """快速路径：只读前 n 行数据。"""
+    return list(islice(iter_excel_records(file, limit=n), n))
+
+
+def iter_client_analyses(file, limit: Optional[int] = None) -> Iterator[Dict]:
+    """
+    生成器流水线：Excel 行 -> extract_features -> pick_methods。
+    每次产出 {"row": 行号(从 1 起), "feats": ..., "methods": [...]}。
+    """
+    from feature_engine import extract_features
+    from matcher import pick_methods
+
+    for i, rec in enumerate(iter_excel_records(file, limit=limit), start=1):
+        feats = extract_features(to_engine_input(rec))
+        yield {"row": i, "feats": feats, "methods": pick_methods(feats)}
+
+
+# =======================
+# Word 流式文本抽取
+# =======================
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_OFFICE_DOCUMENT = "/officeDocument"
+
+
+def _main_part(zf: zipfile.ZipFile) -> str:
+    """按 _rels/.rels 里的 officeDocument 关系找正文部件，通常是 word/document.xml。"""
+    try:
+        rels = ET.fromstring(zf.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for rel in rels.iter(_REL):
+        if rel.get("Type", "").endswith(_OFFICE_DOCUMENT) and rel.get("TargetMode") != "External":
+            return rel.get("Target", "").lstrip("/")
+    raise KeyError("_rels/.rels 中没有 officeDocument 关系")
+
+
+def _iter_document_xml(file) -> Iterator[Tuple[str, str]]:
+    """iterparse 正文部件，产出 ("paragraph"|"cell", 文本)；正文子元素处理完即清空。"""
+    with zipfile.ZipFile(file) as zf, zf.open(_main_part(zf)) as xml:
+        body = None
+        depth = 0
+        skip = 0            # mc:Fallback 内是 mc:Choice 的重复内容
+        paras = []          # 段落文本缓冲栈（文本框内可嵌套段落）
+        cells = []          # 表格单元格缓冲栈（表格可嵌套）
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                depth += 1
+                if tag == _MC_FALLBACK:
+                    skip += 1
+                elif skip:
+                    continue
+                elif tag == _W + "body":
+                    body = elem
+                elif tag == _W + "p":
+                    paras.append([])
+                elif tag == _W + "tc":
+                    cells.append([])
+                continue
+
+            depth -= 1
+            if tag == _MC_FALLBACK:
+                skip -= 1
+            elif skip:
+                pass
+            elif tag == _W + "t" and paras:
+                paras[-1].append(elem.text or "")
+            elif tag == _W + "tab" and paras:
+                paras[-1].append("\t")
+            elif tag in (_W + "br", _W + "cr") and paras:
+                paras[-1].append("\n")
+            elif tag == _W + "p" and paras:
+                text = "".join(paras.pop()).strip()
+                if cells:
+                    if text:
+                        cells[-1].append(text)
+                elif text:
+                    yield "paragraph", text
+            elif tag == _W + "tc" and cells:
+                text = "\n".join(cells.pop())
+                if text:
+                    yield "cell", text
+            # document > body > 顶层块：块结束后整体释放
+            if depth == 2 and body is not None:
+                body.clear()
+
+
+def iter_docx_blocks(file) -> Iterator[Tuple[str, str]]:
+    """
+    逐块产出 Word 文本：("paragraph", 段落文本) 或 ("cell", 表格单元格文本)，按文档顺序。
+    zip 包正常但部件缺失或 XML 解析失败时退回 python-docx（此时段落在前、表格单元格在后）；
+    根本不是 zip 包时抛 ValueError。
+    """
+    started = False
+    try:
+        for block in _iter_document_xml(file):
+            started = True
+            yield block
+        return
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"不是合法的 .docx 文件：{e}") from e
+    except (KeyError, ET.ParseError):
+        # 已经产出部分内容后再出错，退回会重复输出，直接上抛
+        if started:
+            raise
+    if hasattr(file, "seek"):
+        file.seek(0)
+    from docx import Document
+
+    doc = Document(file)
+    for p in doc.paragraphs:
+        if p.text.strip():
+            yield "paragraph", p.text.strip()
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                if cell.text.strip():
+                    yield "cell", cell.text.strip()
+
+
+def iter_docx_text(file) -> Iterator[str]:
+    """只要文本：逐段/逐单元格产出，可直接喂给 KeywordAutomaton.scan_chunks。"""
+    for _, text in iter_docx_blocks(file):
+        yield text
+
+
+# =======================
+# 上传文件解析结果缓存（按内容哈希）
+# =======================
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _approx_size(value) -> int:
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class UploadCache:
+    """
+    以 (用途, 内容哈希) 为键缓存解析结果：Excel 特征、Word 文本、关键词命中等。
+    条目数与估算字节数双重上限，超出时按 LRU 淘汰；invalidate(digest) 一次清掉某个文件的全部派生结果。
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[str, str], Tuple[object, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, digest: str, default=None):
+        key = (kind, digest)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def get_or_compute(self, kind: str, digest: str, compute: Callable[[], object]):
+        missing = object()
+        value = self.get(kind, digest, missing)
+        if value is not missing:
+            return value
+        value = compute()
+        self.put(kind, digest, value)
+        return value
+
+    def put(self, kind: str, digest: str, value) -> None:
+        key = (kind, digest)
+        size = _approx_size(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size <= self.max_bytes:
+                self._data[key] = (value, size)
+                self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+
+    def invalidate(self, digest: str) -> int:
+        """删除某个文件内容的全部缓存结果，返回删除条数。"""
+        with self._lock:
+            keys = [k for k in self._data if k[1] == digest]
+            for k in keys:
+                self._bytes -= self._data.pop(k)[1]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._data),
+                    "bytes": self._bytes, "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+
+UPLOAD_CACHE = UploadCache()
+
+
+# =======================
+# 多文件并发解析
+# =======================
+
+# 上传总量超过该字节数时改用进程池：openpyxl / iterparse 大多是持 GIL 的纯 Python 工作
+PROCESS_POOL_BYTES = 8 * 1024 * 1024
+MAX_PARSE_WORKERS = 8
+
+
+@dataclass
+class ParsedFile:
+    """单个上传文件的解析结果；error 非空时 value 为空值（{} 或 ""）。"""
+    name: str
+    kind: str                        # "excel" | "word"
+    digest: str
+    value: object = None             # Excel：首行特征记录；Word：全文
+    keywords: Optional[Dict[str, List[str]]] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def upload_kind(name: str) -> Optional[str]:
+    ext = str(name).lower().rsplit(".", 1)[-1]
+    return {"xlsx": "excel", "xls": "excel", "docx": "word"}.get(ext)
+
+
+def _parse_upload(kind: str, name: str, data: bytes,
+                  collect: bool = False) -> Tuple[object, Optional[Dict], float, Optional[List[Dict]]]:
+    """
+    工作线程/子进程里执行：只接收字节，返回 (解析值, 关键词命中, 耗时, span 列表)，异常原样上抛。
+    collect=True（进程池）时在本进程单独采集 span 带回父进程；否则 span 直接记到调用方的 trace，列表为 None。
+    """
+    import io
+    import time
+
+    if collect:
+        with tracing.collect(name) as trace:
+            value, hits, seconds, _ = _parse_upload(kind, name, data)
+        return value, hits, seconds, trace.spans
+
+    t0 = time.perf_counter()
+    buf = io.BytesIO(data)
+    buf.name = name                  # _is_xls 按文件名判断 .xls
+    with span(f"parse_{kind}", file=name, bytes=len(data)):
+        if kind == "excel":
+            records = read_excel_head(buf, 1)
+            return (records[0] if records else {}), None, time.perf_counter() - t0, None
+        from keywords import extract_keywords
+
+        text = "\n".join(iter_docx_text(buf))
+        with span("extract_keywords", chars=len(text)):
+            hits = extract_keywords(text)
+    return text, hits, time.perf_counter() - t0, None
+
+
+def parse_uploads(files: Iterable[Tuple[str, bytes]], workers: Optional[int] = None,
+                  processes: Optional[bool] = None, cache: Optional[UploadCache] = UPLOAD_CACHE,
+                  progress: Optional[Callable[[int, int, ParsedFile], None]] = None) -> List[ParsedFile]:
+    """
+    并发解析多个上传文件，files 为 (文件名, 字节)；返回顺序与输入一致。
+    - 命中 cache 的文件不再派发；解析失败的文件记录 error，不影响其他文件，也不写入缓存。
+    - processes=None 时按上传总量自动选择线程池或进程池。
+    - progress(已完成数, 总数, 结果) 在调用方线程里回调，可直接更新 Streamlit 控件。
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+    files = list(files)
+    results: List[Optional[ParsedFile]] = [None] * len(files)
+    done = 0
+
+    def finish(i: int, res: ParsedFile) -> None:
+        nonlocal done
+        results[i] = res
+        done += 1
+        if progress is not None:
+            progress(done, len(files), res)
+
+    todo = []
+    for i, (name, data) in enumerate(files):
+        kind = upload_kind(name)
+        digest = content_digest(data)
+        if kind is None:
+            finish(i, ParsedFile(name, "unknown", digest, None, error="不支持的文件类型"))
+            continue
+        value = cache.get(kind, digest) if cache is not None else None
+        hits = cache.get("keywords", digest) if cache is not None and kind == "word" else None
+        if value is not None and (kind == "excel" or hits is not None):
+            finish(i, ParsedFile(name, kind, digest, value, hits, cached=True))
+            continue
+        todo.append((i, name, kind, digest, data))
+    if not todo:
+        return results
+
+    if processes is None:
+        processes = sum(len(t[4]) for t in todo) >= PROCESS_POOL_BYTES
+    workers = max(1, min(workers or MAX_PARSE_WORKERS, len(todo), os.cpu_count() or 1))
+    if processes:
+        # Streamlit 服务进程本身是多线程的，fork 不安全；子进程用 spawn 只导入本模块
+        import multiprocessing
+
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+    with span("parse_uploads", files=len(todo), workers=workers, processes=processes), pool:
+        if processes:
+            # 子进程里没有本次请求的 trace：各自采集后带回来并入
+            trace = tracing.current()
+            futures = {pool.submit(_parse_upload, kind, name, data, trace is not None): (i, name, kind, digest)
+                       for i, name, kind, digest, data in todo}
+        else:
+            # 每个任务一份上下文副本，worker 线程里的 span 记到同一份 trace
+            futures = {pool.submit(contextvars.copy_context().run, _parse_upload, kind, name, data):
+                       (i, name, kind, digest) for i, name, kind, digest, data in todo}
+        for fut in as_completed(futures):
+            i, name, kind, digest = futures[fut]
+            try:
+                value, hits, seconds, spans = fut.result()
+            except Exception as e:
+                empty = {} if kind == "excel" else ""
+                finish(i, ParsedFile(name, kind, digest, empty, error=f"{type(e).__name__}: {e}"))
+                continue
+            if spans:
+                trace.merge(spans)
+            if cache is not None:
+                cache.put(kind, digest, value)
+                if hits is not None:
+                    cache.put("keywords", digest, hits)
+            finish(i, ParsedFile(name, kind, digest, value, hits, seconds=seconds))
+    return results
+
+
+def merge_records(records: Iterable[Dict]) -> Tuple[Dict, Dict[str, int]]:
+    """
+    合并多份 Excel 特征记录：每个字段取第一个非空值（按上传顺序）。
+    返回 (合并后的记录, {字段: 来源记录下标})，industry_data 下的字段记为 "industry_data.x"。
+    各文件都没有 switching_cost 时合并结果取 DEFAULT_SWITCHING_COST，不记来源。
+    """
+    merged: Dict = {"industry_data": {}}
+    source: Dict[str, int] = {}
+    for n, rec in enumerate(records):
+        for k, v in (rec or {}).items():
+            if k == "industry_data":
+                for ik, iv in (v or {}).items():
+                    if iv is not None and ik not in merged["industry_data"]:
+                        merged["industry_data"][ik] = iv
+                        source[f"industry_data.{ik}"] = n
+            elif v is not None and k not in merged:
+                merged[k] = v
+                source[k] = n
+    merged["industry_data"].setdefault("switching_cost", DEFAULT_SWITCHING_COST)
+    return merged, source
+
+
+def merge_keywords(hits: Iterable[Dict[str, List[str]]]) -> Dict[str, List[str]]:
+    """多份文档的关键词命中取并集：{方法: 排序后的命中词列表}。"""
+    merged: Dict[str, set] = {}
+    for h in hits:
+        for m, kws in (h or {}).items():
+            merged.setdefault(m, set()).update(kws)
+    return {m: sorted(kws) for m, kws in merged.items()}
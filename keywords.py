@@ -0,0 +1,209 @@
+"""
+方法论关键词匹配。
+把 METHOD_KEYWORDS 预编译为一个多模式匹配器，一次扫描文本即可得到每个方法的命中词、次数与字符偏移。
+"""
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+
+# —— 关键字词典（用于文本提示） ——
+METHOD_KEYWORDS = {
+    "PESTEL": ["政策", "利率", "关税", "法规", "环保", "技术", "社会", "通胀", "宏观"],
+    "FiveForces": ["价格战", "替代品", "进入壁垒", "供应商", "购买者", "份额", "竞争"],
+    "BCG": ["份额", "增长率", "现金牛", "明星", "问题", "瘦狗"],
+    "GE": ["吸引力", "竞争力", "资源配置"],
+    "SWOT": ["优势", "劣势", "机会", "威胁"],
+    "BLM": ["OKR", "KPI", "组织", "人才", "里程碑", "RACI", "执行"]
+}
+
+
+class KeywordAutomaton:
+    """
+    多模式关键词匹配器（编译一次，反复使用）。
+
+    全部关键词按长度降序编译成一个正则交替式，由 C 层一次扫描全文，每个位置取最长命中。
+    起点落在某个命中内部的其他出现只有两类，均在编译时预先算好：
+      - 完全被包含的更短关键词：直接按相对偏移补齐；
+      - 越过命中末尾的关键词（含自身，如 "OKR" 与 "RACI" 之于 "OKRACI"）：按相对偏移做一次 startswith 校验。
+    因此一次扫描得到的命中集合与逐词 `kw in text` 一致，并带全部重叠出现的偏移。
+    """
+
+    def __init__(self, method_keywords: Dict[str, List[str]] = None):
+        self.method_keywords = {m: list(kws) for m, kws in (method_keywords or METHOD_KEYWORDS).items()}
+        owners: Dict[str, List[str]] = {}
+        for m, kws in self.method_keywords.items():
+            for kw in kws:
+                if kw and m not in owners.setdefault(kw, []):
+                    owners[kw].append(m)
+        self._owners = owners
+        words = sorted(owners, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(w) for w in words)) if words else None
+        # 每个关键词 -> [(被包含的关键词, 相对偏移)] 与 [(可能越界的关键词, 相对偏移)]
+        self._inner, self._crossing = {}, {}
+        for w in words:
+            inner, crossing = [], []
+            for p in words:
+                i = w.find(p) if p != w else -1
+                while i != -1:
+                    inner.append((p, i))
+                    i = w.find(p, i + 1)
+                for i in range(1, len(w)):
+                    if len(p) > len(w) - i and p.startswith(w[i:]):
+                        crossing.append((p, i))
+            self._inner[w] = inner
+            self._crossing[w] = crossing
+
+    def iter_matches(self, text: str, base: int = 0):
+        """逐个产出 (关键词, 起始偏移)。"""
+        if not text or self._pattern is None:
+            return
+        inner, crossing = self._inner, self._crossing
+        for mo in self._pattern.finditer(text):
+            start = mo.start()
+            kw = mo.group()
+            yield kw, base + start
+            for p, off in inner[kw]:
+                yield p, base + start + off
+            for p, off in crossing[kw]:
+                if text.startswith(p, start + off):
+                    yield p, base + start + off
+
+    def _empty(self) -> Dict[str, Dict]:
+        return {m: {"count": 0, "keywords": {}} for m in self.method_keywords}
+
+    def _collect(self, hits: Dict[str, Dict], matches) -> Dict[str, Dict]:
+        owners = self._owners
+        for kw, pos in matches:
+            for m in owners[kw]:
+                h = hits[m]
+                h["count"] += 1
+                h["keywords"].setdefault(kw, []).append(pos)
+        return hits
+
+    def scan(self, text: str) -> Dict[str, Dict]:
+        """
+        返回 {方法: {"count": 总命中次数, "keywords": {关键词: [字符偏移, ...]}}}。
+        """
+        return self._collect(self._empty(), self.iter_matches(text))
+
+    def scan_chunks(self, chunks: Iterable[str], sep: str = "\n") -> Dict[str, Dict]:
+        """
+        增量扫描：chunks 依次到达（如段落流），偏移按 sep.join(chunks) 计算。
+        关键词不含分隔符时结果与扫描拼接后的全文一致。
+        """
+        hits = self._empty()
+        base = 0
+        for chunk in chunks:
+            self._collect(hits, self.iter_matches(chunk, base))
+            base += len(chunk) + len(sep)
+        return hits
+
+    def scan_many(self, texts: Iterable[str]) -> List[Dict[str, Dict]]:
+        """批量扫描多篇文档。"""
+        return [self.scan(t) for t in texts]
+
+    def extract(self, text: str) -> Dict[str, List[str]]:
+        """与旧版 extract_keywords 相同的输出：{方法: 排序后的命中词列表}。"""
+        return summarize(self.scan(text))
+
+
+def summarize(hits: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """把 scan 的详细结果收敛为 {方法: 排序后的命中词列表}。"""
+    return {m: sorted(h["keywords"]) for m, h in hits.items()}
+
+
+_DEFAULT: Optional[KeywordAutomaton] = None
+
+
+def default_automaton() -> KeywordAutomaton:
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = KeywordAutomaton(METHOD_KEYWORDS)
+    return _DEFAULT
+
+
+def extract_keywords(text: str) -> Dict[str, List[str]]:
+    return default_automaton().extract(text)
+
+
+def extract_keywords_many(texts: Iterable[str]) -> List[Dict[str, List[str]]]:
+    ac = default_automaton()
+    return [ac.extract(t) for t in texts]
+
+
+# =======================
+# 基准：逐词子串扫描 vs 预编译匹配器
+# =======================
+
+def _substring_extract(text: str) -> Dict[str, List[str]]:
+    """旧实现：每个关键词一次全文扫描。"""
+    return {m: sorted({kw for kw in kws if kw in text}) for m, kws in METHOD_KEYWORDS.items()}
+
+
+def _substring_scan(text: str) -> Dict[str, Dict]:
+    """旧思路下拿到次数与偏移：每个关键词 str.find 循环。"""
+    hits = {m: {"count": 0, "keywords": {}} for m in METHOD_KEYWORDS}
+    for m, kws in METHOD_KEYWORDS.items():
+        for kw in kws:
+            i = text.find(kw)
+            while i != -1:
+                hits[m]["count"] += 1
+                hits[m]["keywords"].setdefault(kw, []).append(i)
+                i = text.find(kw, i + 1)
+    return hits
+
+
+def _synthetic_brief(n_chars: int, seed: int = 0) -> str:
+    import random
+
+    rng = random.Random(seed)
+    words = [kw for kws in METHOD_KEYWORDS.values() for kw in kws]
+    filler = "公司本年度经营情况总体平稳，管理层持续推进战略落地与数字化转型。"
+    parts, size = [], 0
+    while size < n_chars:
+        piece = rng.choice(words) if rng.random() < 0.2 else filler[:rng.randint(4, len(filler))]
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)
+
+
+def benchmark(sizes=(1_000, 100_000, 1_000_000), docs: int = 200, repeat: int = 3) -> List[Dict]:
+    """
+    对比旧的逐词子串扫描与预编译匹配器。
+    单篇：不同长度文本；批量：docs 篇 2k 字的简报。
+    """
+    ac = default_automaton()
+
+    def best(fn, *args):
+        t_best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(*args)
+            t_best = min(t_best, time.perf_counter() - t0)
+        return t_best
+
+    rows = []
+    for n in sizes:
+        text = _synthetic_brief(n)
+        assert ac.extract(text) == _substring_extract(text)
+        rows.append({
+            "case": f"single {n} chars",
+            "substring_presence_s": best(_substring_extract, text),
+            "substring_offsets_s": best(_substring_scan, text),
+            "automaton_s": best(ac.scan, text),
+        })
+    corpus = [_synthetic_brief(2_000, seed=i) for i in range(docs)]
+    rows.append({
+        "case": f"batch {docs} x 2000 chars",
+        "substring_presence_s": best(lambda: [_substring_extract(t) for t in corpus]),
+        "substring_offsets_s": best(lambda: [_substring_scan(t) for t in corpus]),
+        "automaton_s": best(ac.scan_many, corpus),
+    })
+    return rows
+
+
+if __name__ == "__main__":
+    for r in benchmark():
+        print(f"{r['case']:<26} substring(presence) {r['substring_presence_s']*1e3:9.2f} ms | "
+              f"substring(offsets) {r['substring_offsets_s']*1e3:9.2f} ms | "
+              f"automaton {r['automaton_s']*1e3:9.2f} ms")
@@ -0,0 +1,328 @@
+"""
+并发会话压测：进程内模拟 N 个分析师同时使用“数据上传与特征提取”与“生成报告”两页
+（特征录入 -> 规则匹配 -> 触发依据 -> Markdown/DOCX 导出），逐级加压，找出延迟失控的并发数。
+
+    python loadtest.py                                           # 默认 1,2,4,8,16 级
+    python loadtest.py --levels 1,4,16,32 --sessions 4 --slo 3 --out load.json --report load.md
+    python loadtest.py --warm-charts                              # 开启图表缓存（贴近线上，但不检查出图串号）
+
+默认关闭图表缓存，每个会话都真实出图；开启时参照报告已把缓存预热，各会话读到的是同一份缓存字节，
+出图环节的串号检查不起作用，报告里会注明。
+每个会话一个线程（同 Streamlit 每个会话一个脚本线程），各自持有一个 IncrementalAnalysis。
+导出结果与串行生成的参照报告逐项比对：Markdown 全文（去掉生成时间）、DOCX 段落文本与内嵌图片哈希，
+不一致（如拿到了别的会话的图）计为串号。每级报告 p50/p95/p99 延迟、吞吐、错误率与串号率，
+吞吐不再提升或 p95 超过 SLO 的第一级记为饱和点。
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks import _percentile, synth_raw
+
+STAGES = ("analyze", "report", "markdown", "docx")
+_TIMESTAMP = re.compile(r"^生成时间：.*$", re.M)
+_DATA_URI = re.compile(r"data:image/[a-z+]+;base64,([A-Za-z0-9+/=]+)")
+
+# =======================
+# 会话输入与参照结果
+# =======================
+
+def session_feats(rng: random.Random) -> Dict:
+    """页面表单给出的特征：与 synth_raw 相同，但各字段都有值（控件不会给 None）。"""
+    feats = synth_raw(rng)
+    ind = feats["industry_data"]
+    ind["cr5"] = ind["cr5"] if ind["cr5"] is not None else round(rng.uniform(10, 90), 1)
+    ind["hhi"] = ind["hhi"] if ind["hhi"] is not None else round(rng.uniform(300, 4000), 0)
+    return feats
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _markdown_digest(md: bytes) -> Dict:
+    text = md.decode("utf-8")
+    return {"text": _sha(_DATA_URI.sub("data:", _TIMESTAMP.sub("", text)).encode("utf-8")),
+            "images": [_sha(base64.b64decode(m)) for m in _DATA_URI.findall(text)]}
+
+
+def _docx_digest(data: bytes) -> Dict:
+    from docx import Document
+
+    # 第二段是生成时间
+    paragraphs = [p.text for p in Document(io.BytesIO(data)).paragraphs]
+    del paragraphs[1:2]
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        media = sorted(_sha(zf.read(n)) for n in zf.namelist() if n.startswith("word/media/"))
+    return {"text": _sha("\n".join(paragraphs).encode("utf-8")), "images": media}
+
+
+def reference(feats: Dict, models_data: Dict, company: Optional[str]) -> Dict:
+    """串行走 build_report 生成参照（不经 IncrementalAnalysis），作为串号检查的标准答案。"""
+    from feature_engine import with_derived
+    from matcher import display_methods, explain_triggers, pick_methods
+    from report import build_report, render_report
+
+    methods = display_methods(pick_methods(feats))
+    # IncrementalAnalysis 的"关键特征"章节带派生特征
+    ir = build_report(methods, with_derived(feats), explain_triggers(feats), models_data, company=company)
+    return {"methods": methods,
+            "markdown": _markdown_digest(render_report(ir, "markdown").getvalue()),
+            "docx": _docx_digest(render_report(ir, "docx").getvalue())}
+
+# =======================
+# 单个会话
+# =======================
+
+def run_session(feats: Dict, models_data: Dict, company: Optional[str]) -> Dict:
+    """
+    按页面顺序走一遍：运行分析，再导出 Markdown 与 Word。返回各阶段耗时与导出结果。
+    图表是懒渲染的，"report" 阶段里主动取一遍图表字节，出图耗时记在这里而不是 Markdown 导出上。
+    """
+    from incremental import IncrementalAnalysis
+    from report import render_report
+
+    timings = {}
+    t0 = time.perf_counter()
+    analysis = IncrementalAnalysis(models_data)
+    analysis.update(feats)
+    methods = analysis.display_methods()
+    list(analysis.triggers)
+    t1 = time.perf_counter()
+    timings["analyze"] = t1 - t0
+
+    analysis.update(analysis.feats, company=company)
+    ir = analysis.report()
+    for chart in ir.charts():
+        chart.data()
+    t2 = time.perf_counter()
+    timings["report"] = t2 - t1
+
+    md = render_report(ir, "markdown").getvalue()
+    t3 = time.perf_counter()
+    timings["markdown"] = t3 - t2
+
+    docx = render_report(ir, "docx").getvalue()
+    t4 = time.perf_counter()
+    timings["docx"] = t4 - t3
+    timings["total"] = t4 - t0
+    return {"timings": timings, "methods": methods, "markdown": md, "docx": docx}
+
+
+def check_session(out: Dict, ref: Dict) -> List[str]:
+    """与参照逐项比对，返回不一致项（空列表即正确）。"""
+    problems = []
+    if out["methods"] != ref["methods"]:
+        problems.append("methods")
+    md = _markdown_digest(out["markdown"])
+    if md["text"] != ref["markdown"]["text"]:
+        problems.append("markdown.text")
+    if md["images"] != ref["markdown"]["images"]:
+        problems.append("markdown.images")
+    try:
+        docx = _docx_digest(out["docx"])
+    except Exception:
+        return problems + ["docx.unreadable"]
+    if docx["text"] != ref["docx"]["text"]:
+        problems.append("docx.text")
+    if docx["images"] != ref["docx"]["images"]:
+        problems.append("docx.images")
+    return problems
+
+# =======================
+# 逐级加压
+# =======================
+
+def run_level(concurrency: int, profiles: List[Dict], refs: List[Dict], sessions_per_thread: int,
+              models_data: Dict, company: Optional[str], offset: int = 0) -> Dict:
+    """
+    concurrency 个线程同时开跑，每个线程连续跑 sessions_per_thread 个会话。
+    线程里只收集导出结果；校验（解析 DOCX、解码图片、算哈希）在全部线程结束后串行做，不占计时也不抢 GIL。
+    """
+    barrier = threading.Barrier(concurrency)
+    lock = threading.Lock()
+    records: List[Dict] = []
+
+    def worker(tid: int):
+        barrier.wait()
+        for k in range(sessions_per_thread):
+            idx = (offset + tid * sessions_per_thread + k) % len(profiles)
+            try:
+                rec = {"profile": idx, "output": run_session(profiles[idx], models_data, company)}
+            except Exception as e:
+                rec = {"profile": idx, "error": repr(e)}
+            with lock:
+                records.append(rec)
+
+    threads = [threading.Thread(target=worker, args=(t,), name=f"session-{t}") for t in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    for r in records:
+        out = r.pop("output", None)
+        if out is not None:
+            r["timings"] = out["timings"]
+            r["problems"] = check_session(out, refs[r["profile"]])
+    ok = [r for r in records if "error" not in r]
+    errors = [r for r in records if "error" in r]
+    corrupted = [r for r in ok if r["problems"]]
+    total = sorted(r["timings"]["total"] for r in ok)
+    stage_p95 = {s: _percentile(sorted(r["timings"][s] for r in ok), 0.95) for s in STAGES}
+    n = len(records)
+    return {
+        "concurrency": concurrency,
+        "sessions": n,
+        "wall_s": wall,
+        "throughput_per_s": len(ok) / wall if wall > 0 else 0.0,
+        "p50_s": _percentile(total, 0.50),
+        "p95_s": _percentile(total, 0.95),
+        "p99_s": _percentile(total, 0.99),
+        "max_s": total[-1] if total else 0.0,
+        "stage_p95_s": stage_p95,
+        "error_rate": len(errors) / n if n else 0.0,
+        "corruption_rate": len(corrupted) / n if n else 0.0,
+        "problems": dict(Counter(p for r in corrupted for p in r["problems"])),
+        "errors": sorted({r["error"] for r in errors})[:5],
+    }
+
+
+def find_saturation(levels: List[Dict], slo: float, min_gain: float = 0.05) -> Dict:
+    """
+    饱和点：第一个满足以下任一条件的级别——p95 超过 SLO、出现错误或串号、
+    吞吐比此前最好水平提升不足 min_gain（再加并发只会排队）。
+    """
+    best, best_level = 0.0, None
+    for lv in levels:
+        reasons = []
+        if lv["p95_s"] > slo:
+            reasons.append(f"p95 {lv['p95_s']:.2f}s 超过 SLO {slo:.2f}s")
+        if lv["error_rate"] or lv["corruption_rate"]:
+            reasons.append(f"错误率 {lv['error_rate']:.1%} / 串号率 {lv['corruption_rate']:.1%}")
+        if best_level is not None and lv["throughput_per_s"] < best * (1 + min_gain):
+            reasons.append(f"吞吐 {lv['throughput_per_s']:.2f}/s 未超过 {best:.2f}/s 的 {1 + min_gain:.0%}")
+        if reasons:
+            return {"saturated_at": lv["concurrency"], "max_healthy": best_level, "reasons": reasons}
+        best, best_level = lv["throughput_per_s"], lv["concurrency"]
+    return {"saturated_at": None, "max_healthy": best_level, "reasons": []}
+
+
+def run_loadtest(levels: List[int], sessions_per_thread: int = 3, profiles: int = 24, seed: int = 0,
+                 slo: float = 2.0, warm_charts: bool = False, company: Optional[str] = None,
+                 log=print) -> Dict:
+    import report
+    from report import load_models_data
+
+    models_data = load_models_data()
+    rng = random.Random(seed)
+    inputs = [session_feats(rng) for _ in range(profiles)]
+    font = report.warm_fonts()
+    saved = report.CHART_CACHE
+    if not warm_charts:
+        report.configure_chart_cache(max_bytes=0)
+    try:
+        t0 = time.perf_counter()
+        refs = [reference(f, models_data, company) for f in inputs]
+        log(f"参照报告 {profiles} 份（串行）{time.perf_counter() - t0:.1f}s；字体 {font}")
+        results, offset = [], 0
+        for c in levels:
+            lv = run_level(c, inputs, refs, sessions_per_thread, models_data, company, offset)
+            offset += lv["sessions"]
+            results.append(lv)
+            log(f"并发 {c:>3}：{lv['sessions']:>4} 会话  p50 {lv['p50_s']:6.2f}s  p95 {lv['p95_s']:6.2f}s  "
+                f"p99 {lv['p99_s']:6.2f}s  吞吐 {lv['throughput_per_s']:6.2f}/s  "
+                f"错误 {lv['error_rate']:.1%}  串号 {lv['corruption_rate']:.1%}")
+    finally:
+        report.CHART_CACHE = saved
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "font": font,
+        "warm_charts": warm_charts,
+        "profiles": profiles,
+        "sessions_per_thread": sessions_per_thread,
+        "slo_s": slo,
+        "levels": results,
+        "saturation": find_saturation(results, slo),
+    }
+
+
+def render_markdown(result: Dict) -> str:
+    sat = result["saturation"]
+    lines = [
+        "# 并发会话压测报告",
+        "",
+        f"生成时间：{result['created']}；Python {result['python']}；字体 {result['font']}；"
+        + ("图表缓存开启（各会话读同一份缓存字节，出图串号未检查）" if result["warm_charts"] else "图表缓存关闭")
+        + f"；每线程 {result['sessions_per_thread']} 个会话，"
+        f"输入 {result['profiles']} 种；SLO p95 ≤ {result['slo_s']:.2f}s",
+        "",
+        "| 并发 | 会话 | p50 s | p95 s | p99 s | 吞吐 /s | 错误率 | 串号率 | p95 分析 / IR+出图 / MD / DOCX s |",
+        "|---:|---:|---:|---:|---:|---:|---:|---:|---|",
+    ]
+    for lv in result["levels"]:
+        st = lv["stage_p95_s"]
+        lines.append(f"| {lv['concurrency']} | {lv['sessions']} | {lv['p50_s']:.2f} | {lv['p95_s']:.2f} | "
+                     f"{lv['p99_s']:.2f} | {lv['throughput_per_s']:.2f} | {lv['error_rate']:.1%} | "
+                     f"{lv['corruption_rate']:.1%} | " + " / ".join(f"{st[s]:.2f}" for s in STAGES) + " |")
+    lines.append("")
+    if sat["saturated_at"] is None:
+        lines.append(f"**饱和点**：测试范围内未饱和（最高健康并发 {sat['max_healthy']}）。")
+    else:
+        lines.append(f"**饱和点**：并发 {sat['saturated_at']}（最高健康并发 {sat['max_healthy']}）")
+        lines.extend(f"- {r}" for r in sat["reasons"])
+    problems = Counter()
+    for lv in result["levels"]:
+        problems.update(lv["problems"])
+    if problems:
+        lines.append("")
+        lines.append("**串号明细**：" + "，".join(f"{k} × {v}" for k, v in problems.most_common()))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="并发会话压测（进程内，无浏览器）")
+    ap.add_argument("--levels", default="1,2,4,8,16", help="逗号分隔的并发级别")
+    ap.add_argument("--sessions", type=int, default=3, help="每个线程连续跑的会话数")
+    ap.add_argument("--profiles", type=int, default=24, help="不同输入的份数（会话轮流使用）")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--slo", type=float, default=2.0, help="单会话 p95 延迟上限（秒）")
+    ap.add_argument("--warm-charts", action="store_true",
+                    help="开启图表缓存（默认关闭；开启后出图串号检查不起作用）")
+    ap.add_argument("--company", default=None, help="示例数据集公司 id，默认 datasets.DEFAULT_COMPANY")
+    ap.add_argument("--out", help="结果写入 JSON")
+    ap.add_argument("--report", help="饱和报告写入 Markdown")
+    args = ap.parse_args(argv)
+
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    result = run_loadtest(levels, sessions_per_thread=args.sessions, profiles=args.profiles, seed=args.seed,
+                          slo=args.slo, warm_charts=args.warm_charts, company=args.company)
+    text = render_markdown(result)
+    print("\n" + text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+    bad = any(lv["error_rate"] or lv["corruption_rate"] for lv in result["levels"])
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,66 @@
+from tracing import traced
+
+
+# =======================
+# 触发规则（标量）
+# =======================
+
+# 触发阈值：hhi/cr5 低于阈值视为竞争激烈，bu_count 达到阈值视为多业务，
+# market_growth 达到阈值为高增长，share_growth 不高于阈值为份额问题（后两者只影响派生特征）
+THRESHOLDS = {
+    "hhi": 1500,
+    "cr5": 40,
+    "bu_count": 2,
+    "market_growth": 10,
+    "share_growth": 0,
+}
+
+def _macro_rule(feats) -> bool:
+    return bool(feats.get("is_new_market") or feats.get("macro_signals"))
+
+
+def _competition_rule(feats) -> bool:
+    ind = feats.get("industry_data", {}) or {}
+    cr5 = ind.get("cr5")
+    hhi = ind.get("hhi")
+    price_war = bool(ind.get("price_war"))
+    return (hhi is not None and hhi < THRESHOLDS["hhi"]) or (cr5 is not None and cr5 < THRESHOLDS["cr5"]) or price_war
+
+
+def _portfolio_rule(feats) -> bool:
+    return (feats.get("bu_count") or 0) >= THRESHOLDS["bu_count"]
+
+
+def _execution_rule(feats) -> bool:
+    return bool(feats.get("exec_gap") or feats.get("internal_data_ready"))
+
+
+# 规则表：规则 id -> (依赖的原始特征, 触发的方法, 判定函数, 触发说明)
+# 特征路径中 industry_data 的字段写作 "industry_data.<字段>"；依赖为空表示必跑
+RULES = {
+    "macro": (("is_new_market", "macro_signals"), ["PESTEL"], _macro_rule,
+              "PESTEL：进入新市场或出现宏观信号（is_new_market/macro_signals 为 True）"),
+    "competition": (("industry_data.hhi", "industry_data.cr5", "industry_data.price_war"), ["FiveForces"],
+                    _competition_rule, f"Porter Five Forces：HHI<{THRESHOLDS['hhi']} 或 CR5<{THRESHOLDS['cr5']} 或存在价格战"),
+    "portfolio": (("bu_count",), ["BCG", "GE"], _portfolio_rule,
+                  f"BCG/GE：bu_count≥{THRESHOLDS['bu_count']}，多业务组合需要资源配置建议"),
+    "swot": ((), ["SWOT"], lambda feats: True, "SWOT：基础综合诊断，默认执行"),
+    "execution": (("exec_gap", "internal_data_ready"), ["BLM"], _execution_rule,
+                  "BLM：存在执行落差或内部数据可用，需要战略到执行闭环"),
+}
+
+
+def order_methods(methods):
+    """去重并按固定顺序排列。"""
+    order = ["PESTEL","FiveForces","BCG","GE","SWOT","BLM"]
+    seen, ordered = set(), []
+    for m in order:
+        if m in methods and m not in seen:
+            ordered.append(m); seen.add(m)
+    return ordered
+
+
+@traced("pick_methods")
 def pick_methods(feats, data=None):
     """
     feats 需要包含：
@@ -9,33 +72,151 @@ def pick_methods(feats, data=None):
     methods = []
 
     # A: 宏观触发
-    if feats.get("is_new_market") or feats.get("macro_signals"):
+    if _macro_rule(feats):
         methods.append("PESTEL")
 
     # B: 行业竞争触发
-    ind = feats.get("industry_data", {}) or {}
-    cr5 = ind.get("cr5")
-    hhi = ind.get("hhi")
-    price_war = bool(ind.get("price_war"))
-    high_competition = (hhi is not None and hhi < 1500) or (cr5 is not None and cr5 < 40) or price_war
-    if high_competition:
+    if _competition_rule(feats):
         methods.append("FiveForces")  # 名称统一
 
     # C: 组合分析触发
-    if (feats.get("bu_count") or 0) >= 2:
+    if _portfolio_rule(feats):
         methods.extend(["BCG", "GE"])
 
     # D: SWOT 必跑
     methods.append("SWOT")
 
     # E: 从战略到执行（落地）
-    if feats.get("exec_gap") or feats.get("internal_data_ready"):
+    if _execution_rule(feats):
         methods.append("BLM")
 
-    # 去重并保序
-    order = ["PESTEL","FiveForces","BCG","GE","SWOT","BLM"]
-    seen, ordered = set(), []
-    for m in order:
-        if m in methods and m not in seen:
-            ordered.append(m); seen.add(m)
-    return ordered
+    return order_methods(methods)
+
+
+# 展示名（页面与报告里使用）
+DISPLAY_NAMES = {
+    "FiveForces": "Porter Five Forces",
+}
+
+
+def display_methods(methods):
+    return [DISPLAY_NAMES.get(m, m) for m in methods]
+
+
+@traced("explain_triggers")
+def explain_triggers(feats: dict) -> list:
+    return [reason for _, _, when, reason in RULES.values() if when(feats)]
+
+# =======================
+# 批量规则引擎（列式输入，向量化求值）
+# =======================
+
+METHOD_ORDER = ["PESTEL", "FiveForces", "BCG", "GE", "SWOT", "BLM"]
+
+# industry_data 内的字段在列式输入里被展平为同名列
+INDUSTRY_COLUMNS = ["cr5", "hhi", "price_war", "switching_cost"]
+
+
+def _column(table, name, n=None):
+    """从 DataFrame / dict-of-arrays 中取列，缺失列返回 None。"""
+    import numpy as np
+
+    if hasattr(table, "columns"):
+        if name not in table.columns:
+            return None
+        return table[name].to_numpy()
+    col = table.get(name)
+    if col is None:
+        return None
+    arr = np.asarray(col)
+    if arr.ndim == 0:
+        arr = np.full(n, arr.item(), dtype=object) if n is not None else arr.reshape(1)
+    return arr
+
+
+def _truthy(arr, n):
+    """与 Python 的 bool(v) 语义一致：None/0/False/空串为假，NaN 为真。"""
+    import numpy as np
+
+    if arr is None:
+        return np.zeros(n, dtype=bool)
+    if arr.dtype == bool:
+        return arr
+    if arr.dtype.kind in "iuf":
+        return arr != 0
+    return np.frompyfunc(bool, 1, 1)(arr).astype(bool)
+
+
+def _as_float(arr, n):
+    """转为 float 数组，None 视为 NaN（NaN 与任何阈值比较均为 False，对应标量版的 `is not None` 判断）。"""
+    import numpy as np
+
+    if arr is None:
+        return np.full(n, np.nan)
+    if arr.dtype.kind in "iufb":
+        return arr.astype(float)
+    return np.array([np.nan if v is None else v for v in arr], dtype=float)
+
+
+def _table_len(table) -> int:
+    if hasattr(table, "columns"):
+        return len(table)
+    for v in table.values():
+        if v is not None and getattr(v, "ndim", 1) != 0 and not isinstance(v, (str, bytes)):
+            return len(v)
+    return 1
+
+
+def feats_to_columns(rows) -> dict:
+    """把 feats 字典列表展平为列式 dict（industry_data 的字段提升为顶层列）。"""
+    import numpy as np
+
+    rows = list(rows)
+    names = ["bu_count", "is_new_market", "macro_signals", "share_growth", "market_growth",
+             "internal_data_ready", "exec_gap"]
+    cols = {k: np.array([r.get(k) for r in rows], dtype=object) for k in names}
+    for k in INDUSTRY_COLUMNS:
+        cols[k] = np.array([(r.get("industry_data", {}) or {}).get(k) for r in rows], dtype=object)
+    return cols
+
+
+@traced("pick_methods_batch")
+def pick_methods_batch(table):
+    """
+    批量版 pick_methods。
+    table: pandas DataFrame 或 {列名: 数组}，列为 bu_count, is_new_market, macro_signals,
+           cr5, hhi, price_war, internal_data_ready, exec_gap（industry_data 已展平）
+    返回 (mask, methods)：
+      mask    —— 形状 (n, len(METHOD_ORDER)) 的布尔矩阵，列顺序同 METHOD_ORDER
+      methods —— 每行按 METHOD_ORDER 排序后的方法列表，与 pick_methods 逐行结果一致
+    """
+    import numpy as np
+
+    n = _table_len(table)
+    col = lambda name: _column(table, name, n)
+
+    # A: 宏观触发
+    pestel = _truthy(col("is_new_market"), n) | _truthy(col("macro_signals"), n)
+
+    # B: 行业竞争触发（None/NaN 不触发）
+    with np.errstate(invalid="ignore"):
+        hhi = _as_float(col("hhi"), n)
+        cr5 = _as_float(col("cr5"), n)
+        five = (hhi < THRESHOLDS["hhi"]) | (cr5 < THRESHOLDS["cr5"]) | _truthy(col("price_war"), n)
+
+        # C: 组合分析触发；`(bu_count or 0) >= 2`，None 视为 0
+        bu = _as_float(col("bu_count"), n)
+        portfolio = bu >= THRESHOLDS["bu_count"]
+
+    # E: 从战略到执行
+    blm = _truthy(col("exec_gap"), n) | _truthy(col("internal_data_ready"), n)
+
+    mask = np.column_stack([pestel, five, portfolio, portfolio, np.ones(n, dtype=bool), blm])
+
+    # 相同的布尔组合只筛一次 METHOD_ORDER；每行拿到独立的列表副本，调用方可放心修改
+    codes = mask.astype(np.uint8) @ (1 << np.arange(mask.shape[1], dtype=np.uint8))
+    lookup = {}
+    for c in np.unique(codes):
+        lookup[int(c)] = [m for i, m in enumerate(METHOD_ORDER) if c >> i & 1]
+    methods = [list(lookup[int(c)]) for c in codes]
+    return mask, methods
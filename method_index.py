@@ -0,0 +1,313 @@
+"""
+方法论相似度索引：对 models.json 中每个方法的 名称/简介/应用场景/分析步骤 做字符 n-gram TF-IDF，
+按上传简报的相似度排序给出 top-k 推荐，不依赖手工维护的关键词表。
+
+- 特征：全角转半角、小写后，在连续的汉字/字母数字片段内取 1~3 字符 n-gram（适合不分词的中文），
+  用确定性的乘法哈希映射到 2^DIM_BITS 维，向量化计算，无需维护词表；
+- 索引：按特征存倒排（CSC：特征 -> [(方法, 权重)]），查询只触及简报里出现过的特征；
+- 持久化：若干 .npy 文件 + meta.json，启动时以 mmap 方式打开，models.json 内容变化时自动重建。
+
+    python method_index.py build
+    python method_index.py query 简报.docx -k 3
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import uuid
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from tracing import span, traced
+
+MODELS_PATH = "data/models.json"
+INDEX_DIR = os.path.join("artifacts", "method_index")
+INDEX_VERSION = 1
+
+DIM_BITS = 18
+NGRAMS = (1, 2, 3)
+TEXT_FIELDS = ("简介", "应用场景", "分析步骤")
+
+# 乘法哈希常数（64 位奇数），保证跨进程、跨机器结果一致
+_MULTS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9)
+_SALT = 0x27D4EB2F165667C5
+
+
+# 全角 ASCII（ＡＢＣ１２３）折叠为半角；对本分词而言等价于 NFKC，但比 unicodedata.normalize 快一个数量级
+_FULLWIDTH = {cp: cp - 0xFEE0 for cp in range(0xFF01, 0xFF5F)}
+
+
+def _codepoints(text: str):
+    import numpy as np
+
+    text = (text or "").translate(_FULLWIDTH).lower()
+    cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    # 只保留汉字与 ASCII 字母数字，其余字符（标点、空白）作为片段分隔
+    ok = ((cp >= 0x4E00) & (cp <= 0x9FFF)) | ((cp >= 0x3400) & (cp <= 0x4DBF)) \
+        | ((cp >= 0x30) & (cp <= 0x39)) | ((cp >= 0x61) & (cp <= 0x7A))
+    return cp, ok
+
+
+def hash_ngrams(text: str, bits: int = DIM_BITS, ngrams: Sequence[int] = NGRAMS):
+    """文本 -> 全部 n-gram 的特征下标（可重复，即词频）。"""
+    import numpy as np
+
+    cp, ok = _codepoints(text)
+    out = []
+    with np.errstate(over="ignore"):
+        for n in ngrams:
+            m = len(cp) - n + 1
+            if m <= 0:
+                continue
+            h = np.full(m, np.uint64(_SALT * n & 0xFFFFFFFFFFFFFFFF), dtype=np.uint64)
+            valid = np.ones(m, dtype=bool)
+            for j in range(n):
+                h = (h + cp[j:j + m]) * np.uint64(_MULTS[j])
+                valid &= ok[j:j + m]
+            out.append((h[valid] >> np.uint64(64 - bits)).astype(np.int64))
+    return np.concatenate(out) if out else np.zeros(0, dtype=np.int64)
+
+
+def _tf(text: str, bits: int):
+    """(特征下标, 次线性词频 1+log tf)，下标升序。"""
+    import numpy as np
+
+    feats, counts = np.unique(hash_ngrams(text, bits), return_counts=True)
+    return feats, 1.0 + np.log(counts)
+
+
+def method_text(name: str, meta: Dict) -> str:
+    parts = [name]
+    for k in TEXT_FIELDS:
+        v = meta.get(k)
+        if isinstance(v, list):
+            parts.extend(str(x) for x in v)
+        elif v:
+            parts.append(str(v))
+    return "\n".join(parts)
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class MethodIndex:
+    """
+    feat_ptr[f]:feat_ptr[f+1] 是特征 f 的倒排区间；post_doc/post_w 为对应的方法下标与（已含 idf、已按方法归一化的）权重。
+    """
+
+    def __init__(self, names: List[str], idf, feat_ptr, post_doc, post_w, bits: int = DIM_BITS,
+                 meta: Optional[Dict] = None):
+        self.names = list(names)
+        self.idf = idf
+        self.feat_ptr = feat_ptr
+        self.post_doc = post_doc
+        self.post_w = post_w
+        self.bits = bits
+        self.meta = meta or {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # —— 构建与持久化 ——
+
+    @classmethod
+    @traced("method_index.build")
+    def build(cls, models_data: Dict, bits: int = DIM_BITS, meta: Optional[Dict] = None) -> "MethodIndex":
+        import numpy as np
+
+        names = list(models_data)
+        dim = 1 << bits
+        docs = [_tf(method_text(n, models_data[n] or {}), bits) for n in names]
+        df = np.zeros(dim, dtype=np.int64)
+        for feats, _ in docs:
+            df[feats] += 1
+        # 平滑 idf：未出现过的特征也有有限权重
+        idf = (np.log((1 + len(names)) / (1 + df)) + 1).astype(np.float32)
+
+        doc_ids, feat_ids, weights = [], [], []
+        for i, (feats, tf) in enumerate(docs):
+            w = tf * idf[feats]
+            norm = np.sqrt((w * w).sum()) or 1.0
+            doc_ids.append(np.full(len(feats), i, dtype=np.int32))
+            feat_ids.append(feats)
+            weights.append((w / norm).astype(np.float32))
+        doc_ids = np.concatenate(doc_ids) if docs else np.zeros(0, np.int32)
+        feat_ids = np.concatenate(feat_ids) if docs else np.zeros(0, np.int64)
+        weights = np.concatenate(weights) if docs else np.zeros(0, np.float32)
+
+        order = np.argsort(feat_ids, kind="stable")
+        feat_ptr = np.zeros(dim + 1, dtype=np.int64)
+        np.cumsum(np.bincount(feat_ids, minlength=dim), out=feat_ptr[1:])
+        return cls(names, idf, feat_ptr, doc_ids[order], weights[order], bits, meta)
+
+    def save(self, directory: str) -> None:
+        """写到临时目录后整体替换，读者不会看到写了一半的索引。"""
+        import numpy as np
+
+        # 目录名带 uuid：同一进程里的多个会话线程同时重建也不会共用临时目录
+        tmp = directory.rstrip(os.sep) + f".tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp)
+        for name in ("idf", "feat_ptr", "post_doc", "post_w"):
+            np.save(os.path.join(tmp, name + ".npy"), getattr(self, name))
+        meta = dict(self.meta, names=self.names, bits=self.bits, ngrams=list(NGRAMS), version=INDEX_VERSION)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        if os.path.isdir(directory):
+            old = directory.rstrip(os.sep) + f".old-{uuid.uuid4().hex}"
+            os.replace(directory, old)
+            os.replace(tmp, directory)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.makedirs(os.path.dirname(directory.rstrip(os.sep)) or ".", exist_ok=True)
+            os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "MethodIndex":
+        import numpy as np
+
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mode)
+                  for name in ("idf", "feat_ptr", "post_doc", "post_w")}
+        return cls(meta["names"], bits=meta["bits"], meta=meta, **arrays)
+
+    # —— 查询 ——
+
+    def _query(self, text: str):
+        import numpy as np
+
+        feats, tf = _tf(text, self.bits)
+        w = tf * self.idf[feats]
+        norm = np.sqrt((w * w).sum())
+        return feats, (w / norm if norm else w)
+
+    def _postings(self, feats):
+        """一组特征的倒排区间拼接成 (位置数组, 每个特征的长度)。"""
+        import numpy as np
+
+        starts = np.asarray(self.feat_ptr[feats])
+        lens = np.asarray(self.feat_ptr[feats + 1]) - starts
+        total = int(lens.sum())
+        offs = np.repeat(starts - np.concatenate(([0], np.cumsum(lens)[:-1])), lens) + np.arange(total)
+        return offs, lens
+
+    def scores(self, text: str):
+        """简报与每个方法的余弦相似度，长度 len(self)。"""
+        import numpy as np
+
+        feats, qw = self._query(text)
+        offs, lens = self._postings(feats)
+        return np.bincount(self.post_doc[offs], weights=self.post_w[offs] * np.repeat(qw, lens),
+                           minlength=len(self.names))
+
+    @traced("method_index.search")
+    def search(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        return self._top_k(self.scores(text)[None, :], k)[0]
+
+    @traced("method_index.search_many")
+    def search_many(self, texts: Sequence[str], k: int = 5, batch: int = 256) -> List[List[Tuple[str, float]]]:
+        """
+        批量查询：每批简报的倒排命中拼在一起，一次 bincount 得到 (简报数, 方法数) 的得分矩阵。
+        按 batch 分批，中间数组的大小与归档简报总数无关。
+        """
+        import numpy as np
+
+        n = len(self.names)
+        out = []
+        for lo in range(0, len(texts), batch):
+            with span("method_index.vectorize", briefs=len(texts[lo:lo + batch])):
+                queries = [self._query(t) for t in texts[lo:lo + batch]]
+            feats = np.concatenate([f for f, _ in queries])
+            qw = np.concatenate([w for _, w in queries])
+            qid = np.repeat(np.arange(len(queries)), [len(f) for f, _ in queries])
+            offs, lens = self._postings(feats)
+            rows = np.repeat(qid, lens) * n + self.post_doc[offs]
+            scores = np.bincount(rows, weights=self.post_w[offs] * np.repeat(qw, lens),
+                                 minlength=len(queries) * n)
+            out.extend(self._top_k(scores.reshape(len(queries), n), k))
+        return out
+
+    def _top_k(self, scores, k: int) -> List[List[Tuple[str, float]]]:
+        import numpy as np
+
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        out = []
+        for row, idx in zip(scores, part):
+            idx = idx[np.argsort(-row[idx], kind="stable")]
+            out.append([(self.names[i], float(row[i])) for i in idx if row[i] > 0])
+        return out
+
+
+def build_index(models_path: str = MODELS_PATH, index_dir: str = INDEX_DIR) -> MethodIndex:
+    with open(models_path, "r", encoding="utf-8") as f:
+        models_data = json.load(f)
+    index = MethodIndex.build(models_data, meta={"models_digest": _file_digest(models_path)})
+    index.save(index_dir)
+    return index
+
+
+_LOAD_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def load_method_index(models_path: str = MODELS_PATH, index_dir: str = INDEX_DIR) -> MethodIndex:
+    """
+    进程内只打开一次：磁盘上的索引与当前 models.json 对得上（内容哈希、版本、维度）就 mmap 打开，否则重建并落盘。
+    lru_cache 不会挡住并发的首次调用，加锁保证同一进程只有一个线程在重建，后到的直接打开重建好的索引。
+    """
+    digest = _file_digest(models_path)
+    with _LOAD_LOCK:
+        try:
+            index = MethodIndex.load(index_dir)
+            meta = index.meta
+            if meta.get("models_digest") == digest and meta.get("version") == INDEX_VERSION \
+                    and meta.get("bits") == DIM_BITS and meta.get("ngrams") == list(NGRAMS):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        with span("method_index.rebuild"):
+            return build_index(models_path, index_dir)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="方法论 TF-IDF 相似度索引")
+    ap.add_argument("--models", default=MODELS_PATH)
+    ap.add_argument("--index-dir", default=INDEX_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="从 models.json 重建索引")
+    q = sub.add_parser("query", help="用简报（.docx 或纯文本文件）查询")
+    q.add_argument("files", nargs="+")
+    q.add_argument("-k", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        index = build_index(args.models, args.index_dir)
+        print(f"{len(index)} 个方法，{len(index.post_doc)} 个倒排项 -> {args.index_dir}")
+        return 0
+
+    from ingest import iter_docx_text
+
+    index = load_method_index(args.models, args.index_dir)
+    texts = []
+    for fn in args.files:
+        if fn.lower().endswith(".docx"):
+            texts.append("\n".join(iter_docx_text(fn)))
+        else:
+            with open(fn, "r", encoding="utf-8") as f:
+                texts.append(f.read())
+    for fn, hits in zip(args.files, index.search_many(texts, args.k)):
+        print(fn + "：" + "，".join(f"{name} {score:.3f}" for name, score in hits))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+业务组合引擎：对成百上千个业务单元（BU）做向量化的 BCG 四象限与 GE 九宫格分类，
+给出汇总统计，并提供批量散点图用的标签避让（只给放得下的点写名字）。
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from tracing import traced
+
+if TYPE_CHECKING:
+    import numpy as np
+
+BCG_QUADRANTS = ("明星", "现金牛", "问题", "瘦狗")
+GE_LEVELS = ("高", "中", "低")
+GE_ZONES = ("投资发展", "选择维持", "收获放弃")
+
+
+@dataclass(frozen=True)
+class PortfolioThresholds:
+    """
+    growth/share：BCG 的增长率（%）与相对份额分界。
+    ge_low/ge_high：GE 两个维度（1–5 分）的低/中/高分界。
+    """
+    growth: float = 10.0
+    share: float = 1.0
+    ge_low: float = 7 / 3
+    ge_high: float = 11 / 3
+
+
+DEFAULT_THRESHOLDS = PortfolioThresholds()
+
+# 字段别名：与 report._normalize_bcg_points 一致，另加 GE 两个维度
+_ALIASES = {
+    "name": ("BU", "name", "业务", "业务单元"),
+    "growth": ("market_growth", "growth", "增长率"),
+    "share": ("rel_share", "share", "相对份额"),
+    "attractiveness": ("attractiveness", "行业吸引力"),
+    "strength": ("strength", "竞争地位", "业务实力"),
+}
+
+
+def _pick(row: Dict, field: str):
+    for k in _ALIASES[field]:
+        v = row.get(k)
+        if v is not None:
+            return v
+    return None
+
+
+def to_arrays(points) -> Dict[str, "np.ndarray"]:
+    """
+    BU 输入 -> 列数组 {name, growth, share, attractiveness, strength}。
+    points 可以是字典列表（容忍字段别名）、{列名: 数组} 或 DataFrame；growth/share 缺失或非数值的行被丢弃。
+    """
+    import numpy as np
+
+    if hasattr(points, "columns") or isinstance(points, dict):
+        cols = {f: next((np.asarray(points[k]) for k in _ALIASES[f] if k in points), None) for f in _ALIASES}
+        # 行数取最长的列；缺列或较短的列补 None，这些行在下面按 growth/share 缺失丢弃
+        n = max((len(a) for a in cols.values() if a is not None), default=0)
+        for f, a in cols.items():
+            if a is not None and len(a) < n:
+                cols[f] = np.full(n, None, dtype=object)
+                cols[f][:len(a)] = a
+    else:
+        rows = [p for p in (points or []) if isinstance(p, dict)]
+        n = len(rows)
+        cols = {f: np.array([_pick(r, f) for r in rows], dtype=object) for f in _ALIASES}
+
+    def num(arr):
+        if arr is None:
+            return np.full(n, np.nan)
+        if arr.dtype.kind in "iuf":
+            return arr.astype(float)
+        out = np.full(n, np.nan)
+        for i, v in enumerate(arr):
+            try:
+                out[i] = float(v) if v is not None else np.nan
+            except (TypeError, ValueError):
+                pass
+        return out
+
+    growth, share = num(cols["growth"]), num(cols["share"])
+    keep = ~(np.isnan(growth) | np.isnan(share))
+    names = cols["name"] if cols["name"] is not None else np.full(n, None, dtype=object)
+    names = np.array(["BU" if v is None else str(v) for v in names], dtype=object)
+    return {
+        "name": names[keep],
+        "growth": growth[keep],
+        "share": share[keep],
+        "attractiveness": num(cols["attractiveness"])[keep],
+        "strength": num(cols["strength"])[keep],
+    }
+
+
+def ge_proxies(growth, share, thresholds: PortfolioThresholds = DEFAULT_THRESHOLDS):
+    """
+    没有 GE 评分时的代理值（1–5 分）：
+    行业吸引力随增长率线性变化（0% -> 1 分，2×增长率分界 -> 5 分）；
+    竞争地位按相对份额取对数（份额分界的 1/10 -> 1 分，分界 -> 3 分，10 倍 -> 5 分）。
+    """
+    import numpy as np
+
+    attract = 1 + 4 * np.asarray(growth, float) / (2 * thresholds.growth)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        strength = 3 + 2 * np.log10(np.asarray(share, float) / thresholds.share)
+    return np.clip(attract, 1, 5), np.clip(np.nan_to_num(strength, nan=1.0, neginf=1.0), 1, 5)
+
+
+@dataclass
+class Portfolio:
+    names: "np.ndarray"
+    growth: "np.ndarray"
+    share: "np.ndarray"
+    attractiveness: "np.ndarray"
+    strength: "np.ndarray"
+    bcg: "np.ndarray"            # 下标对应 BCG_QUADRANTS
+    ge_row: "np.ndarray"         # 行业吸引力：0 高 / 1 中 / 2 低
+    ge_col: "np.ndarray"         # 竞争地位：0 高 / 1 中 / 2 低
+    ge_zone: "np.ndarray"        # 下标对应 GE_ZONES
+    thresholds: PortfolioThresholds
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def bcg_labels(self) -> List[str]:
+        return [BCG_QUADRANTS[i] for i in self.bcg]
+
+    def ge_labels(self) -> List[str]:
+        return [f"吸引力{GE_LEVELS[r]}/竞争地位{GE_LEVELS[c]}" for r, c in zip(self.ge_row, self.ge_col)]
+
+    def ge_matrix(self) -> "np.ndarray":
+        """3×3 计数矩阵，行 = 行业吸引力（高→低），列 = 竞争地位（高→低）。"""
+        import numpy as np
+
+        return np.bincount(self.ge_row * 3 + self.ge_col, minlength=9).reshape(3, 3)
+
+    def summary(self, top: int = 5) -> Dict:
+        """各象限/区域的数量、占比、平均增长率与份额，以及按份额排序的代表 BU。"""
+        import numpy as np
+
+        n = len(self)
+
+        def group(codes, labels):
+            out = {}
+            counts = np.bincount(codes, minlength=len(labels))
+            for i, label in enumerate(labels):
+                idx = np.flatnonzero(codes == i)
+                order = idx[np.argsort(-self.share[idx], kind="stable")][:top]
+                out[label] = {
+                    "count": int(counts[i]),
+                    "ratio": float(counts[i] / n) if n else 0.0,
+                    "mean_growth": float(self.growth[idx].mean()) if len(idx) else None,
+                    "mean_share": float(self.share[idx].mean()) if len(idx) else None,
+                    "top": [str(self.names[j]) for j in order],
+                }
+            return out
+
+        return {"bu_count": n, "bcg": group(self.bcg, BCG_QUADRANTS),
+                "ge_zones": group(self.ge_zone, GE_ZONES), "ge_matrix": self.ge_matrix().tolist()}
+
+
+@traced("classify_portfolio")
+def classify(points, thresholds: Optional[PortfolioThresholds] = None) -> Portfolio:
+    """BCG 四象限 + GE 九宫格，全部为数组运算。"""
+    import numpy as np
+
+    th = thresholds or DEFAULT_THRESHOLDS
+    a = to_arrays(points)
+    growth, share = a["growth"], a["share"]
+    high_g, high_s = growth >= th.growth, share >= th.share
+    # 明星 0 / 现金牛 1 / 问题 2 / 瘦狗 3
+    bcg = np.where(high_s, np.where(high_g, 0, 1), np.where(high_g, 2, 3)).astype(np.int8)
+
+    attract, strength = a["attractiveness"], a["strength"]
+    proxy_a, proxy_s = ge_proxies(growth, share, th)
+    attract = np.where(np.isnan(attract), proxy_a, attract)
+    strength = np.where(np.isnan(strength), proxy_s, strength)
+    level = lambda v: np.where(v >= th.ge_high, 0, np.where(v >= th.ge_low, 1, 2)).astype(np.int8)
+    ge_row, ge_col = level(attract), level(strength)
+    # 左上三格投资发展，对角线选择维持，右下三格收获放弃
+    ge_zone = np.clip(ge_row + ge_col - 1, 0, 2).astype(np.int8)
+    return Portfolio(a["name"], growth, share, attract, strength, bcg, ge_row, ge_col, ge_zone, th)
+
+# =======================
+# 标签避让
+# =======================
+
+def declutter(x, y, widths, height: float, priority=None, max_labels: int = 60, pad: float = 4) -> "np.ndarray":
+    """
+    贪心放置标签：按 priority 从高到低，标签框（左下角在点右上方 pad 处）与已放置的框不重叠才保留。
+    x/y/widths/height 同一像素坐标系，y 轴向上；返回保留标签的点下标。
+    用网格桶只和邻近桶里的框比较，几百个点也是近线性。
+    """
+    import numpy as np
+
+    x, y, widths = (np.asarray(v, float) for v in (x, y, widths))
+    order = np.argsort(-np.asarray(priority, float), kind="stable") if priority is not None else np.arange(len(x))
+    cell = max(float(widths.max()) if len(widths) else 1.0, height, 1.0)
+    buckets: Dict[Tuple[int, int], List[Tuple[float, float, float, float]]] = {}
+    kept = []
+    for i in order:
+        if len(kept) >= max_labels:
+            break
+        box = (x[i] + pad, y[i] + pad, x[i] + pad + widths[i], y[i] + pad + height)
+        cx, cy = int(box[0] // cell), int(box[1] // cell)
+        clash = any(box[0] < b[2] and b[0] < box[2] and box[1] < b[3] and b[1] < box[3]
+                    for gx in (cx - 1, cx, cx + 1) for gy in (cy - 1, cy, cy + 1)
+                    for b in buckets.get((gx, gy), ()))
+        if not clash:
+            buckets.setdefault((cx, cy), []).append(box)
+            kept.append(i)
+    return np.array(sorted(kept), dtype=int)
+
+
+def label_width(text: str, size: float) -> float:
+    """估算标签宽度（像素）：CJK 字符按整字宽，其余按半字宽。"""
+    return sum(size if ord(ch) > 0x2E80 else size * 0.6 for ch in text)
+
+
+def quadrant_colors(codes: Sequence[int]) -> List[str]:
+    palette = ("#d62728", "#2ca02c", "#ff7f0e", "#7f7f7f")     # 明星 / 现金牛 / 问题 / 瘦狗
+    return [palette[int(c)] for c in codes]
@@ -0,0 +1,433 @@
+"""
+组合报告：把整本客户工作簿（或 feature_store 目录）写成一份汇总报告，逐客户流式输出。
+Markdown 边算边写入文件；DOCX 的 document.xml 先落到临时文件，最后与图片一起按条目流式写进 zip。
+各客户共用的方法论说明只在附录出现一次，字节相同的图表只存一份，内存占用与客户数无关。
+
+    python portfolio_report.py clients.xlsx --out reports/portfolio --format markdown --format docx
+    python portfolio_report.py features/ --out reports/portfolio --limit 5000 --no-charts
+"""
+import argparse
+import base64
+import hashlib
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from report import Bullet, BulletList, ChartRef, Paragraph, Section
+from tracing import span, traced
+
+FORMATS = ("markdown", "docx")
+METHODOLOGY_TITLE = "附录：方法论说明"
+
+# =======================
+# 图片暂存：按内容哈希去重，字节落盘不留在内存
+# =======================
+
+class ImageSpool:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index: Dict[str, Dict] = {}          # sha256 -> {key, path, mime, size}
+        self.refs = 0
+
+    def add(self, data: bytes) -> Dict:
+        """登记一张图片，返回其元数据；相同字节只写一次。"""
+        self.refs += 1
+        digest = hashlib.sha256(data).hexdigest()
+        meta = self._index.get(digest)
+        if meta is None:
+            svg = data.lstrip().startswith(b"<svg")
+            n = len(self._index) + 1
+            meta = {"key": f"img{n}", "n": n, "mime": "image/svg+xml" if svg else "image/png",
+                    "ext": "svg" if svg else "png", "size": _png_size(data)}
+            meta["path"] = os.path.join(self.directory, f"{meta['key']}.{meta['ext']}")
+            with open(meta["path"], "wb") as f:
+                f.write(data)
+            self._index[digest] = meta
+        return meta
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+def _png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    return struct.unpack(">II", data[16:24])
+
+# =======================
+# 流式输出：逐块写 IR，不保留已写内容
+# =======================
+
+class _Sink:
+    """
+    遍历 IR 块的公共部分；子类实现 heading / paragraph / bullets / picture / finish / _close。
+    输出先写到 self.tmp，finish() 成功后才改名为 self.path；之后 abort() 不再动它。
+    """
+
+    def __init__(self, path: str, images: ImageSpool):
+        self.path = path
+        self.images = images
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        self.done = False
+
+    def _close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        """出错时清理：关闭句柄并删除未完成的临时文件；已 finish 或已 abort 的什么也不做。"""
+        if self.done:
+            return
+        self.done = True
+        self._close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+    def emit(self, blocks) -> None:
+        for b in blocks:
+            if isinstance(b, Section):
+                self.heading(b.title, b.level)
+                self.emit(b.blocks)
+            elif isinstance(b, Paragraph):
+                self.paragraph(b.text, b.label)
+            elif isinstance(b, BulletList):
+                self.bullets(b.items)
+            elif isinstance(b, ChartRef):
+                self.picture(b)
+
+
+class MarkdownSink(_Sink):
+    """Markdown：图片用引用式链接 ![alt][imgN]，data URI 定义在文末各出现一次。"""
+
+    def __init__(self, path: str, images: ImageSpool):
+        super().__init__(path, images)
+        self._f = open(self.tmp, "w", encoding="utf-8")
+        self._used: Dict[str, Dict] = {}
+
+    def begin(self, title: str, generated_at: datetime) -> None:
+        self._f.write(f"# {title}\n\n生成时间：{generated_at.isoformat(timespec='seconds')}\n")
+
+    def heading(self, title: str, level: int) -> None:
+        self._f.write(f"\n{'#' * (level + 1)} {title}\n")
+
+    def paragraph(self, text: str, label: Optional[str]) -> None:
+        self._f.write((f"**{label}**：{text}" if label else text) + "\n")
+
+    def bullets(self, items: List[Bullet]) -> None:
+        for it in items:
+            if it.label is not None:
+                self._f.write(f"- **{it.label}**:" + (f" {it.text}" if it.text else "") + "\n")
+            else:
+                self._f.write(f"- {it.text}\n")
+            for c in it.children:
+                self._f.write(f"  - {c}\n")
+
+    def picture(self, chart: ChartRef) -> None:
+        data = chart.data()
+        if data:
+            meta = self.images.add(data)
+            self._used[meta["key"]] = meta
+            self._f.write(f"![{chart.alt}][{meta['key']}]\n")
+
+    def finish(self) -> None:
+        self._f.write("\n")
+        for key, meta in self._used.items():
+            with open(meta["path"], "rb") as img:
+                self._f.write(f"[{key}]: data:{meta['mime']};base64,")
+                self._f.write(base64.b64encode(img.read()).decode("ascii") + "\n")
+        self._f.close()
+        os.replace(self.tmp, self.path)
+        self.done = True
+
+    def _close(self) -> None:
+        self._f.close()
+
+
+# WordprocessingML 命名空间（正文 + 内嵌图片）
+_W_NS = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+         'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+         'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+         'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+         'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"')
+_IMAGE_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+_SECT_PR = ('<w:sectPr><w:pgSz w:w="12240" w:h="15840"/><w:pgMar w:top="1440" w:right="1800" '
+            'w:bottom="1440" w:left="1800" w:header="720" w:footer="720" w:gutter="0"/>'
+            '<w:cols w:space="720"/><w:docGrid w:linePitch="360"/></w:sectPr>')
+# 与 report.write_docx 的 Inches(6) 一致
+_PICTURE_EMU = 6 * 914400
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _docx_template() -> str:
+    import docx
+
+    return os.path.join(os.path.dirname(docx.__file__), "templates", "default.docx")
+
+
+def _xml_text(s: str) -> str:
+    return escape(_XML_INVALID.sub("", str(s)))
+
+
+class DocxSink(_Sink):
+    """
+    DOCX：样式、主题等部件原样取自 python-docx 的默认模板（样式名与 write_docx 一致），
+    正文段落追加写入临时文件，收尾时与去重后的图片一起流式写进 zip；同一张图片只嵌入一次、共用同一关系 id。
+    """
+
+    def __init__(self, path: str, images: ImageSpool, spool_dir: str):
+        super().__init__(path, images)
+        self._body_path = os.path.join(spool_dir, "document.body.xml")
+        self._body = open(self._body_path, "w", encoding="utf-8")
+        self._rels: Dict[str, Dict] = {}
+        self._drawings = 0
+
+    def _p(self, text: str, style: Optional[str] = None) -> None:
+        ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+        run = f'<w:r><w:t xml:space="preserve">{_xml_text(text)}</w:t></w:r>' if text else ""
+        self._body.write(f"<w:p>{ppr}{run}</w:p>")
+
+    def begin(self, title: str, generated_at: datetime) -> None:
+        self._p(title, "Title")
+        self._p(generated_at.strftime("%Y-%m-%d %H:%M:%S"))
+
+    def heading(self, title: str, level: int) -> None:
+        self._p(title, f"Heading{min(level, 9)}")
+
+    def paragraph(self, text: str, label: Optional[str]) -> None:
+        self._p(f"{label}：{text}" if label else text)
+
+    def bullets(self, items: List[Bullet]) -> None:
+        # 与 write_docx 一致：键值条目用普通段落，嵌套字段用项目符号
+        for it in items:
+            if it.label is not None:
+                self._p(f"{it.label}: {it.text}" if it.text else it.label)
+                for c in it.children:
+                    self._p(c, "ListBullet")
+            else:
+                self._p(it.text, "ListBullet")
+                for c in it.children:
+                    self._p(c, "ListBullet2")
+
+    def picture(self, chart: ChartRef) -> None:
+        data = chart.data(bitmap=True)
+        if not data:
+            return
+        meta = self.images.add(data)
+        if meta["size"] is None:
+            return
+        rid = f"rIdImg{meta['n']}"
+        self._rels[rid] = meta
+        self._drawings += 1
+        w, h = meta["size"]
+        cx, cy = _PICTURE_EMU, int(_PICTURE_EMU * h / w)
+        n = self._drawings
+        self._body.write(
+            f'<w:p><w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">'
+            f'<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{n}" name="Picture {n}"/>'
+            f'<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+            f'<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+            f'<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="{meta["key"]}.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+            f'<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+            f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr></pic:pic>'
+            f'</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>')
+
+    def _content_types(self, template: zipfile.ZipFile) -> bytes:
+        xml = template.read("[Content_Types].xml").decode("utf-8")
+        if 'Extension="png"' not in xml:
+            xml = xml.replace("<Default Extension=\"xml\"",
+                              '<Default Extension="png" ContentType="image/png"/><Default Extension="xml"', 1)
+        return xml.encode("utf-8")
+
+    def _document_rels(self, template: zipfile.ZipFile) -> bytes:
+        xml = template.read("word/_rels/document.xml.rels").decode("utf-8")
+        extra = "".join(f'<Relationship Id="{rid}" Type="{_IMAGE_REL}" Target="media/{m["key"]}.png"/>'
+                        for rid, m in self._rels.items())
+        return xml.replace("</Relationships>", extra + "</Relationships>").encode("utf-8")
+
+    def finish(self) -> None:
+        self._body.close()
+        skip = {"[Content_Types].xml", "word/document.xml", "word/_rels/document.xml.rels"}
+        with span("docx.assemble"), zipfile.ZipFile(_docx_template()) as template, \
+                zipfile.ZipFile(self.tmp, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("[Content_Types].xml", self._content_types(template))
+            for info in template.infolist():
+                if info.filename not in skip:
+                    zf.writestr(info.filename, template.read(info.filename))
+            zf.writestr("word/_rels/document.xml.rels", self._document_rels(template))
+            entry = zipfile.ZipInfo("word/document.xml", time.localtime()[:6])
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(entry, "w", force_zip64=True) as out, \
+                    open(self._body_path, "rb") as body:
+                out.write(("<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+                           f"<w:document {_W_NS}><w:body>").encode("utf-8"))
+                shutil.copyfileobj(body, out, 1 << 20)
+                out.write(f"{_SECT_PR}</w:body></w:document>".encode("utf-8"))
+            for meta in self._rels.values():
+                # PNG 已压缩，直接存储
+                zf.write(meta["path"], f"word/media/{meta['key']}.png", compress_type=zipfile.ZIP_STORED)
+        os.replace(self.tmp, self.path)
+        self.done = True
+
+    def _close(self) -> None:
+        self._body.close()
+
+# =======================
+# 组合报告
+# =======================
+
+def _shift(sec: Section, by: int) -> Section:
+    sec.level += by
+    for b in sec.blocks:
+        if isinstance(b, Section):
+            _shift(b, by)
+    return sec
+
+
+def _client_section(cid: str, methods: List[str], feats: Dict, triggers: List[str],
+                    flow: Optional[ChartRef]) -> Section:
+    """单个客户：推荐方法 / 触发依据 / 关键特征 / 流程图；方法论说明指向附录。"""
+    from report import _features_section, _summary_section, _triggers_section
+
+    blocks = [_summary_section(methods), _triggers_section(triggers), _features_section(feats)]
+    if methods:
+        blocks.append(Section("方法论说明", blocks=[Paragraph(f"见“{METHODOLOGY_TITLE}”：" + "、".join(methods))]))
+    if flow is not None:
+        blocks.append(Section("分析流程图", blocks=[flow]))
+    return Section(cid, blocks=[_shift(s, 1) for s in blocks if s is not None])
+
+
+def _overview_section(n: int, failed: int, combos: Counter, method_counts: Counter, top: int = 10) -> Section:
+    blocks = [Paragraph(f"共 {n} 个客户" + (f"，{failed} 个处理失败" if failed else ""), label="客户数")]
+    if method_counts:
+        blocks.append(Paragraph("", label="各方法推荐次数"))
+        blocks.append(BulletList([Bullet(f"{c} 个（{c / max(n, 1):.0%}）", label=m)
+                                  for m, c in method_counts.most_common()]))
+    if combos:
+        blocks.append(Paragraph("", label=f"常见方法组合（前 {top}）"))
+        blocks.append(BulletList([Bullet(f"{c} 个", label="、".join(combo) or "（无）")
+                                  for combo, c in combos.most_common(top)]))
+    return Section("组合概览", blocks=blocks)
+
+
+@traced("portfolio_report")
+def write_portfolio_report(clients: Iterable[Tuple[str, Dict]],
+                           out_paths: Dict[str, str],
+                           models_data: Optional[Dict] = None,
+                           backend: str = "matplotlib",
+                           charts: bool = True,
+                           title: str = "组合战略分析报告",
+                           log=print) -> Dict:
+    """
+    逐客户分析并写出；out_paths 为 {格式: 路径}（markdown / docx）。
+    客户数据读完即丢，驻留的只有方法组合计数、去重后的流程图与图片索引。
+    """
+    from feature_engine import extract_features
+    from ingest import to_engine_input
+    from matcher import display_methods, explain_triggers, pick_methods
+    from report import _flow_section, _methodology_section, load_models_data
+
+    unknown = set(out_paths) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"组合报告不支持的格式：{', '.join(sorted(unknown))}（可选 {', '.join(FORMATS)}）")
+    models_data = load_models_data() if models_data is None else models_data
+    stats = {"clients": 0, "done": 0, "failed": 0, "errors": []}
+    combos: Counter = Counter()
+    method_counts: Counter = Counter()
+    used_methods: Dict[str, None] = {}              # 按首次出现的顺序
+    flows: Dict[Tuple[str, ...], ChartRef] = {}     # 方法组合 -> 流程图（组合数有限）
+    t0 = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(prefix="portfolio-") as spool_dir:
+        images = ImageSpool(spool_dir)
+        sinks = []
+        try:
+            for fmt, path in out_paths.items():
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                sinks.append(MarkdownSink(path, images) if fmt == "markdown" else DocxSink(path, images, spool_dir))
+            generated_at = datetime.now()
+            for sink in sinks:
+                sink.begin(title, generated_at)
+
+            for cid, rec in clients:
+                stats["clients"] += 1
+                try:
+                    feats = extract_features(to_engine_input(rec))
+                    methods = display_methods(pick_methods(feats))
+                    triggers = explain_triggers(feats)
+                except Exception as e:
+                    stats["failed"] += 1
+                    stats["errors"].append({"client_id": cid, "error": repr(e)})
+                    log(f"[失败] {cid}: {e!r}")
+                    continue
+                key = tuple(methods)
+                flow = None
+                if charts and methods:
+                    if key not in flows:
+                        flows[key] = _flow_section(methods, backend).blocks[0]
+                    flow = flows[key]
+                sec = _client_section(cid, methods, feats, triggers, flow)
+                for sink in sinks:
+                    sink.emit([sec])
+                combos[key] += 1
+                method_counts.update(methods)
+                used_methods.update(dict.fromkeys(methods))
+                stats["done"] += 1
+
+            tail = [_overview_section(stats["clients"], stats["failed"], combos, method_counts)]
+            if used_methods and models_data:
+                appendix = _methodology_section(list(used_methods), models_data)
+                appendix.title = METHODOLOGY_TITLE
+                tail.append(appendix)
+            for sink in sinks:
+                sink.emit(tail)
+                sink.finish()
+        except BaseException:
+            for sink in sinks:
+                sink.abort()
+            raise
+        stats["images"] = len(images)
+        stats["image_refs"] = images.refs
+
+    stats.update({"methods": len(used_methods), "combos": len(combos),
+                  "wall_seconds": time.perf_counter() - t0, "paths": dict(out_paths)})
+    return stats
+
+
+def main(argv=None):
+    from batch_report import EXTENSIONS, ID_COLUMNS, iter_clients
+    from report import MODELS_PATH, load_models_data
+
+    ap = argparse.ArgumentParser(description="把客户工作簿汇总成一份组合报告（流式写出）")
+    ap.add_argument("input", help="客户工作簿（.xlsx / .xls），每行一个客户；或 feature_store 目录")
+    ap.add_argument("--out", default="reports/portfolio", help="输出路径（不含扩展名）")
+    ap.add_argument("--format", dest="formats", action="append", choices=FORMATS, help="可重复指定，默认 docx")
+    ap.add_argument("--backend", default="matplotlib", choices=["matplotlib", "svg"])
+    ap.add_argument("--models", default=MODELS_PATH)
+    ap.add_argument("--id-column", default=None, help="客户标识列，默认依次尝试 " + "/".join(ID_COLUMNS))
+    ap.add_argument("--limit", type=int, default=None, help="只处理前 N 行")
+    ap.add_argument("--no-charts", action="store_true", help="不画流程图")
+    args = ap.parse_args(argv)
+
+    paths = {fmt: args.out + EXTENSIONS[fmt] for fmt in (args.formats or ["docx"])}
+    stats = write_portfolio_report(iter_clients(args.input, id_column=args.id_column, limit=args.limit), paths,
+                                   models_data=load_models_data(args.models), backend=args.backend,
+                                   charts=not args.no_charts)
+    print(f"客户 {stats['clients']}：完成 {stats['done']}，失败 {stats['failed']}；"
+          f"方法 {stats['methods']} 种、组合 {stats['combos']} 种，图片 {stats['images']} 张"
+          f"（引用 {stats['image_refs']} 次），耗时 {stats['wall_seconds']:.1f}s")
+    for p in paths.values():
+        print(f"  {p}")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
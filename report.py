@@ -1,42 +1,335 @@
+import io
 import os
 import json
+import base64
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Union, Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Union, Optional
 
-import matplotlib
-import matplotlib.pyplot as plt
-import numpy as np
-import networkx as nx
-from docx import Document
-from docx.shared import Inches
+from tracing import span, traced
+
+if TYPE_CHECKING:
+    import matplotlib.figure
+    import numpy as np
+
+# matplotlib / numpy / networkx / python-docx 均在真正出图或导出时才导入，
+# 只浏览概览、方法论库等页面时不付这部分启动开销。
+# 出图不经过 pyplot：每张图是自己持有的 Figure + Agg 画布，没有全局“当前图”，多个线程可同时出图。
+CJK_FONTS = ['PingFang SC', 'Heiti SC', 'Hiragino Sans GB', 'Arial Unicode MS', 'Noto Sans CJK SC', 'DejaVu Sans']
+
+_MPL_LOCK = threading.Lock()
+_MPL_READY = False
+
+
+def _matplotlib():
+    """首次出图时导入 matplotlib 并完成字体设置（进程内只做一次）。"""
+    global _MPL_READY
+    if not _MPL_READY:
+        with _MPL_LOCK:
+            if not _MPL_READY:
+                import matplotlib
+
+                # —— 字体设置，修复中文方块/负号 ——
+                matplotlib.rcParams['font.sans-serif'] = list(CJK_FONTS)
+                matplotlib.rcParams['axes.unicode_minus'] = False
+                _MPL_READY = True
+
+
+def _new_figure(figsize) -> "matplotlib.figure.Figure":
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    _matplotlib()
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+@lru_cache(maxsize=None)
+def warm_fonts() -> str:
+    """
+    字体预热：按 CJK_FONTS 顺序找到第一个本机可用的字体，把 font.sans-serif 收窄为 [该字体, DejaVu Sans]，
+    再画一行中文把字体文件与字形缓存加载好。之后每张图不再逐个探测整条回退列表。返回选中的字体名。
+    """
+    _matplotlib()
+    from matplotlib import font_manager, rcParams
+
+    with span("warm_fonts"):
+        chosen = CJK_FONTS[-1]
+        for name in CJK_FONTS:
+            try:
+                font_manager.findfont(font_manager.FontProperties(family=name), fallback_to_default=False)
+            except ValueError:
+                continue
+            chosen = name
+            break
+        with _MPL_LOCK:
+            rcParams['font.sans-serif'] = list(dict.fromkeys([chosen, 'DejaVu Sans']))
+        fig = _new_figure((1, 1))
+        fig.text(0.5, 0.5, '战略分析 BCG −1')
+        fig.canvas.draw()
+    return chosen
+
+
+_WARMUP_STARTED = False
+
+
+def start_font_warmup() -> None:
+    """后台线程里预热字体（进程内只启动一次），不阻塞页面首屏。"""
+    global _WARMUP_STARTED
+    with _MPL_LOCK:
+        if _WARMUP_STARTED:
+            return
+        _WARMUP_STARTED = True
+    threading.Thread(target=warm_fonts, name="warm-fonts", daemon=True).start()
 
-# —— 字体设置，修复中文方块/负号 ——
-matplotlib.rcParams['font.sans-serif'] = [
-    'PingFang SC','Heiti SC','Hiragino Sans GB','Arial Unicode MS','Noto Sans CJK SC','DejaVu Sans'
-]
-matplotlib.rcParams['axes.unicode_minus'] = False
 
 ART_DIR = "artifacts"
-os.makedirs(ART_DIR, exist_ok=True)
+
+
+def artifact_path(filename: str) -> str:
+    """落盘（可选）时使用的唯一路径：artifacts/<名>-<随机串>.<扩展名>，避免并发会话互相覆盖。"""
+    os.makedirs(ART_DIR, exist_ok=True)
+    stem, ext = os.path.splitext(filename)
+    return os.path.join(ART_DIR, f"{stem}-{uuid.uuid4().hex[:12]}{ext}")
+
+
+def _write_sink(buf: io.BytesIO, out_path: Optional[str]) -> io.BytesIO:
+    """可选落盘；内存缓冲始终作为返回值，读指针复位到开头。"""
+    if out_path:
+        with open(out_path, 'wb') as f:
+            f.write(buf.getvalue())
+    buf.seek(0)
+    return buf
+
+
+def _fig_to_png(fig, dpi: int = 150) -> bytes:
+    buf = io.BytesIO()
+    with span("savefig", dpi=dpi):
+        fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
+
+# =======================
+# 图表缓存（按输入内容寻址）
+# =======================
+
+class ChartCache:
+    """
+    图表字节（PNG/SVG）缓存，键为规范化后图表输入的 sha256。
+    内存层按总字节数做 LRU 淘汰；可选磁盘层（disk_dir），按文件 mtime 近似 LRU 淘汰。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind: str, payload, **render_opts) -> str:
+        blob = json.dumps([kind, payload, render_opts], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + ".chart")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._put_mem(key, data)
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        self._put_mem(key, data)
+        if self.disk_dir:
+            self._put_disk(key, data)
+
+    def _put_mem(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = data
+            self._mem_bytes += len(data)
+            while self._mem_bytes > self.max_bytes:
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+
+    def _put_disk(self, key: str, data: bytes) -> None:
+        path = self._disk_path(key)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        try:
+            entries = []
+            for fn in os.listdir(self.disk_dir):
+                if fn.endswith(".chart"):
+                    st_ = os.stat(os.path.join(self.disk_dir, fn))
+                    entries.append((st_.st_mtime, st_.st_size, fn))
+        except OSError:
+            return
+        total = sum(e[1] for e in entries)
+        for _, size, fn in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, fn))
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._mem),
+                "bytes": self._mem_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+CHART_CACHE = ChartCache()
+
+
+def configure_chart_cache(max_bytes: int = 64 * 1024 * 1024,
+                          disk_dir: Optional[str] = None,
+                          disk_max_bytes: int = 512 * 1024 * 1024) -> ChartCache:
+    """替换进程级图表缓存（例如开启磁盘层）；max_bytes=0 等价于关闭内存层。"""
+    global CHART_CACHE
+    CHART_CACHE = ChartCache(max_bytes=max_bytes, disk_dir=disk_dir, disk_max_bytes=disk_max_bytes)
+    return CHART_CACHE
+
+
+def chart_cache_stats() -> Dict:
+    return CHART_CACHE.stats()
+
+
+BACKENDS = ("matplotlib", "svg", "svg-png")
+
+
+def _svg_chart(kind: str, payload, build, backend: str, out_path: Optional[str], dpi: int) -> io.BytesIO:
+    """SVG 后端：build() 返回 SVG 文本；"svg" 直接输出，"svg-png" 栅格化为 PNG（调用方已确认可栅格化）。"""
+    import svg_charts
+
+    if backend == "svg":
+        return _cached_chart(kind + ".svg", payload, lambda: build().encode('utf-8'), out_path)
+    if backend == "svg-png":
+        return _cached_chart(kind + ".svg.png", payload,
+                             lambda dpi: svg_charts.svg_to_png(build(), dpi), out_path, dpi=dpi)
+    raise ValueError(f"未知的图表后端：{backend}（可选 {', '.join(BACKENDS)}）")
+
+
+def _resolve_backend(backend: str) -> str:
+    """校验后端名；"svg-png" 在无法栅格化（缺 cairosvg）时退回 matplotlib。"""
+    import svg_charts
+
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的图表后端：{backend}（可选 {', '.join(BACKENDS)}）")
+    if backend == "svg-png" and not svg_charts.can_rasterize():
+        return "matplotlib"
+    return backend
+
+
+def _png_backend(backend: str) -> str:
+    """需要位图的场合（docx）：SVG 后端在可栅格化时转 PNG，否则退回 matplotlib。"""
+    return _resolve_backend("svg-png" if backend == "svg" else backend)
+
+
+def _cached_chart(kind: str, payload, render, out_path: Optional[str], **render_opts) -> io.BytesIO:
+    """先查缓存，未命中时调用 render(**render_opts) 得到图片字节（PNG/SVG）并写回缓存。"""
+    cache = CHART_CACHE
+    key = cache.make_key(kind, payload, **render_opts)
+    data = cache.get(key)
+    if data is None:
+        with span(f"render.{kind}"):
+            data = render(**render_opts)
+        cache.put(key, data)
+    return _write_sink(io.BytesIO(data), out_path)
 
 # =======================
 # 基础流程图
 # =======================
 
-def draw_flow(methods: List[str], out_path: str = os.path.join(ART_DIR, "flow.png")) -> str:
-    """绘制流程图：输入→多维判断→方法论匹配→每个方法"""
-    G = nx.DiGraph()
-    G.add_edge("客户数据输入", "多维度判断")
-    G.add_edge("多维度判断", "方法论匹配引擎")
-    for m in methods:
-        G.add_edge("方法论匹配引擎", m)
-    pos = nx.spring_layout(G, seed=42)
-    plt.figure(figsize=(8, 6))
-    nx.draw(G, pos, with_labels=True, node_size=2200, font_size=10)
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    return out_path
+@traced("draw_flow")
+def draw_flow(methods: List[str], out_path: Optional[str] = None,
+              dpi: int = 150, figsize=(8, 6), backend: str = "matplotlib") -> io.BytesIO:
+    """绘制流程图：输入→多维判断→方法论匹配→每个方法。返回 PNG 缓冲，给定 out_path 时另存一份。
+    backend="svg" 返回解析式布局的 SVG，"svg-png" 为其栅格化结果（见 svg_charts）。
+    """
+    methods = list(methods or [])
+    backend = _resolve_backend(backend)
+    if backend != "matplotlib":
+        import svg_charts
+        return _svg_chart("flow", methods, lambda: svg_charts.flow_svg(methods), backend, out_path, dpi)
+
+    def render(dpi, figsize):
+        import networkx as nx
+
+        G = nx.DiGraph()
+        G.add_edge("客户数据输入", "多维度判断")
+        G.add_edge("多维度判断", "方法论匹配引擎")
+        for m in methods:
+            G.add_edge("方法论匹配引擎", m)
+        with span("draw_flow.spring_layout"):
+            pos = nx.spring_layout(G, seed=42)
+        fig = _new_figure(figsize)
+        ax = fig.add_subplot()
+        # draw_networkx 画到给定的 ax 上；nx.draw 会回落到 pyplot 的当前图
+        nx.draw_networkx(G, pos, ax=ax, with_labels=True, node_size=2200, font_size=10)
+        ax.set_axis_off()
+        fig.tight_layout()
+        return _fig_to_png(fig, dpi)
+
+    return _cached_chart("flow", methods, render, out_path, dpi=dpi, figsize=list(figsize))
 
 # =======================
 # BCG 四象限
@@ -64,41 +357,73 @@ def _normalize_bcg_points(points: Union[List[Dict], 'np.ndarray']):
     return norm
 
 
+@traced("draw_bcg")
 def draw_bcg(points: Optional[List[Dict]] = None,
-             out_path: str = os.path.join(ART_DIR, "bcg.png")) -> Optional[str]:
+             out_path: Optional[str] = None,
+             dpi: int = 150, figsize=(7, 6), backend: str = "matplotlib",
+             thresholds=None, max_labels: int = 60) -> Optional[io.BytesIO]:
     """绘制 BCG 四象限图。
-    points: [{name, growth(市场增长率%), share(相对份额)}]
+    points: [{name, growth(市场增长率%), share(相对份额)}]，也接受 {列名: 数组}
+    thresholds: portfolio.PortfolioThresholds，默认增长率 10%、相对份额 1.0
+    所有点一次 scatter 画出并按象限着色；标签按份额从大到小贪心避让，最多 max_labels 个。
     """
-    pts = _normalize_bcg_points(points)
-    if not pts:
-        return None
+    import portfolio as pf
 
-    # 阈值：增长率=10% 作为高/低，份额=1.0 作为高/低（可按需调整）
-    g_thr, s_thr = 10.0, 1.0
-
-    plt.figure(figsize=(7, 6))
-    ax = plt.gca()
-    ax.axvline(s_thr, linestyle='--')
-    ax.axhline(g_thr, linestyle='--')
-    ax.set_xlabel('相对市场份额')
-    ax.set_ylabel('市场增长率 (%)')
-    ax.set_title('BCG 矩阵')
-
-    for p in pts:
-        x, y = p['share'], p['growth']
-        ax.scatter(x, y, s=120)
-        ax.text(x + 0.03, y + 0.5, p['name'])
-
-    # 象限标签
-    ax.text(s_thr + 0.1, g_thr + 0.1, '明星', fontsize=11)
-    ax.text(0.1, g_thr + 0.1, '问题', fontsize=11)
-    ax.text(s_thr + 0.1, 0.1, '现金牛', fontsize=11)
-    ax.text(0.1, 0.1, '瘦狗', fontsize=11)
-
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    return out_path
+    port = pf.classify(points, thresholds)
+    if not len(port):
+        return None
+    th = port.thresholds
+    payload = [[str(n), float(g), float(s)] for n, g, s in zip(port.names, port.growth, port.share)]
+    payload.append([th.growth, th.share, max_labels])
+    backend = _resolve_backend(backend)
+    if backend != "matplotlib":
+        import svg_charts
+        return _svg_chart("bcg", payload, lambda: svg_charts.bcg_svg(
+            port, g_thr=th.growth, s_thr=th.share, max_labels=max_labels), backend, out_path, dpi)
+
+    def render(dpi, figsize):
+        import numpy as np
+
+        g_thr, s_thr = th.growth, th.share
+        n = len(port)
+
+        fig = _new_figure(figsize)
+        ax = fig.add_subplot()
+        ax.axvline(s_thr, linestyle='--')
+        ax.axhline(g_thr, linestyle='--')
+        ax.set_xlabel('相对市场份额')
+        ax.set_ylabel('市场增长率 (%)')
+        ax.set_title('BCG 矩阵')
+
+        # 点多时缩小点径，全部点一次画完
+        size = 120 if n <= 50 else max(12.0, 120 * (50 / n) ** 0.5)
+        ax.scatter(port.share, port.growth, s=size, c=pf.quadrant_colors(port.bcg))
+        ax.autoscale_view()
+
+        # 标签避让：换算到像素坐标后贪心放置，份额大的优先
+        font = 10 if n <= 50 else 8
+        px = ax.transData.transform(np.column_stack([port.share, port.growth]))
+        scale = fig.dpi / 72
+        widths = [pf.label_width(str(t), font) * scale for t in port.names]
+        kept = pf.declutter(px[:, 0], px[:, 1], widths, font * 1.2 * scale, priority=port.share,
+                            max_labels=max_labels, pad=3 * scale)
+        for i in kept:
+            ax.annotate(str(port.names[i]), (port.share[i], port.growth[i]), xytext=(3, 3),
+                        textcoords='offset points', fontsize=font)
+        if len(kept) < n:
+            ax.text(0.99, 0.01, f'另有 {n - len(kept)} 个业务单元未标注', transform=ax.transAxes,
+                    ha='right', va='bottom', fontsize=8)
+
+        # 象限标签
+        ax.text(s_thr + 0.1, g_thr + 0.1, '明星', fontsize=11)
+        ax.text(0.1, g_thr + 0.1, '问题', fontsize=11)
+        ax.text(s_thr + 0.1, 0.1, '现金牛', fontsize=11)
+        ax.text(0.1, 0.1, '瘦狗', fontsize=11)
+
+        fig.tight_layout()
+        return _fig_to_png(fig, dpi)
+
+    return _cached_chart("bcg", payload, render, out_path, dpi=dpi, figsize=list(figsize))
 
 # =======================
 # 波特五力 雷达图
@@ -125,196 +450,470 @@ def _normalize_porter_scores(scores: Union[Dict, List[Dict]]):
     return {}
 
 
+@traced("draw_porter_radar")
 def draw_porter_radar(scores: Union[Dict, List[Dict], None] = None,
-                      out_path: str = os.path.join(ART_DIR, "porter_radar.png")) -> Optional[str]:
+                      out_path: Optional[str] = None,
+                      dpi: int = 150, figsize=(6, 6), backend: str = "matplotlib") -> Optional[io.BytesIO]:
     data = _normalize_porter_scores(scores)
     if not data:
         return None
-    labels = list(data.keys())
-    values = [data[k] for k in labels]
-    # 闭合雷达
-    labels.append(labels[0])
-    values.append(values[0])
-
-    angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False)
-    fig = plt.figure(figsize=(6, 6))
-    ax = plt.subplot(111, polar=True)
-    ax.plot(angles, values)
-    ax.fill(angles, values, alpha=0.2)
-    ax.set_thetagrids(angles * 180/np.pi, labels)
-    ax.set_title('波特五力雷达图 (1-5)')
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    return out_path
+    backend = _resolve_backend(backend)
+    if backend != "matplotlib":
+        import svg_charts
+        return _svg_chart("porter_radar", list(data.items()),
+                          lambda: svg_charts.porter_radar_svg(data), backend, out_path, dpi)
+
+    def render(dpi, figsize):
+        import numpy as np
+
+        labels = list(data.keys())
+        values = [data[k] for k in labels]
+        # 闭合雷达
+        labels.append(labels[0])
+        values.append(values[0])
+
+        angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False)
+        fig = _new_figure(figsize)
+        ax = fig.add_subplot(111, polar=True)
+        ax.plot(angles, values)
+        ax.fill(angles, values, alpha=0.2)
+        ax.set_thetagrids(angles * 180/np.pi, labels)
+        ax.set_title('波特五力雷达图 (1-5)')
+        fig.tight_layout()
+        return _fig_to_png(fig, dpi)
+
+    # 雷达图的轴顺序即标签顺序，键里保留原顺序
+    return _cached_chart("porter_radar", list(data.items()), render, out_path, dpi=dpi, figsize=list(figsize))
 
 # =======================
 # 轻量数据加载（若 data/ 目录有示例文件）
 # =======================
 
-def _load_optional_samples():
-    bcg_points = None
-    porter_scores = None
-    # 支持多种文件名
-    for fn in ["data/bcg.json", "data/bcg_sample.json", "data/byd_bcg.json"]:
-        if os.path.exists(fn):
-            try:
-                with open(fn, 'r', encoding='utf-8') as f:
-                    bcg_points = json.load(f)
-                break
-            except Exception:
-                pass
-    for fn in ["data/porter.json", "data/porter_sample.json", "data/byd_porter.json"]:
-        if os.path.exists(fn):
-            try:
-                with open(fn, 'r', encoding='utf-8') as f:
-                    porter_scores = json.load(f)
-                break
-            except Exception:
-                pass
-    return bcg_points, porter_scores
+MODELS_PATH = "data/models.json"
+
+
+@lru_cache(maxsize=None)
+def load_models_data(path: str = MODELS_PATH) -> Dict:
+    """方法论元数据；每个进程只读一次（Streamlit 每次重跑脚本时模块不会重新导入）。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load_company_samples(company: Optional[str] = None):
+    """示例数据集（BCG 点、波特五力评分、SWOT 条目），按公司 id 从数据集存储索引读取。"""
+    from datasets import load_company
+
+    data = load_company(company)
+    if data is None:
+        return None, None, None
+    return data.bcg_points, data.porter_scores, data.swot
 
 # =======================
-# 报告生成（Markdown / Word）
+# 报告中间表示（IR）：一次构建，多种格式输出
 # =======================
 
-def _features_md(feats: Dict) -> str:
-    lines = []
+@dataclass
+class Paragraph:
+    text: str
+    label: Optional[str] = None          # 如 “简介”：Markdown 加粗，Word/HTML 作前缀
+
+
+@dataclass
+class Bullet:
+    text: str
+    children: List[str] = field(default_factory=list)
+    label: Optional[str] = None          # 键值型条目的键，如特征名
+
+
+@dataclass
+class BulletList:
+    items: List[Bullet]
+
+
+@dataclass
+class ChartRef:
+    """图表引用：按后端懒渲染并记住字节，同一份 IR 导出多种格式时只画一次。"""
+    kind: str
+    alt: str
+    draw: Callable[[str], Optional[io.BytesIO]]          # backend -> 图片缓冲
+    backend: str = "matplotlib"
+    _buffers: Dict[str, Optional[bytes]] = field(default_factory=dict, repr=False)
+
+    def _get(self, backend: str) -> Optional[bytes]:
+        if backend not in self._buffers:
+            buf = self.draw(backend)
+            self._buffers[backend] = buf.getvalue() if buf is not None else None
+        return self._buffers[backend]
+
+    def data(self, bitmap: bool = False) -> Optional[bytes]:
+        """图片字节；bitmap=True 时保证为 PNG（docx 只能嵌入位图）。"""
+        return self._get(_png_backend(self.backend) if bitmap else self.backend)
+
+
+@dataclass
+class Section:
+    title: str
+    level: int = 1
+    blocks: List = field(default_factory=list)            # Paragraph / BulletList / ChartRef / Section
+
+
+@dataclass
+class ReportIR:
+    title: str
+    generated_at: datetime
+    sections: List[Section]
+
+    def charts(self) -> List[ChartRef]:
+        out = []
+
+        def walk(blocks):
+            for b in blocks:
+                if isinstance(b, ChartRef):
+                    out.append(b)
+                elif isinstance(b, Section):
+                    walk(b.blocks)
+        walk(self.sections)
+        return out
+
+
+def _method_meta(models_data: Dict, m: str) -> Dict:
+    # 推荐结果用 “Porter Five Forces”，models.json 里叫 “波特五力”
+    return models_data.get(m) or models_data.get(m.replace('Porter Five Forces', '波特五力')) or {}
+
+
+MISSING = '（缺失）'
+
+
+def _feature_text(v) -> str:
+    return MISSING if v is None else str(v)
+
+
+def _features_section(feats: Dict) -> Section:
+    items = []
     for k, v in feats.items():
         if isinstance(v, dict):
-            lines.append(f"- **{k}**:")
-            for kk, vv in v.items():
-                lines.append(f"  - {kk}: {vv}")
+            items.append(Bullet('', [f"{kk}: {_feature_text(vv)}" for kk, vv in v.items()], label=str(k)))
         else:
-            lines.append(f"- **{k}**: {v}")
-    return "\n".join(lines)
+            items.append(Bullet(_feature_text(v), label=str(k)))
+    return Section('关键特征', blocks=[BulletList(items)])
+
+
+def _methodology_section(methods: List[str], models_data: Dict) -> Section:
+    sec = Section('方法论说明')
+    for m in methods:
+        meta = _method_meta(models_data, m)
+        sub = Section(m, level=2)
+        if meta.get('简介'):
+            sub.blocks.append(Paragraph(meta['简介'], label='简介'))
+        if meta.get('应用场景'):
+            sub.blocks.append(Paragraph(meta['应用场景'], label='应用场景'))
+        steps = meta.get('分析步骤') or []
+        if steps:
+            sub.blocks.append(Paragraph('', label='分析步骤'))
+            sub.blocks.append(BulletList([Bullet(s) for s in steps]))
+        sec.blocks.append(sub)
+    return sec
+
+
+def _summary_section(methods: List[str]) -> Section:
+    return Section('推荐方法论', blocks=[Paragraph("、".join(methods) if methods else "（尚未运行分析）")])
+
+
+def _triggers_section(triggers: List[str]) -> Optional[Section]:
+    if not triggers:
+        return None
+    return Section('触发依据', blocks=[BulletList([Bullet(t) for t in triggers])])
+
+
+SWOT_CATEGORIES = ('优势', '劣势', '机会', '威胁')
+
+
+def _swot_section(swot_items: Optional[List[Dict]]) -> Optional[Section]:
+    groups: Dict[str, List[str]] = {}
+    for row in swot_items or []:
+        if isinstance(row, dict) and row.get('类别') and row.get('内容'):
+            groups.setdefault(str(row['类别']), []).append(str(row['内容']))
+    if not groups:
+        return None
+    order = [c for c in SWOT_CATEGORIES if c in groups] + [c for c in groups if c not in SWOT_CATEGORIES]
+    return Section('SWOT 分析', blocks=[BulletList([Bullet('', groups[c], label=c) for c in order])])
+
+
+def _flow_section(methods: List[str], backend: str, flow_png: Optional[io.BytesIO] = None) -> Section:
+    flow = ChartRef('flow', '流程图', lambda be: draw_flow(methods, backend=be), backend)
+    if flow_png is not None:
+        data = flow_png.getvalue()
+        flow._buffers["svg" if data.lstrip().startswith(b"<svg") else "matplotlib"] = data
+    return Section('分析流程图', blocks=[flow])
+
+
+def _bcg_section(bcg_points, backend: str, thresholds=None) -> Optional[Section]:
+    """BCG 四象限图 + 各象限汇总，附 GE 九宫格分区（portfolio 引擎一次分类）。"""
+    import portfolio as pf
+
+    if bcg_points is None or (isinstance(bcg_points, list) and not bcg_points):
+        return None
+    port = pf.classify(bcg_points, thresholds)
+    if not len(port):
+        return None
+    summary = port.summary()
+
+    def items(groups):
+        out = []
+        for label, g in groups.items():
+            if not g["count"]:
+                continue
+            text = (f"{g['count']} 个（{g['ratio']:.0%}），平均增长率 {g['mean_growth']:.1f}%，"
+                    f"平均相对份额 {g['mean_share']:.2f}")
+            out.append(Bullet(text, ["代表：" + "、".join(g["top"])], label=label))
+        return BulletList(out)
+
+    matrix = summary["ge_matrix"]
+    ge = Section('GE 九宫格', level=2, blocks=[
+        items(summary["ge_zones"]),
+        Paragraph('', label='九宫格分布（行：行业吸引力，列：竞争地位）'),
+        BulletList([Bullet(" / ".join(f"{pf.GE_LEVELS[c]} {matrix[r][c]}" for c in range(3)),
+                           label=f"吸引力{pf.GE_LEVELS[r]}") for r in range(3)]),
+    ])
+    return Section('BCG 矩阵', blocks=[
+        ChartRef('bcg', 'BCG', lambda be: draw_bcg(bcg_points, backend=be, thresholds=thresholds), backend),
+        Paragraph(f"共 {summary['bu_count']} 个业务单元", label='象限汇总'),
+        items(summary["bcg"]),
+        ge,
+    ])
+
+
+def _porter_section(porter_scores, backend: str) -> Optional[Section]:
+    if not (porter_scores and _normalize_porter_scores(porter_scores)):
+        return None
+    return Section('波特五力雷达图', blocks=[
+        ChartRef('porter_radar', 'Porter', lambda be: draw_porter_radar(porter_scores, backend=be), backend)])
+
+
+@traced("build_report")
+def build_report(methods: List[str],
+                 feats: Dict,
+                 triggers: List[str],
+                 models_data: Dict,
+                 bcg_points: Optional[List[Dict]] = None,
+                 porter_scores: Optional[Union[Dict, List[Dict]]] = None,
+                 flow_png: Optional[io.BytesIO] = None,
+                 backend: str = "matplotlib",
+                 swot_items: Optional[List[Dict]] = None,
+                 company: Optional[str] = None,
+                 samples: bool = True) -> ReportIR:
+    """
+    构建报告 IR（方法论查找、特征罗列、示例数据加载、图表引用）。
+    图表在首次被某个 writer 取用时渲染，之后各格式共享同一份字节。
+    company 为数据集存储中的公司 id（默认 datasets.DEFAULT_COMPANY），未显式给出图表数据时按它加载示例；
+    samples=False 时不加载示例（批量出报告时各客户没有自己的图表数据，不应套用示例公司的）。
+    """
+    # 兜底加载示例
+    if samples and bcg_points is None and porter_scores is None:
+        bcg_points, porter_scores, samples_swot = _load_company_samples(company)
+        if swot_items is None:
+            swot_items = samples_swot
+    methods = list(methods or [])
+
+    sections = [
+        _summary_section(methods),
+        _triggers_section(triggers),
+        _features_section(feats),
+        _swot_section(swot_items),
+        _methodology_section(methods, models_data) if methods and models_data else None,
+        _flow_section(methods, backend, flow_png),
+        _bcg_section(bcg_points, backend),
+        _porter_section(porter_scores, backend),
+    ]
+    return ReportIR('战略分析报告', datetime.now(), [s for s in sections if s is not None])
+
+# =======================
+# Writers：IR -> 字节
+# =======================
+
+def _image_data_uri(data: bytes) -> str:
+    mime = "image/svg+xml" if data.lstrip().startswith(b"<svg") else "image/png"
+    return f"data:{mime};base64," + base64.b64encode(data).decode('ascii')
+
+
+def write_markdown(ir: ReportIR) -> bytes:
+    """Markdown：图片以 data URI 内嵌，报告自包含。"""
+    lines = [f"# {ir.title}\n\n生成时间：{ir.generated_at.isoformat(timespec='seconds')}\n"]
+
+    def emit(blocks):
+        for b in blocks:
+            if isinstance(b, Section):
+                lines.append(f"\n{'#' * (b.level + 1)} {b.title}")
+                emit(b.blocks)
+            elif isinstance(b, Paragraph):
+                lines.append(f"**{b.label}**：{b.text}" if b.label else b.text)
+            elif isinstance(b, BulletList):
+                for it in b.items:
+                    if it.label is not None:
+                        lines.append(f"- **{it.label}**:" + (f" {it.text}" if it.text else ""))
+                    else:
+                        lines.append(f"- {it.text}")
+                    lines.extend(f"  - {c}" for c in it.children)
+            elif isinstance(b, ChartRef):
+                data = b.data()
+                if data:
+                    lines.append(f"![{b.alt}]({_image_data_uri(data)})\n")
+    emit(ir.sections)
+    return "\n".join(lines).encode('utf-8')
+
+
+_CN_NUM = "一二三四五六七八九十"
+
+
+def write_docx(ir: ReportIR) -> bytes:
+    """Word：一级标题按出现顺序编号（一、二、…），图片从内存嵌入。"""
+    from docx import Document
+    from docx.shared import Inches
+
+    doc = Document()
+    doc.add_heading(ir.title, 0)
+    doc.add_paragraph(ir.generated_at.strftime('%Y-%m-%d %H:%M:%S'))
+
+    def emit(blocks):
+        for b in blocks:
+            if isinstance(b, Section):
+                title = b.title
+                if b.level == 1:
+                    n = emit.count
+                    emit.count += 1
+                    title = f"{_CN_NUM[n] if n < len(_CN_NUM) else n + 1}、{title}"
+                doc.add_heading(title, level=b.level)
+                emit(b.blocks)
+            elif isinstance(b, Paragraph):
+                doc.add_paragraph(f"{b.label}：{b.text}" if b.label else b.text)
+            elif isinstance(b, BulletList):
+                for it in b.items:
+                    if it.label is not None:
+                        # 与旧版一致：键值条目用普通段落，嵌套字段用项目符号
+                        doc.add_paragraph(f"{it.label}: {it.text}" if it.text else it.label)
+                        for c in it.children:
+                            doc.add_paragraph(c, style='List Bullet')
+                    else:
+                        doc.add_paragraph(it.text, style='List Bullet')
+                        for c in it.children:
+                            doc.add_paragraph(c, style='List Bullet 2')
+            elif isinstance(b, ChartRef):
+                data = b.data(bitmap=True)
+                if data:
+                    try:
+                        doc.add_picture(io.BytesIO(data), width=Inches(6))
+                    except Exception:
+                        pass
+    emit.count = 0
+    emit(ir.sections)
+
+    buf = io.BytesIO()
+    with span("docx.save"):
+        doc.save(buf)
+    return buf.getvalue()
+
+
+_HTML_STYLE = (
+    "body{font-family:'PingFang SC','Hiragino Sans GB','Noto Sans CJK SC','Microsoft YaHei',sans-serif;"
+    "max-width:860px;margin:2em auto;padding:0 1em;line-height:1.6;color:#222}"
+    "img{max-width:100%}h1{border-bottom:1px solid #ddd;padding-bottom:.3em}.meta{color:#888}"
+)
+
+
+def write_html(ir: ReportIR) -> bytes:
+    """自包含 HTML：内联样式，图片以 data URI 内嵌。"""
+    from html import escape
+
+    out = ['<!DOCTYPE html><html lang="zh-CN"><head><meta charset="utf-8">',
+           f'<title>{escape(ir.title)}</title><style>{_HTML_STYLE}</style></head><body>',
+           f'<h1>{escape(ir.title)}</h1>',
+           f'<p class="meta">生成时间：{ir.generated_at.isoformat(timespec="seconds")}</p>']
+
+    def emit(blocks):
+        for b in blocks:
+            if isinstance(b, Section):
+                h = min(b.level + 1, 6)
+                out.append(f'<h{h}>{escape(b.title)}</h{h}>')
+                emit(b.blocks)
+            elif isinstance(b, Paragraph):
+                label = f'<strong>{escape(b.label)}</strong>：' if b.label else ''
+                out.append(f'<p>{label}{escape(b.text)}</p>')
+            elif isinstance(b, BulletList):
+                out.append('<ul>')
+                for it in b.items:
+                    sub = ''.join(f'<li>{escape(c)}</li>' for c in it.children)
+                    head = escape(it.text)
+                    if it.label is not None:
+                        head = f'<strong>{escape(it.label)}</strong>' + (f'：{head}' if head else '')
+                    out.append(f'<li>{head}' + (f'<ul>{sub}</ul>' if sub else '') + '</li>')
+                out.append('</ul>')
+            elif isinstance(b, ChartRef):
+                data = b.data()
+                if data:
+                    out.append(f'<figure><img alt="{escape(b.alt)}" src="{_image_data_uri(data)}"></figure>')
+    emit(ir.sections)
+    out.append('</body></html>')
+    return "".join(out).encode('utf-8')
+
+
+WRITERS: Dict[str, Callable[[ReportIR], bytes]] = {
+    "markdown": write_markdown,
+    "docx": write_docx,
+    "html": write_html,
+}
+
+
+def register_writer(fmt: str, writer: Callable[[ReportIR], bytes]) -> None:
+    WRITERS[fmt] = writer
+
+
+def render_report(ir: ReportIR, fmt: str, out_path: Optional[str] = None) -> io.BytesIO:
+    """用指定 writer 输出报告；返回字节缓冲，给定 out_path 时另存一份。"""
+    try:
+        writer = WRITERS[fmt]
+    except KeyError:
+        raise ValueError(f"未知的报告格式：{fmt}（可选 {', '.join(WRITERS)}）")
+    with span(f"write.{fmt}"):
+        return _write_sink(io.BytesIO(writer(ir)), out_path)
+
 
+def export_report(ir: ReportIR, formats: List[str]) -> Dict[str, io.BytesIO]:
+    """同一份 IR 导出多种格式：一次构建，图表只渲染一次。"""
+    return {fmt: render_report(ir, fmt) for fmt in formats}
+
+# =======================
+# 报告生成（Markdown / Word）
+# =======================
 
 def save_markdown_report(methods: List[str],
                          feats: Dict,
                          triggers: List[str],
                          models_data: Dict,
-                         out_path: str = os.path.join(ART_DIR, "report.md"),
+                         out_path: Optional[str] = None,
                          bcg_points: Optional[List[Dict]] = None,
-                         porter_scores: Optional[Union[Dict, List[Dict]]] = None) -> str:
-    """导出 Markdown 报告（含方法简介、触发依据、可用时插入 BCG/五力图）。"""
-    # 兜底加载示例
-    if bcg_points is None and porter_scores is None:
-        bcg_points, porter_scores = _load_optional_samples()
-
-    lines = []
-    lines.append(f"# 战略分析报告\n\n生成时间：{datetime.now().isoformat(timespec='seconds')}\n")
-    lines.append("## 推荐方法论\n" + ("、".join(methods) if methods else "（尚未运行分析）"))
-    if triggers:
-        lines.append("\n## 触发依据\n" + "\n".join([f"- {t}" for t in triggers]))
-    lines.append("\n## 关键特征\n" + _features_md(feats))
-
-    # 方法论简介
-    if methods and models_data:
-        lines.append("\n## 方法论说明")
-        for m in methods:
-            meta = models_data.get(m) or models_data.get(m.replace('Porter Five Forces', '波特五力')) or {}
-            lines.append(f"\n### {m}")
-            if meta.get('简介'):
-                lines.append(f"**简介**：{meta['简介']}")
-            if meta.get('应用场景'):
-                lines.append(f"**应用场景**：{meta['应用场景']}")
-            steps = meta.get('分析步骤') or []
-            if steps:
-                lines.append("**分析步骤**：")
-                for s in steps:
-                    lines.append(f"- {s}")
-
-    # 流程图
-    flow_path = os.path.join(ART_DIR, "flow.png")
-    if os.path.exists(flow_path):
-        lines.append(f"\n## 分析流程图\n![流程图]({flow_path})\n")
-
-    # BCG & 五力
-    bcg_path = draw_bcg(bcg_points) if bcg_points else None
-    if bcg_path:
-        lines.append(f"\n## BCG 矩阵\n![BCG]({bcg_path})\n")
-    porter_path = draw_porter_radar(porter_scores) if porter_scores else None
-    if porter_path:
-        lines.append(f"\n## 波特五力雷达图\n![Porter]({porter_path})\n")
-
-    with open(out_path, 'w', encoding='utf-8') as f:
-        f.write("\n".join(lines))
-    return out_path
+                         porter_scores: Optional[Union[Dict, List[Dict]]] = None,
+                         flow_png: Optional[io.BytesIO] = None,
+                         backend: str = "matplotlib") -> io.BytesIO:
+    """导出 Markdown 报告（含方法简介、触发依据、可用时插入 BCG/五力图）。
+    图片以 data URI 内嵌，报告自包含；返回 UTF-8 字节缓冲，给定 out_path 时另存一份。
+    flow_png: 调用方已绘制的流程图，缺省时现画；backend 为图表后端（"svg" 时内嵌 SVG）。
+    """
+    ir = build_report(methods, feats, triggers, models_data, bcg_points, porter_scores, flow_png, backend)
+    return render_report(ir, "markdown", out_path)
 
 
 def save_docx_report(methods: List[str],
                      feats: Dict,
                      triggers: List[str],
                      models_data: Dict,
-                     out_path: str = os.path.join(ART_DIR, "report.docx"),
+                     out_path: Optional[str] = None,
                      bcg_points: Optional[List[Dict]] = None,
-                     porter_scores: Optional[Union[Dict, List[Dict]]] = None) -> str:
-    """导出 Word 报告（含流程图 + BCG + 五力雷达图（如有数据））。"""
-    # 兜底加载示例
-    if bcg_points is None and porter_scores is None:
-        bcg_points, porter_scores = _load_optional_samples()
-
-    doc = Document()
-    doc.add_heading('战略分析报告', 0)
-    doc.add_paragraph(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-
-    doc.add_heading('一、推荐方法论', level=1)
-    doc.add_paragraph("、".join(methods) if methods else "（尚未运行分析）")
-
-    if triggers:
-        doc.add_heading('二、触发依据', level=1)
-        for t in triggers:
-            doc.add_paragraph(t, style='List Bullet')
-
-    doc.add_heading('三、关键特征', level=1)
-    for k, v in feats.items():
-        if isinstance(v, dict):
-            doc.add_paragraph(f"{k}")
-            for kk, vv in v.items():
-                doc.add_paragraph(f"{kk}: {vv}", style='List Bullet')
-        else:
-            doc.add_paragraph(f"{k}: {v}")
-
-    # 方法论说明
-    if methods and models_data:
-        doc.add_heading('四、方法论说明', level=1)
-        for m in methods:
-            meta = models_data.get(m) or models_data.get(m.replace('Porter Five Forces', '波特五力')) or {}
-            doc.add_heading(m, level=2)
-            if meta.get('简介'):
-                doc.add_paragraph(f"简介：{meta['简介']}")
-            if meta.get('应用场景'):
-                doc.add_paragraph(f"应用场景：{meta['应用场景']}")
-            steps = meta.get('分析步骤') or []
-            if steps:
-                doc.add_paragraph('分析步骤：')
-                for s in steps:
-                    doc.add_paragraph(s, style='List Bullet')
-
-    # 图片：流程图 / BCG / 五力
-    flow_path = draw_flow(methods or [])
-    try:
-        doc.add_heading('五、分析流程图', level=1)
-        doc.add_picture(flow_path, width=Inches(6))
-    except Exception:
-        pass
-
-    bcg_path = draw_bcg(bcg_points)
-    if bcg_path:
-        try:
-            doc.add_heading('六、BCG 矩阵', level=1)
-            doc.add_picture(bcg_path, width=Inches(6))
-        except Exception:
-            pass
-
-    porter_path = draw_porter_radar(porter_scores)
-    if porter_path:
-        try:
-            doc.add_heading('七、波特五力雷达图', level=1)
-            doc.add_picture(porter_path, width=Inches(6))
-        except Exception:
-            pass
-
-    doc.save(out_path)
-    return out_path
+                     porter_scores: Optional[Union[Dict, List[Dict]]] = None,
+                     flow_png: Optional[io.BytesIO] = None,
+                     backend: str = "matplotlib") -> io.BytesIO:
+    """导出 Word 报告（含流程图 + BCG + 五力雷达图（如有数据））。
+    图片直接从内存缓冲嵌入；返回 docx 字节缓冲，给定 out_path 时另存一份。
+    docx 只能嵌入位图：SVG 后端在装有 cairosvg 时栅格化，否则退回 matplotlib。
+    """
+    ir = build_report(methods, feats, triggers, models_data, bcg_points, porter_scores, flow_png, backend)
+    return render_report(ir, "docx", out_path)
@@ -0,0 +1,311 @@
+"""
+阈值敏感性扫描：在阈值网格上对整张客户表做方法选择，回答“阈值挪一下，哪些客户的推荐会变”。
+每个网格点 × 每个客户的判定用 NumPy 广播一次算完（按客户分块控制内存），不写逐格逐行的 Python 循环。
+
+    python sensitivity.py clients.xlsx --grid hhi=1000:2500:50 --grid cr5=20:60:1
+    python sensitivity.py --synthetic 100000 --grid hhi=1000:2500:25 --grid bu_count=1:6:1 --out-dir artifacts
+"""
+import argparse
+import io
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from matcher import (
+    METHOD_ORDER,
+    THRESHOLDS,
+    _as_float,
+    _column,
+    _table_len,
+    _truthy,
+    feats_to_columns,
+)
+from tracing import span, traced
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 可扫描的阈值 -> (列名, 比较方向)；触发条件为 列 <op> 阈值，与 matcher/feature_engine 的规则一致
+SWEEP_PARAMS = {
+    "hhi": ("hhi", "lt"),
+    "cr5": ("cr5", "lt"),
+    "bu_count": ("bu_count", "ge"),
+    "market_growth": ("market_growth", "ge"),
+    "share_growth": ("share_growth", "le"),
+}
+
+# 只受阈值影响的派生特征（不改变方法选择，但一并统计）
+FLAGS = {"high_growth": "market_growth", "share_problem": "share_growth"}
+
+# 每块参与广播的 (网格点 × 客户) 元素上限
+CHUNK_CELLS = 1 << 22
+
+
+def _compare(values, thr, op):
+    if op == "lt":
+        return values < thr
+    if op == "ge":
+        return values >= thr
+    return values <= thr
+
+
+@dataclass
+class SweepResult:
+    """
+    axes   —— 参与扫描的阈值名，顺序即下列数组的轴顺序
+    values —— 各阈值的取值
+    counts —— 方法名/派生特征名 -> 形状为网格的触发客户数
+    flips  —— 形状为网格：方法组合与基线阈值下不同的客户数
+    """
+    axes: List[str]
+    values: Dict[str, "np.ndarray"]
+    counts: Dict[str, "np.ndarray"]
+    flips: "np.ndarray"
+    n: int
+    _cols: Dict[str, "np.ndarray"] = field(repr=False)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.flips.shape
+
+    def thresholds_at(self, index: Sequence[int]) -> Dict[str, float]:
+        th = dict(THRESHOLDS)
+        th.update({p: float(self.values[p][i]) for p, i in zip(self.axes, index)})
+        return th
+
+    def index_of(self, **point) -> Tuple[int, ...]:
+        """阈值取值 -> 最近的网格下标；未给出的轴取最接近基线阈值的一格。"""
+        import numpy as np
+
+        return tuple(int(np.abs(self.values[p] - point.get(p, THRESHOLDS[p])).argmin()) for p in self.axes)
+
+    def mask_at(self, thresholds: Dict[str, float]):
+        """给定一组阈值，返回 (n, len(METHOD_ORDER)) 的方法触发矩阵。"""
+        return _method_mask(self._cols, thresholds)
+
+    def flip_rows(self, **point):
+        """该网格点上方法组合与基线不同的客户行号。"""
+        import numpy as np
+
+        th = self.thresholds_at(self.index_of(**point))
+        diff = self.mask_at(th) != self.mask_at(THRESHOLDS)
+        return np.flatnonzero(diff.any(axis=1))
+
+    def flip_sets(self, max_points: int = 10_000) -> Dict[Tuple[float, ...], "np.ndarray"]:
+        """每个有翻转的网格点 -> 翻转客户行号（按网格点逐个求，每个点内部仍是整表向量化）。"""
+        import numpy as np
+
+        out = {}
+        for index in zip(*np.nonzero(self.flips)):
+            if len(out) >= max_points:
+                break
+            th = self.thresholds_at(index)
+            diff = self.mask_at(th) != self.mask_at(THRESHOLDS)
+            out[tuple(th[p] for p in self.axes)] = np.flatnonzero(diff.any(axis=1))
+        return out
+
+    def summary(self) -> Dict:
+        import numpy as np
+
+        base = self.index_of()
+        worst = tuple(int(i) for i in np.unravel_index(self.flips.argmax(), self.shape))
+        return {
+            "clients": self.n,
+            "grid": {p: [float(self.values[p][0]), float(self.values[p][-1]), len(self.values[p])] for p in self.axes},
+            "evaluations": int(self.n * self.flips.size),
+            "baseline_counts": {k: int(v[base]) for k, v in self.counts.items()},
+            "max_flips": int(self.flips.max()) if self.flips.size else 0,
+            "max_flips_at": self.thresholds_at(worst),
+        }
+
+
+def _prepare_columns(table) -> Dict:
+    import numpy as np
+
+    if isinstance(table, list):
+        table = feats_to_columns(table)
+    n = _table_len(table)
+    col = lambda name: _column(table, name, n)
+    with np.errstate(invalid="ignore"):
+        cols = {
+            "hhi": _as_float(col("hhi"), n),
+            "cr5": _as_float(col("cr5"), n),
+            # `(bu_count or 0) >= 阈值`：None 视为 0
+            "bu_count": np.nan_to_num(_as_float(col("bu_count"), n), nan=0.0),
+            "market_growth": _as_float(col("market_growth"), n),
+            "share_growth": _as_float(col("share_growth"), n),
+            "price_war": _truthy(col("price_war"), n),
+            "pestel": _truthy(col("is_new_market"), n) | _truthy(col("macro_signals"), n),
+            "blm": _truthy(col("exec_gap"), n) | _truthy(col("internal_data_ready"), n),
+        }
+    return cols
+
+
+def _method_mask(cols: Dict, th: Dict[str, float]):
+    import numpy as np
+
+    with np.errstate(invalid="ignore"):
+        five = (cols["hhi"] < th["hhi"]) | (cols["cr5"] < th["cr5"]) | cols["price_war"]
+        port = cols["bu_count"] >= th["bu_count"]
+    n = len(five)
+    return np.column_stack([cols["pestel"], five, port, port, np.ones(n, dtype=bool), cols["blm"]])
+
+
+@traced("sensitivity.sweep")
+def sweep(table, grid: Dict[str, Sequence[float]], chunk_cells: int = CHUNK_CELLS) -> SweepResult:
+    """
+    table: 与 pick_methods_batch 相同的列式输入，或 feats 字典列表
+    grid:  {阈值名: 取值序列}，阈值名见 SWEEP_PARAMS；未列出的阈值固定为 THRESHOLDS 中的基线值
+    """
+    import numpy as np
+
+    unknown = set(grid) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"不支持扫描的阈值：{sorted(unknown)}，可选 {sorted(SWEEP_PARAMS)}")
+    cols = _prepare_columns(table)
+    n = len(cols["hhi"])
+    axes = list(grid)
+    values = {p: np.asarray(grid[p], dtype=float) for p in axes}
+    shape = tuple(len(values[p]) for p in axes)
+
+    def thr(p):
+        # 扫描轴的阈值摆到自己的维度上，末尾留一维给客户，其余维度为 1，靠广播展开
+        if p not in values:
+            return THRESHOLDS[p]
+        dims = [1] * (len(axes) + 1)
+        dims[axes.index(p)] = -1
+        return values[p].reshape(dims)
+
+    counts = {m: np.zeros(shape, dtype=np.int64) for m in METHOD_ORDER + list(FLAGS)}
+    flips = np.zeros(shape, dtype=np.int64)
+    # 与阈值无关的方法直接整表计数
+    counts["PESTEL"] += int(cols["pestel"].sum())
+    counts["SWOT"] += n
+    counts["BLM"] += int(cols["blm"].sum())
+
+    base = _method_mask(cols, THRESHOLDS)
+    base_five, base_port = base[:, 1], base[:, 2]
+    step = max(1, chunk_cells // max(1, int(np.prod(shape))))
+    with span("sensitivity.broadcast", clients=n, points=int(np.prod(shape))), np.errstate(invalid="ignore"):
+        for lo in range(0, n, step):
+            sl = slice(lo, lo + step)
+            five = _compare(cols["hhi"][sl], thr("hhi"), "lt") | _compare(cols["cr5"][sl], thr("cr5"), "lt") \
+                | cols["price_war"][sl]
+            port = _compare(cols["bu_count"][sl], thr("bu_count"), "ge")
+            counts["FiveForces"] += five.sum(axis=-1)
+            counts["BCG"] += port.sum(axis=-1)
+            flips += ((five != base_five[sl]) | (port != base_port[sl])).sum(axis=-1)
+            for flag, p in FLAGS.items():
+                counts[flag] += _compare(cols[p][sl], thr(p), SWEEP_PARAMS[p][1]).sum(axis=-1)
+    counts["GE"] = counts["BCG"].copy()
+    return SweepResult(axes, values, counts, flips, n, cols)
+
+# =======================
+# 决策边界热力图
+# =======================
+
+@traced("sensitivity.draw_boundary")
+def draw_boundary(result: SweepResult, x: str, y: Optional[str] = None, metric: str = "flips",
+                  at: Optional[Dict[str, float]] = None, out_path: Optional[str] = None,
+                  dpi: int = 150, figsize=(7, 5)) -> io.BytesIO:
+    """
+    metric 为 "flips"（相对基线翻转的客户数）或方法/派生特征名（触发客户数）。
+    二维时画热力图并叠加等值线，基线阈值处打星；只给 x 时画折线。其余扫描轴固定在 at（默认基线）附近。
+    """
+    from report import _fig_to_png, _new_figure, _write_sink
+
+    data = result.flips if metric == "flips" else result.counts[metric]
+    fixed = result.index_of(**(at or {}))
+    keep = [x] if y is None else [y, x]
+    index = tuple(slice(None) if p in keep else fixed[i] for i, p in enumerate(result.axes))
+    sub = data[index]
+    if y is not None and result.axes.index(y) > result.axes.index(x):
+        sub = sub.T                                         # 行对应 y，列对应 x
+    label = "翻转客户数" if metric == "flips" else f"{metric} 触发客户数"
+
+    fig = _new_figure(figsize)
+    ax = fig.add_subplot()
+    xs = result.values[x]
+    if y is None:
+        ax.plot(xs, sub, marker='o', markersize=3)
+        ax.axvline(THRESHOLDS[x], linestyle='--')
+        ax.set_ylabel(label)
+    else:
+        ys = result.values[y]
+        mesh = ax.pcolormesh(xs, ys, sub, shading='nearest', cmap='viridis')
+        fig.colorbar(mesh, ax=ax, label=label)
+        if len(xs) > 1 and len(ys) > 1 and sub.min() != sub.max():
+            ax.contour(xs, ys, sub, levels=6, colors='white', linewidths=0.6)
+        ax.plot([THRESHOLDS[x]], [THRESHOLDS[y]], marker='*', markersize=14, color='red')
+        ax.set_ylabel(y)
+    ax.set_xlabel(x)
+    ax.set_title(f"阈值敏感性：{label}（{result.n} 个客户）")
+    fig.tight_layout()
+    return _write_sink(io.BytesIO(_fig_to_png(fig, dpi)), out_path)
+
+# =======================
+# 命令行
+# =======================
+
+def _parse_grid(spec: str) -> Tuple[str, "np.ndarray"]:
+    """hhi=1000:2500:50（起:止:步长，含终点）或 hhi=1000,1500,2000"""
+    import numpy as np
+
+    name, _, rng = spec.partition("=")
+    if ":" in rng:
+        lo, hi, step = (float(v) for v in rng.split(":"))
+        return name, np.arange(lo, hi + step / 2, step)
+    return name, np.array([float(v) for v in rng.split(",")])
+
+
+def _load_table(path: Optional[str], synthetic: int, limit: Optional[int]):
+    if synthetic:
+        from benchmarks import synth_raws
+        return feats_to_columns(synth_raws(synthetic))
+    from tabular import is_table, read_columns
+
+    if is_table(path):
+        # 列式读取，不经过逐行字典
+        cols = read_columns(path)
+        return {k: v[:limit] for k, v in cols.items()} if limit else cols
+    from batch_report import iter_clients
+    return feats_to_columns([rec for _, rec in iter_clients(path, limit=limit)])
+
+
+def main(argv=None):
+    import time
+
+    ap = argparse.ArgumentParser(description="触发阈值敏感性扫描与决策边界图")
+    ap.add_argument("input", nargs="?", help="客户工作簿（.xlsx / .xls）或 .csv / .parquet，每行一个客户")
+    ap.add_argument("--synthetic", type=int, default=0, help="不读文件，改用 N 个合成客户")
+    ap.add_argument("--grid", action="append", required=True,
+                    help="阈值网格，可重复：hhi=1000:2500:50 或 cr5=30,40,50；可选 " + "/".join(SWEEP_PARAMS))
+    ap.add_argument("--limit", type=int, default=None, help="只读前 N 行")
+    ap.add_argument("--out-dir", default=None, help="写出 summary.json 与热力图 PNG")
+    args = ap.parse_args(argv)
+    if not args.input and not args.synthetic:
+        ap.error("需要客户工作簿或 --synthetic N")
+
+    table = _load_table(args.input, args.synthetic, args.limit)
+    grid = dict(_parse_grid(g) for g in args.grid)
+    t0 = time.perf_counter()
+    result = sweep(table, grid)
+    elapsed = time.perf_counter() - t0
+    summary = result.summary()
+    summary["elapsed_s"] = round(elapsed, 3)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        with open(os.path.join(args.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        x, y = result.axes[0], (result.axes[1] if len(result.axes) > 1 else None)
+        for metric in ["flips", "FiveForces", "BCG"]:
+            draw_boundary(result, x, y, metric=metric, out_path=os.path.join(args.out_dir, f"sensitivity_{metric}.png"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
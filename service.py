@@ -0,0 +1,462 @@
+"""
+无界面分析服务：标准库 asyncio 上的轻量 HTTP/1.1 服务，供其他内部工具直接调用，不必拉起 Streamlit 会话。
+
+    python service.py --port 8765 --workers 2 --max-queue 16 --timeout 30
+
+规则求值（特征、方法推荐、触发依据、关键词）很便宜，直接在事件循环里算；
+图表与报告渲染走有界进程池：在途 + 排队超过上限时立即返回 503（带 Retry-After），等待超时返回 504。
+
+    POST /features            {"bu_count": 3, "industry_data": {...}, ...}       -> 完整特征（含派生）
+    POST /analyze             同上                                                -> 特征 + 方法 + 触发依据
+    POST /batch               {"clients": [{"client_id": "a", ...}, ...]}         -> 逐客户的分析结果（向量化规则引擎）
+    POST /keywords            {"text": "..."}                                     -> {方法: 命中词}
+    POST /report?format=docx  {"features": {...}, "company": "byd", "backend": "svg"} -> 报告字节
+    POST /chart/bcg|porter|flow {"data": ..., "backend": "svg"}                  -> PNG / SVG 字节
+    GET  /health  /stats
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+MAX_BODY = 16 * 1024 * 1024
+HEADER_TIMEOUT = 15.0           # 等待请求头（含 keep-alive 空闲）的秒数
+INLINE_BATCH = 1000             # 超过该客户数的批量请求挪到线程里算，不阻塞事件循环
+INLINE_CHARS = 200_000          # 同理：超长文本的关键词扫描
+
+CONTENT_TYPES = {
+    "markdown": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes = b""
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            payload = json.loads(self.body)
+        except ValueError as e:
+            raise HTTPError(400, f"请求体不是合法 JSON：{e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "请求体必须是 JSON 对象")
+        return payload
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "application/json; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def json_response(payload, status: int = 200) -> Response:
+    return Response(status, json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+
+# =======================
+# 分析逻辑（事件循环内 / 子进程内）
+# =======================
+
+def analyze_record(raw: Dict) -> Dict:
+    """单个客户：原始字段 -> 特征 -> 推荐方法 + 触发依据。"""
+    from feature_engine import extract_features
+    from ingest import to_engine_input
+    from matcher import display_methods, explain_triggers, pick_methods
+
+    feats = extract_features(to_engine_input(_as_record(raw)))
+    methods = pick_methods(feats)
+    return {"features": feats, "methods": methods, "display": display_methods(methods),
+            "triggers": explain_triggers(feats)}
+
+
+def analyze_batch(clients: List[Dict]) -> List[Dict]:
+    """
+    批量：特征逐个构建，方法推荐用向量化的 pick_methods_batch 一次算完；
+    触发依据仍逐行求值（与单个接口输出一致）。
+    """
+    from feature_engine import extract_features
+    from ingest import to_engine_input
+    from matcher import display_methods, explain_triggers, feats_to_columns, pick_methods_batch
+
+    feats = [extract_features(to_engine_input(_as_record(c))) for c in clients]
+    _, methods = pick_methods_batch(feats_to_columns(feats)) if feats else (None, [])
+    return [{"client_id": c.get("client_id", i), "features": f, "methods": m,
+             "display": display_methods(m), "triggers": explain_triggers(f)}
+            for i, (c, f, m) in enumerate(zip(clients, feats, methods))]
+
+
+def _as_record(raw: Dict) -> Dict:
+    """
+    请求里的客户字段 -> to_feature_record 同结构（平铺的 cr5/hhi 等也收进 industry_data）。
+    与 Excel 导入不同，给了值却转换失败的字段直接 400，不静默当作缺失。
+    """
+    from ingest import INDUSTRY_CASTS, TOP_LEVEL_CASTS, to_feature_record
+
+    if not isinstance(raw, dict):
+        raise HTTPError(400, "客户数据必须是 JSON 对象")
+    flat = {k: raw.get(k) for k in TOP_LEVEL_CASTS}
+    industry = raw.get("industry_data") or {}
+    flat.update({k: industry.get(k, raw.get(k)) for k in INDUSTRY_CASTS})
+    rec = to_feature_record(flat)
+    cast = {**{k: rec[k] for k in TOP_LEVEL_CASTS}, **rec["industry_data"]}
+    bad = [f"{k}={flat[k]!r}" for k in flat if flat[k] is not None and cast[k] is None]
+    if bad:
+        raise HTTPError(400, f"字段值无法转换：{', '.join(bad)}")
+    return rec
+
+
+def _init_worker():
+    # 子进程固定用无界面的 Agg 后端，并提前导入报告模块、解析字体，首个请求不再付这部分开销
+    import matplotlib
+    matplotlib.use("Agg")
+    from report import warm_fonts
+    warm_fonts()
+
+
+def _warm_worker() -> int:
+    return os.getpid()
+
+
+def render_report_job(raw: Dict, fmt: str, backend: str, company: Optional[str]) -> bytes:
+    from report import build_report, load_models_data, render_report
+
+    res = analyze_record(raw)
+    ir = build_report(res["display"], res["features"], res["triggers"], load_models_data(),
+                      backend=backend, company=company)
+    return render_report(ir, fmt).getvalue()
+
+
+def render_chart_job(kind: str, data, backend: str) -> bytes:
+    from report import draw_bcg, draw_flow, draw_porter_radar
+
+    draw = {"bcg": draw_bcg, "porter": draw_porter_radar, "flow": draw_flow}[kind]
+    buf = draw(data, backend=backend)
+    if buf is None:
+        raise ValueError("没有可绘制的数据")
+    return buf.getvalue()
+
+# =======================
+# 有界渲染池
+# =======================
+
+class RenderPool:
+    """
+    进程池 + 准入控制：在途（排队 + 执行中）任务数达到 workers + max_queue 时拒绝新任务（503）。
+    超时的任务若还在排队会被取消；已在执行的跑完才释放名额，因此名额始终反映子进程的真实负载。
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: int = 16, timeout: float = 30.0):
+        import multiprocessing
+
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_worker)
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    async def warm(self) -> None:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _warm_worker) for _ in range(self.workers)))
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None):
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise HTTPError(503, f"渲染队列已满（{self.in_flight}/{self.capacity}），请稍后重试",
+                            {"Retry-After": "1"})
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        cf = self._pool.submit(fn, *args)
+        cf.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cf), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPError(504, f"渲染超时（{timeout or self.timeout:.0f}s）")
+
+    def _release(self, cf) -> None:
+        self.in_flight -= 1
+        if cf.cancelled():
+            self.cancelled += 1
+        elif cf.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def stats(self) -> Dict:
+        return {"workers": self.workers, "max_queue": self.max_queue, "in_flight": self.in_flight,
+                "completed": self.completed, "failed": self.failed, "cancelled": self.cancelled, "rejected": self.rejected, "timeouts": self.timeouts}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# =======================
+# 路由
+# =======================
+
+Handler = Callable[["AnalysisService", Request], Awaitable[Response]]
+ROUTES: Dict[Tuple[str, str], Handler] = {}
+
+
+def route(method: str, path: str):
+    def deco(fn: Handler) -> Handler:
+        ROUTES[(method, path)] = fn
+        return fn
+    return deco
+
+
+@route("GET", "/health")
+async def _health(svc: "AnalysisService", req: Request) -> Response:
+    return json_response({"status": "ok"})
+
+
+@route("GET", "/stats")
+async def _stats(svc: "AnalysisService", req: Request) -> Response:
+    return json_response(svc.stats())
+
+
+@route("POST", "/features")
+async def _features(svc: "AnalysisService", req: Request) -> Response:
+    return json_response(analyze_record(req.json())["features"])
+
+
+@route("POST", "/analyze")
+async def _analyze(svc: "AnalysisService", req: Request) -> Response:
+    return json_response(analyze_record(req.json()))
+
+
+@route("POST", "/batch")
+async def _batch(svc: "AnalysisService", req: Request) -> Response:
+    clients = req.json().get("clients")
+    if not isinstance(clients, list):
+        raise HTTPError(400, "需要 clients 数组")
+    if len(clients) > INLINE_BATCH:
+        results = await asyncio.to_thread(analyze_batch, clients)
+    else:
+        results = analyze_batch(clients)
+    return json_response({"count": len(results), "results": results})
+
+
+@route("POST", "/keywords")
+async def _keywords(svc: "AnalysisService", req: Request) -> Response:
+    from keywords import extract_keywords
+
+    text = req.json().get("text")
+    if not isinstance(text, str):
+        raise HTTPError(400, "需要 text 字符串")
+    hits = await asyncio.to_thread(extract_keywords, text) if len(text) > INLINE_CHARS else extract_keywords(text)
+    return json_response(hits)
+
+
+@route("POST", "/report")
+async def _report(svc: "AnalysisService", req: Request) -> Response:
+    from report import BACKENDS, WRITERS
+
+    body = req.json()
+    fmt = req.query.get("format") or body.get("format") or "docx"
+    backend = body.get("backend") or "matplotlib"
+    if fmt not in WRITERS or backend not in BACKENDS:
+        raise HTTPError(400, f"format 可选 {', '.join(WRITERS)}；backend 可选 {', '.join(BACKENDS)}")
+    raw = body.get("features") or {}
+    _as_record(raw)                                   # 参数错误在入队前就返回 400
+    data = await svc.render.run(render_report_job, raw, fmt, backend, body.get("company"))
+    return Response(200, data, CONTENT_TYPES.get(fmt, "application/octet-stream"))
+
+
+async def _chart(svc: "AnalysisService", req: Request, kind: str) -> Response:
+    from report import BACKENDS
+
+    body = req.json()
+    backend = body.get("backend") or "matplotlib"
+    if backend not in BACKENDS:
+        raise HTTPError(400, f"backend 可选 {', '.join(BACKENDS)}")
+    try:
+        data = await svc.render.run(render_chart_job, kind, body.get("data"), backend)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    return Response(200, data, CONTENT_TYPES["svg" if backend == "svg" else "png"])
+
+
+for _kind in ("bcg", "porter", "flow"):
+    route("POST", f"/chart/{_kind}")(lambda svc, req, kind=_kind: _chart(svc, req, kind))
+
+# =======================
+# HTTP 服务
+# =======================
+
+class AnalysisService:
+    def __init__(self, workers: Optional[int] = None, max_queue: int = 16, timeout: float = 30.0):
+        self.render = RenderPool(workers, max_queue, timeout)
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def stats(self) -> Dict:
+        return {"uptime_s": time.time() - self.started, "requests": self.requests,
+                "errors": self.errors, "render": self.render.stats()}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        await self.render.warm()
+        self._server = await asyncio.start_server(self._serve_conn, host, port)
+        return self._server
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.render.shutdown()
+
+    async def dispatch(self, req: Request) -> Response:
+        self.requests += 1
+        handler = ROUTES.get((req.method, req.path))
+        try:
+            if handler is None:
+                known = any(p == req.path for _, p in ROUTES)
+                raise HTTPError(405 if known else 404, f"{req.method} {req.path} 不存在")
+            return await handler(self, req)
+        except HTTPError as e:
+            self.errors += 1
+            resp = json_response({"error": str(e)}, e.status)
+            resp.headers.update(e.headers)
+            return resp
+        except Exception as e:
+            self.errors += 1
+            return json_response({"error": f"{type(e).__name__}: {e}"}, 500)
+
+    async def _serve_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    req = await asyncio.wait_for(_read_request(reader), HEADER_TIMEOUT)
+                except HTTPError as e:
+                    await _write_response(writer, json_response({"error": str(e)}, e.status), False)
+                    break
+                if req is None:
+                    break
+                resp = await self.dispatch(req)
+                keep_alive = req.headers.get("connection", "").lower() != "close"
+                await _write_response(writer, resp, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _readline(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        # 单行超过 StreamReader 的上限（默认 64 KiB）
+        raise HTTPError(400, "请求行或请求头过长")
+
+
+def _content_length(value: Optional[str]) -> int:
+    value = (value or "0").strip()
+    if not (value.isascii() and value.isdigit()):
+        raise HTTPError(400, f"Content-Length 不合法：{value!r}")
+    return int(value)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    line = await _readline(reader)
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "请求行格式错误")
+    headers = {}
+    while True:
+        h = await _readline(reader)
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "不支持 chunked 请求体，请带 Content-Length")
+    length = _content_length(headers.get("content-length"))
+    if length > MAX_BODY:
+        raise HTTPError(413, f"请求体超过 {MAX_BODY} 字节")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    return Request(method.upper(), url.path, query, headers, body)
+
+
+async def _write_response(writer: asyncio.StreamWriter, resp: Response, keep_alive: bool) -> None:
+    head = [f"HTTP/1.1 {resp.status} {REASONS.get(resp.status, '')}",
+            f"Content-Type: {resp.content_type}",
+            f"Content-Length: {len(resp.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in resp.headers.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + resp.body)
+    await writer.drain()
+
+
+async def serve(host: str, port: int, workers: Optional[int], max_queue: int, timeout: float) -> None:
+    svc = AnalysisService(workers, max_queue, timeout)
+    server = await svc.start(host, port)
+    print(f"分析服务已启动：http://{host}:{port}（渲染进程 {svc.render.workers}，排队上限 {max_queue}）")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await svc.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="无界面分析服务（asyncio HTTP）")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workers", type=int, default=None, help="渲染进程数，默认 CPU 核数")
+    ap.add_argument("--max-queue", type=int, default=16, help="渲染任务排队上限，超出返回 503")
+    ap.add_argument("--timeout", type=float, default=30.0, help="单个渲染任务的等待上限（秒），超出返回 504")
+    args = ap.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_queue, args.timeout))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+轻量图表后端：不依赖 matplotlib，解析式计算布局并直接输出 SVG。
+图形与 report.py 中的 draw_flow / draw_bcg / draw_porter_radar 一一对应，标签文字保持一致。
+需要位图（如嵌入 docx）时用 svg_to_png 栅格化（依赖可选的 cairosvg）。
+"""
+import math
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+# 与 report.py 中 matplotlib 的 font.sans-serif 回退顺序一致
+FONT_FAMILY = "'PingFang SC','Heiti SC','Hiragino Sans GB','Arial Unicode MS','Noto Sans CJK SC','DejaVu Sans',sans-serif"
+
+# matplotlib 默认色环的前两个颜色，观感与原图接近
+C0 = "#1f77b4"
+C1 = "#ff7f0e"
+
+
+def _svg(width: float, height: float, body: List[str]) -> str:
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:g}" height="{height:g}" '
+        f'viewBox="0 0 {width:g} {height:g}" font-family="{FONT_FAMILY}">'
+        f'<rect width="100%" height="100%" fill="white"/>'
+        + "".join(body) + "</svg>"
+    )
+
+
+def _text(x, y, s, size=12, anchor="start", **attrs) -> str:
+    extra = "".join(f' {k.replace("_", "-")}="{v}"' for k, v in attrs.items())
+    return (f'<text x="{x:.1f}" y="{y:.1f}" font-size="{size}" text-anchor="{anchor}"'
+            f' dominant-baseline="middle"{extra}>{escape(str(s))}</text>')
+
+
+# =======================
+# 流程图：固定的扇出结构，直接按列排布
+# =======================
+
+def flow_svg(methods: List[str], width: int = 800, height: int = 600) -> str:
+    """客户数据输入 → 多维度判断 → 方法论匹配引擎 → 各方法，从左到右四列。"""
+    methods = list(methods or [])
+    chain = ["客户数据输入", "多维度判断", "方法论匹配引擎"]
+    col_x = [width * f for f in (0.12, 0.36, 0.60, 0.86)]
+    cy = height / 2
+    r = 42
+    pos = {name: (col_x[i], cy) for i, name in enumerate(chain)}
+    n = len(methods)
+    gap = min(110.0, (height - 2 * r) / max(n, 1))
+    for i, m in enumerate(methods):
+        pos[m] = (col_x[3], cy + (i - (n - 1) / 2) * gap)
+
+    edges = list(zip(chain, chain[1:])) + [("方法论匹配引擎", m) for m in methods]
+    body = ['<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="6" '
+            'markerHeight="6" orient="auto"><path d="M0,0L10,5L0,10z" fill="black"/></marker></defs>']
+    for a, b in edges:
+        (x1, y1), (x2, y2) = pos[a], pos[b]
+        d = math.hypot(x2 - x1, y2 - y1) or 1.0
+        ux, uy = (x2 - x1) / d, (y2 - y1) / d
+        body.append(f'<line x1="{x1 + ux * r:.1f}" y1="{y1 + uy * r:.1f}" x2="{x2 - ux * r:.1f}" '
+                    f'y2="{y2 - uy * r:.1f}" stroke="black" stroke-width="1" marker-end="url(#arrow)"/>')
+    for name, (x, y) in pos.items():
+        body.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{r}" fill="{C0}"/>')
+        body.append(_text(x, y, name, size=11, anchor="middle"))
+    return _svg(width, height, body)
+
+
+# =======================
+# BCG 四象限
+# =======================
+
+def _nice_ticks(lo: float, hi: float, target: int = 5) -> List[float]:
+    """取 1/2/5×10^k 的步长，生成落在 [lo, hi] 内的整齐刻度。"""
+    raw = (hi - lo) / target
+    mag = 10 ** math.floor(math.log10(raw))
+    step = next(m * mag for m in (1, 2, 5, 10) if m * mag >= raw)
+    start = math.ceil(lo / step) * step
+    return [round(start + i * step, 10) for i in range(int((hi - start) / step) + 1)]
+
+
+def bcg_svg(port, width: int = 700, height: int = 600,
+            g_thr: float = 10.0, s_thr: float = 1.0, max_labels: int = 60) -> str:
+    """port 为 portfolio.classify 的结果；点按象限着色，标签按份额优先做避让。"""
+    import portfolio as pf
+
+    left, right, top, bottom = 70, 20, 40, 55
+    pw, ph = width - left - right, height - top - bottom
+    xs = list(port.share) + [0.0, s_thr]
+    ys = list(port.growth) + [0.0, g_thr]
+    x0, x1 = min(xs), max(xs)
+    y0, y1 = min(ys), max(ys)
+    xpad, ypad = (x1 - x0) * 0.08 or 0.5, (y1 - y0) * 0.08 or 1.0
+    x0, x1, y0, y1 = x0 - xpad, x1 + xpad, y0 - ypad, y1 + ypad
+    sx = lambda v: left + (v - x0) / (x1 - x0) * pw
+    sy = lambda v: top + (y1 - v) / (y1 - y0) * ph
+
+    body = [f'<rect x="{left}" y="{top}" width="{pw}" height="{ph}" fill="none" stroke="black"/>',
+            f'<line x1="{sx(s_thr):.1f}" y1="{top}" x2="{sx(s_thr):.1f}" y2="{top + ph}" '
+            f'stroke="{C0}" stroke-dasharray="6,4"/>',
+            f'<line x1="{left}" y1="{sy(g_thr):.1f}" x2="{left + pw}" y2="{sy(g_thr):.1f}" '
+            f'stroke="{C0}" stroke-dasharray="6,4"/>',
+            _text(width / 2, 20, "BCG 矩阵", size=14, anchor="middle"),
+            _text(left + pw / 2, height - 15, "相对市场份额", anchor="middle"),
+            _text(18, top + ph / 2, "市场增长率 (%)", anchor="middle",
+                  transform=f"rotate(-90 18 {top + ph / 2:.1f})")]
+    for xv in _nice_ticks(x0, x1):
+        body.append(_text(sx(xv), top + ph + 14, f"{xv:g}", size=10, anchor="middle"))
+    for yv in _nice_ticks(y0, y1):
+        body.append(_text(left - 6, sy(yv), f"{yv:g}", size=10, anchor="end"))
+
+    n = len(port)
+    r, font = (6, 11) if n <= 50 else (max(2.0, 6 * (50 / n) ** 0.5), 9)
+    px = [sx(v) for v in port.share]
+    py = [sy(v) for v in port.growth]
+    for x, y, color in zip(px, py, pf.quadrant_colors(port.bcg)):
+        body.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{r:.1f}" fill="{color}"/>')
+    # 避让在 y 轴向上的坐标系里做
+    kept = pf.declutter(px, [height - y for y in py], [pf.label_width(str(t), font) for t in port.names],
+                        font * 1.2, priority=port.share, max_labels=max_labels, pad=r + 2)
+    for i in kept:
+        body.append(_text(px[i] + r + 2, py[i] - r - 2 - font * 0.6, port.names[i], size=font))
+    if len(kept) < n:
+        body.append(_text(left + pw - 6, top + ph - 10, f"另有 {n - len(kept)} 个业务单元未标注",
+                          size=10, anchor="end"))
+    # 象限标签
+    for label, gx, gy in (("明星", s_thr + 0.1, g_thr + 0.1), ("问题", 0.1, g_thr + 0.1),
+                          ("现金牛", s_thr + 0.1, 0.1), ("瘦狗", 0.1, 0.1)):
+        body.append(_text(sx(gx), sy(gy) - 8, label, size=13))
+    return _svg(width, height, body)
+
+
+# =======================
+# 波特五力 雷达图
+# =======================
+
+def porter_radar_svg(scores: Dict[str, float], width: int = 600, height: int = 600,
+                     max_score: float = 5.0) -> str:
+    """scores 为 report._normalize_porter_scores 的输出：{力量: 得分}，刻度 0–max_score。"""
+    labels = list(scores.keys())
+    values = [float(scores[k]) for k in labels]
+    n = len(labels)
+    cx, cy = width / 2, height / 2 + 10
+    R = min(width, height) * 0.34
+    top = max([max_score] + values)
+    # 与 matplotlib 极坐标一致：0 度在右侧，逆时针
+    angles = [2 * math.pi * i / n for i in range(n)]
+    pt = lambda a, v: (cx + R * v / top * math.cos(a), cy - R * v / top * math.sin(a))
+
+    body = [_text(cx, 22, "波特五力雷达图 (1-5)", size=14, anchor="middle")]
+    for ring in range(1, int(top) + 1):
+        body.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{R * ring / top:.1f}" fill="none" '
+                    f'stroke="#cccccc"/>')
+    for a, label in zip(angles, labels):
+        x, y = pt(a, top)
+        body.append(f'<line x1="{cx:.1f}" y1="{cy:.1f}" x2="{x:.1f}" y2="{y:.1f}" stroke="#cccccc"/>')
+        lx, ly = pt(a, top * 1.12)
+        anchor = "middle" if abs(math.cos(a)) < 0.3 else ("start" if math.cos(a) > 0 else "end")
+        body.append(_text(lx, ly, label, size=12, anchor=anchor))
+    poly = " ".join("%.1f,%.1f" % pt(a, v) for a, v in zip(angles, values))
+    body.append(f'<polygon points="{poly}" fill="{C0}" fill-opacity="0.2" stroke="{C0}" stroke-width="1.5"/>')
+    return _svg(width, height, body)
+
+
+# =======================
+# 栅格化（可选依赖）
+# =======================
+
+def svg_to_png(svg: str, dpi: int = 150) -> bytes:
+    """SVG -> PNG；需要 cairosvg。SVG 尺寸按 100 px/inch 设计，dpi 与 matplotlib 的含义一致。"""
+    try:
+        import cairosvg
+    except (ImportError, OSError) as e:
+        # 缺少 Python 包或系统的 libcairo 都会走到这里
+        raise ImportError("栅格化 SVG 需要安装 cairosvg（及系统库 libcairo）：pip install cairosvg") from e
+    return cairosvg.svg2png(bytestring=svg.encode('utf-8'), scale=dpi / 100.0)
+
+
+def can_rasterize() -> bool:
+    try:
+        import cairosvg  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
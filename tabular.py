@@ -0,0 +1,283 @@
+"""
+CSV / Parquet 列式读取：只读规则引擎用到的列（Parquet 走列投影），按显式类型解析，分块产出 NumPy 列，
+可直接交给 matcher.pick_methods_batch / sensitivity.sweep，或写入 feature_store，全程不构建逐行字典。
+
+    python tabular.py clients.parquet                 # 按块统计推荐方法分布
+    python tabular.py clients.csv --chunk-rows 200000 --store features/
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from tracing import traced
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 列名 -> 读取类型（展平列名，与 pick_methods_batch 一致）
+BOOL_COLUMNS = ["is_new_market", "macro_signals", "price_war", "internal_data_ready", "exec_gap"]
+FLOAT_COLUMNS = ["bu_count", "cr5", "hhi", "share_growth", "market_growth"]
+CATEGORY_COLUMNS = ["switching_cost"]
+ENGINE_COLUMNS = BOOL_COLUMNS + FLOAT_COLUMNS + CATEGORY_COLUMNS
+
+# CSV 里常见的中英文布尔写法；其余非空值解析失败时整块报错，不静默当成 True
+TRUE_VALUES = ["是", "Y", "y", "yes", "Yes", "YES"]
+FALSE_VALUES = ["否", "N", "n", "no", "No", "NO"]
+
+CHUNK_ROWS = 131072
+
+
+@dataclass
+class ColumnChunk:
+    """
+    一块数据的列：布尔列为 bool（缺失为 False，同 bool(None)），数值列为 float64（缺失为 NaN），
+    switching_cost 为 object（缺失为 None）；valid 为各列的“非缺失”掩码。文件里没有的列不出现。
+    """
+    columns: Dict[str, "np.ndarray"]
+    valid: Dict[str, "np.ndarray"]
+    ids: Optional["np.ndarray"] = None
+
+    def __len__(self) -> int:
+        return len(next(iter(self.valid.values()))) if self.valid else 0
+
+
+def table_format(path: str) -> str:
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".csv", ".txt", ".gz", ".bz2", ".zip", ".xz"):
+        return "csv"
+    raise ValueError(f"不支持的表格格式：{path}（支持 .csv / .parquet）")
+
+
+def is_table(path: str) -> bool:
+    """是否走列式读取（.csv / .csv.gz / .parquet 等，以 table_format 为准）；目录与 Excel 工作簿为 False。"""
+    if os.path.isdir(str(path)):
+        return False
+    try:
+        table_format(path)
+    except ValueError:
+        return False
+    return True
+
+
+def _csv_header(path: str) -> Dict[str, str]:
+    """{去空格的列名: 文件里的原始列名}；pyarrow 的 include_columns 要用原始列名。"""
+    import pandas as pd
+
+    return {str(c).strip(): str(c) for c in pd.read_csv(path, nrows=0).columns}
+
+
+def _csv_stream(path: str):
+    """
+    打开 CSV 字节流：.zip / .xz 在 Python 侧解压（pyarrow 的压缩探测不认 zip，xz 视编译选项而定），
+    其余交给 pyarrow 按扩展名探测（.gz / .bz2 等）。
+    """
+    import pyarrow as pa
+
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext == ".zip":
+        import zipfile
+
+        with zipfile.ZipFile(path) as zf:
+            members = [n for n in zf.namelist() if not n.endswith("/")]
+            if len(members) != 1:
+                raise ValueError(f"{path} 内应恰好有一个 CSV 文件，实际 {len(members)} 个")
+            # 成员流关闭时才真正关闭底层文件
+            return pa.PythonFile(zf.open(members[0]), mode="r")
+    if ext == ".xz":
+        import lzma
+
+        return pa.PythonFile(lzma.open(path, "rb"), mode="r")
+    return pa.input_stream(path, compression="detect")
+
+
+def _id_column(names: List[str], id_column: Optional[str]) -> Optional[str]:
+    from batch_report import ID_COLUMNS
+
+    if id_column:
+        if id_column not in names:
+            raise KeyError(f"找不到标识列 {id_column}")
+        return id_column
+    return next((c for c in ID_COLUMNS if c in names), None)
+
+
+def _arrow_targets():
+    import pyarrow as pa
+
+    return {**{c: pa.bool_() for c in BOOL_COLUMNS},
+            **{c: pa.float64() for c in FLOAT_COLUMNS},
+            **{c: pa.string() for c in CATEGORY_COLUMNS}}
+
+
+def _arrow_chunk(batch, present: List[str], id_col: Optional[str],
+                 raw: Optional[Dict[str, str]] = None) -> ColumnChunk:
+    """Arrow RecordBatch -> ColumnChunk；类型不符的列先 cast。raw 为 {列名: batch 里的原始列名}。"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    raw = raw or {}
+    targets = _arrow_targets()
+    columns, valid = {}, {}
+    for c in present:
+        arr = batch.column(raw.get(c, c))
+        if arr.type != targets[c]:
+            arr = pc.cast(arr, targets[c])
+        valid[c] = arr.is_valid().to_numpy(zero_copy_only=False)
+        if c in BOOL_COLUMNS:
+            columns[c] = pc.fill_null(arr, False).to_numpy(zero_copy_only=False)
+        else:
+            # float64 的缺失直接为 NaN；字符串缺失为 None
+            columns[c] = arr.to_numpy(zero_copy_only=False)
+    ids = None
+    if id_col:
+        ids = pc.fill_null(pc.cast(batch.column(raw.get(id_col, id_col)), pa.string()), "").to_numpy(zero_copy_only=False)
+    return ColumnChunk(columns, valid, ids)
+
+
+def _iter_csv_arrow(path: str, chunk_rows: int, id_column: Optional[str]) -> Iterator[ColumnChunk]:
+    """pyarrow 流式 CSV：列裁剪与类型转换都在 C++ 里完成。"""
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
+
+    raw = _csv_header(path)
+    id_col = _id_column(list(raw), id_column)
+    present = [c for c in ENGINE_COLUMNS if c in raw]
+    wanted = present + ([id_col] if id_col else [])
+    types = {raw[c]: t for c, t in _arrow_targets().items() if c in present}
+    if id_col:
+        types[raw[id_col]] = pa.string()
+    convert = pcsv.ConvertOptions(include_columns=[raw[c] for c in wanted], column_types=types,
+                                  true_values=["1", "True", "TRUE", "true"] + TRUE_VALUES,
+                                  false_values=["0", "False", "FALSE", "false"] + FALSE_VALUES,
+                                  strings_can_be_null=True)
+    # block_size 以字节计，按每行约 64 字节折算
+    read = pcsv.ReadOptions(block_size=max(1 << 20, chunk_rows * 64))
+    with _csv_stream(path) as stream:
+        for batch in pcsv.open_csv(stream, read_options=read, convert_options=convert):
+            yield _arrow_chunk(batch, present, id_col, raw)
+
+
+def _iter_csv_pandas(path: str, chunk_rows: int, id_column: Optional[str]) -> Iterator[ColumnChunk]:
+    import numpy as np
+    import pandas as pd
+
+    raw = _csv_header(path)
+    id_col = _id_column(list(raw), id_column)
+    # dtype 的键用文件里的原始列名，读完再去空格
+    dtype = {raw[c]: "boolean" for c in BOOL_COLUMNS if c in raw}
+    dtype.update({raw[c]: "float64" for c in FLOAT_COLUMNS if c in raw})
+    dtype.update({raw[c]: "string" for c in CATEGORY_COLUMNS if c in raw})
+    if id_col:
+        dtype[raw[id_col]] = "string"
+    wanted = {raw[c] for c in ENGINE_COLUMNS if c in raw} | ({raw[id_col]} if id_col else set())
+    reader = pd.read_csv(path, usecols=lambda c: str(c) in wanted, dtype=dtype,
+                         true_values=TRUE_VALUES, false_values=FALSE_VALUES,
+                         chunksize=chunk_rows, engine="c")
+    for df in reader:
+        df.columns = [str(c).strip() for c in df.columns]
+        columns, valid = {}, {}
+        for c in ENGINE_COLUMNS:
+            if c not in df.columns:
+                continue
+            s = df[c]
+            valid[c] = s.notna().to_numpy()
+            if c in BOOL_COLUMNS:
+                columns[c] = s.to_numpy(dtype=bool, na_value=False)
+            elif c in FLOAT_COLUMNS:
+                columns[c] = s.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                columns[c] = s.to_numpy(dtype=object, na_value=None)
+        ids = df[id_col].to_numpy(dtype=object, na_value="") if id_col else None
+        yield ColumnChunk(columns, valid, ids)
+
+
+def _iter_csv(path: str, chunk_rows: int, id_column: Optional[str]) -> Iterator[ColumnChunk]:
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        # 没有 pyarrow 时退回 pandas 的 C 解析器（可空布尔列的转换慢一些）
+        yield from _iter_csv_pandas(path, chunk_rows, id_column)
+        return
+    yield from _iter_csv_arrow(path, chunk_rows, id_column)
+
+
+def _iter_parquet(path: str, chunk_rows: int, id_column: Optional[str]) -> Iterator[ColumnChunk]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("读取 Parquet 需要 pyarrow：pip install pyarrow") from e
+
+    pf = pq.ParquetFile(path)
+    names = list(pf.schema_arrow.names)
+    id_col = _id_column(names, id_column)
+    present = [c for c in ENGINE_COLUMNS if c in names]
+    # 列投影：只解码需要的列
+    for batch in pf.iter_batches(batch_size=chunk_rows, columns=present + ([id_col] if id_col else [])):
+        yield _arrow_chunk(batch, present, id_col)
+
+
+def iter_column_chunks(path: str, chunk_rows: int = CHUNK_ROWS,
+                       id_column: Optional[str] = None) -> Iterator[ColumnChunk]:
+    """按块产出类型化的列；内存峰值与 chunk_rows 相关而非总行数。"""
+    reader = _iter_parquet if table_format(path) == "parquet" else _iter_csv
+    return reader(path, chunk_rows, id_column)
+
+
+@traced("read_columns")
+def read_columns(path: str, chunk_rows: int = CHUNK_ROWS) -> Dict[str, "np.ndarray"]:
+    """整表读成 {列名: 数组}，直接可用于 pick_methods_batch / sensitivity.sweep。"""
+    import numpy as np
+
+    parts: Dict[str, List] = {}
+    for chunk in iter_column_chunks(path, chunk_rows):
+        for c, arr in chunk.columns.items():
+            parts.setdefault(c, []).append(arr)
+    return {c: np.concatenate(arrs) for c, arrs in parts.items()}
+
+
+def iter_methods(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[tuple]:
+    """逐块跑批量规则引擎，产出 (ColumnChunk, mask, methods)。"""
+    from matcher import pick_methods_batch
+
+    for chunk in iter_column_chunks(path, chunk_rows):
+        mask, methods = pick_methods_batch(chunk.columns)
+        yield chunk, mask, methods
+
+
+def main(argv=None):
+    import time
+
+    from matcher import display_methods
+
+    ap = argparse.ArgumentParser(description="CSV / Parquet 列式读取 + 批量方法推荐")
+    ap.add_argument("input", help=".csv 或 .parquet")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--id-column", default=None)
+    ap.add_argument("--store", default=None, help="同时写成 feature_store 目录")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if args.store:
+        from feature_store import FeatureStore
+
+        store = FeatureStore.from_chunks(iter_column_chunks(args.input, args.chunk_rows, args.id_column))
+        store.save(args.store)
+        print(f"特征表 {args.store}：{store.n} 行，{store.nbytes() / max(store.n, 1):.1f} 字节/行")
+    else:
+        combos, n = Counter(), 0
+        for chunk, _, methods in iter_methods(args.input, args.chunk_rows):
+            n += len(chunk)
+            combos.update(tuple(m) for m in methods)
+        print(f"{n} 行")
+        for combo, count in combos.most_common(10):
+            print(f"{count:>10}  {'、'.join(display_methods(combo))}")
+    print(f"耗时 {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+轻量的分阶段计时。
+
+    with tracing.collect("生成报告") as trace:       # 开启本次请求的采集
+        with tracing.span("parse_excel"):
+            ...
+    trace.summary() / trace.to_jsonl() / trace.to_chrome_trace()
+
+采集器挂在 contextvar 上：没有开启采集时 span() 直接返回共享的空上下文，
+@traced 装饰的函数只多一次 contextvar 读取，热路径上的开销可以忽略。
+不同 Streamlit 会话在各自线程里运行，互不串数据。
+线程池任务用 contextvars.copy_context().run 提交即可记到同一份 Trace；
+进程池任务在子进程里 collect()，把 trace.spans 带回父进程后 merge()。
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+_current: contextvars.ContextVar = contextvars.ContextVar("rso_trace", default=None)
+# 嵌套深度也放在 contextvar 上：线程池里并发的 span 各自从提交时的深度往下数
+_depth: contextvars.ContextVar = contextvars.ContextVar("rso_trace_depth", default=0)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "start", "depth", "_token")
+
+    def __init__(self, trace: "Trace", name: str, attrs: Dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.depth = _depth.get()
+        self._token = _depth.set(self.depth + 1)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        tr = self.trace
+        _depth.reset(self._token)
+        rec = {
+            "name": self.name,
+            "start_ms": (self.start - tr.t0) * 1000.0,
+            "dur_ms": (end - self.start) * 1000.0,
+            "depth": self.depth,
+            "tid": threading.get_ident(),
+        }
+        if self.attrs:
+            rec["attrs"] = self.attrs
+        if exc_type is not None:
+            rec["error"] = exc_type.__name__
+        tr.spans.append(rec)
+        return False
+
+
+class Trace:
+    """一次请求（一次脚本运行 / 一次导出）内的全部 span。"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.t0 = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans: List[Dict] = []
+        self._token = None
+        self._depth_token = None
+
+    def span(self, name: str, **attrs) -> _Span:
+        return _Span(self, name, attrs)
+
+    def merge(self, spans: List[Dict], end: Optional[float] = None) -> None:
+        """
+        并入其他进程采集的 span（start_ms 以那边的 Trace 起点为 0）。
+        没有跨进程可比的时钟，整体平移到 end（perf_counter 时刻，默认此刻）结束，深度接在当前深度之下。
+        """
+        if not spans:
+            return
+        end_ms = ((time.perf_counter() if end is None else end) - self.t0) * 1000.0
+        offset = end_ms - max(s["start_ms"] + s["dur_ms"] for s in spans)
+        depth = _depth.get()
+        self.spans.extend({**s, "start_ms": s["start_ms"] + offset, "depth": s["depth"] + depth}
+                          for s in spans)
+
+    def summary(self) -> List[Dict]:
+        """按阶段名汇总：次数、总耗时、最大单次耗时，按总耗时降序。"""
+        agg: Dict[str, Dict] = {}
+        for s in self.spans:
+            a = agg.setdefault(s["name"], {"name": s["name"], "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            a["count"] += 1
+            a["total_ms"] += s["dur_ms"]
+            a["max_ms"] = max(a["max_ms"], s["dur_ms"])
+        return sorted(agg.values(), key=lambda a: -a["total_ms"])
+
+    def to_jsonl(self) -> str:
+        """每行一个 span（附请求标签与起始时间戳），便于追加到同一个日志文件。"""
+        head = {"label": self.label, "ts": self.wall_start}
+        return "".join(json.dumps({**head, **s}, ensure_ascii=False) + "\n"
+                       for s in sorted(self.spans, key=lambda s: s["start_ms"]))
+
+    def to_chrome_trace(self) -> str:
+        """Chrome trace（chrome://tracing / Perfetto 可直接打开）的 JSON。"""
+        pid = os.getpid()
+        events = [{
+            "name": s["name"], "ph": "X", "pid": pid, "tid": s["tid"],
+            "ts": (self.wall_start * 1e6) + s["start_ms"] * 1000.0, "dur": s["dur_ms"] * 1000.0,
+            "args": s.get("attrs", {}),
+        } for s in self.spans]
+        return json.dumps({"traceEvents": events, "otherData": {"label": self.label}}, ensure_ascii=False)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def span(name: str, **attrs):
+    """阶段计时；未开启采集时为空操作。"""
+    tr = _current.get()
+    if tr is None:
+        return _NOOP
+    return tr.span(name, **attrs)
+
+
+def traced(name: Optional[str] = None):
+    """装饰器版 span，默认用 模块.函数名 作为阶段名。"""
+    def deco(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            tr = _current.get()
+            if tr is None:
+                return fn(*args, **kwargs)
+            with tr.span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+@contextmanager
+def collect(label: str = ""):
+    """在当前上下文开启采集，退出时恢复（可嵌套，内层单独成一份 Trace）。"""
+    tr = Trace(label)
+    token = _current.set(tr)
+    depth_token = _depth.set(0)
+    try:
+        yield tr
+    finally:
+        _depth.reset(depth_token)
+        _current.reset(token)
+
+
+def start(label: str = "") -> Trace:
+    """非 with 写法：脚本式代码（如 Streamlit 页面）里开启采集，配合 stop() 使用。"""
+    tr = Trace(label)
+    tr._token = _current.set(tr)
+    tr._depth_token = _depth.set(0)
+    return tr
+
+
+def stop(trace: Trace) -> Trace:
+    token = getattr(trace, "_token", None)
+    if token is not None:
+        _depth.reset(trace._depth_token)
+        _current.reset(token)
+        trace._token = trace._depth_token = None
+    return trace
+
+
+def append_jsonl(trace: Trace, path: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(trace.to_jsonl())